@@ -2,7 +2,13 @@ from abc import ABC, abstractmethod
 import random
 import math
 
+from game_core import events
+from game_core.ballistics import BallisticSolver
+
 class TankBotInterface(ABC):
+    # True if attack depends only on the snapshot it gets, then the game may ask the bot before its turn
+    # on the expected snapshot (see game_core/speculation.py)
+    allow_speculation = False
 
     def __init__(self, name, preferred_color=""):
         """
@@ -32,10 +38,26 @@ class TankBotInterface(ABC):
         except Exception:
             return
 
+    def get_state(self):
+        """
+        Returns state of the bot saved in match checkpoints, by default its attributes.
+        The state must be picklable, otherwise the checkpoint keeps no state of the bot.
+        Return None for bots whose state can not be saved.
+        """
+        return dict(vars(self))
+
+    def set_state(self, state):
+        """
+        Restores state returned by get_state when a match is resumed from a checkpoint.
+        """
+        vars(self).update(state)
+
     @abstractmethod
     def attack(self, other_bots):
         """
-        This will be implemented in the child objects. This function gets a list of TankBots (dictionaries),
+        This will be implemented in the child objects. This function gets a GameStateSnapshot: a read-only
+        sequence of TankBots (dictionaries with name, position and health), which also has the tanks array,
+        the heightmap (heights), the wind and the turn number.
         It should return the selected attack angle (-90 -> 90) and power (0-100).
         Note:
            - If the function raises exception, you will use your turn!
@@ -131,6 +153,8 @@ class PreciseAttacker(TankBotInterface):
 
 
 class PhoenixDestructor(TankBotInterface):
+    allow_speculation = True
+
     def __init__(self, name="PhoenixDestructor", preferred_color="brown"):
         super().__init__(name, preferred_color)
 
@@ -138,7 +162,7 @@ class PhoenixDestructor(TankBotInterface):
         """
         This attack will select a random angle, and attack it with 20 power.
         """
-        print(other_bots)
+        events.emit("bot.snapshot", "{snapshot}", events.DEBUG, bot=self.get_name(), snapshot=other_bots)
         tanks_count = len(other_bots)
         # print(f"There are {tanks_count} in the list")
         target_tank = None
@@ -165,7 +189,8 @@ class PhoenixDestructor(TankBotInterface):
         dy = (target_y - our_y)
 
 
-        angle_rad = math.atan(dy/dx)
+        # straight up or down when the target is right above or below
+        angle_rad = math.atan(dy/dx) if dx else math.copysign(math.pi / 2, dy)
         angle = math.degrees(angle_rad)  # angle in degress
 
         # distance
@@ -178,3 +203,31 @@ class PhoenixDestructor(TankBotInterface):
         # angle = random.randrange(-90, 90)
         # power = random.randrange(0, 100)
         return angle, power
+
+
+class Sniper(TankBotInterface):
+    def __init__(self, name="Sniper", preferred_color="orange"):
+        super().__init__(name, preferred_color)
+        self.solver = None
+
+    def attack(self, other_bots):
+        """
+        This attack aims at the weakest enemy with the ballistic solver, it shoots randomly when no shot reaches it.
+        """
+        if self.solver is None:
+            self.solver = BallisticSolver()
+        enemies = sorted((bot for bot in other_bots if bot['name'] != self.get_name()), key=lambda bot: bot['health'])
+        for enemy in enemies:
+            shot = self.solver.solve_for_bot(other_bots, self.get_name(), enemy['name'])
+            if shot:
+                return shot
+        return random.randrange(-90, 90), random.randrange(1, 100)
+
+    def get_state(self):
+        """
+        Returns state of the bot without the solver, whose trajectory table is a cache of megabytes,
+        the next attack creates the solver again.
+        """
+        state = super().get_state()
+        state.pop("solver", None)
+        return state
@@ -0,0 +1,400 @@
+"""
+Monte Carlo evaluation of bots.
+
+Each pair of bots plays seeded headless matches (one tank each by default) in parallel worker processes.
+Seats are swapped in every other match and match k of every pair is played on the terrain of seed + k,
+so pairs are compared on the same maps. The result of a pair is looked at only at fixed numbers of matches,
+min_matches doubled until max_matches (20, 40, 80, 160, 320, 400 by default). At each look the confidence
+interval of the win rate (draws count as half a win) is computed with the confidence corrected for the number
+of looks (Bonferroni), so the chance of any wrong decision over all looks stays below 1 - confidence.
+The pair is decided when the interval is above or below 1/2 or lies within 1/2 +- even margin; otherwise
+it plays up to the next look. Matches go to the undecided pairs with the widest intervals first.
+
+    python -m bots.evaluation                                   # all built-in bots, one worker per CPU
+    python -m bots.evaluation --bots RandomAttacker XBot --workers 2 --max-matches 200
+
+Matches after a look are started only once the look is made, so the results do not depend on the number
+of workers.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import combinations
+from math import sqrt
+from statistics import NormalDist
+
+import pygame
+
+import bots.bots
+from bots.bots import TankBotInterface
+from game_core import events
+from game_core.constants import *
+from game_core.game_manager import GameManager
+
+builtin_bots = ["RandomAttacker", "XBot", "PreciseAttacker", "PhoenixDestructor"]
+
+
+def wilson_interval(score, matches, confidence):
+    """
+    Returns Wilson score interval of a win rate
+    :param score: number of wins, draws count as half a win
+    :param matches: number of matches
+    :param confidence: confidence level, e.g. 0.95
+    :return: (low, high) tuple, (0, 1) without matches
+    """
+    if matches == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    rate = score / matches
+    denominator = 1 + z * z / matches
+    center = (rate + z * z / (2 * matches)) / denominator
+    half_width = z * sqrt(rate * (1 - rate) / matches + z * z / (4 * matches * matches)) / denominator
+    return max(center - half_width, 0.0), min(center + half_width, 1.0)
+
+
+class TimedBot(TankBotInterface):
+    """
+    Proxy of a bot which measures CPU time the bot spends in attack
+    """
+    def __init__(self, bot_object):
+        """
+        Init function
+        :param bot_object: measured bot
+        """
+        super().__init__(bot_object.get_name(), bot_object.get_preferred_color())
+        self.bot_object = bot_object
+        self.allow_speculation = bot_object.allow_speculation
+        self.cpu_time = 0.0
+        self.attacks = 0
+
+    def attack(self, other_bots):
+        """
+        Asks the bot for its attack and adds CPU time of the call
+        :param other_bots: GameStateSnapshot
+        :return: attack of the bot
+        """
+        start = time.thread_time()
+        try:
+            return self.bot_object.attack(other_bots)
+        finally:
+            self.cpu_time += time.thread_time() - start
+            self.attacks += 1
+
+    def update_last_hit(self, position):
+        """
+        Passes hit position to the bot
+        :param position: position of the last hit
+        :return: none
+        """
+        self.bot_object.update_last_hit(position)
+
+
+def play_match(bot_classes, seed, tanks=1, max_turns=evaluation_max_turns):
+    """
+    Plays one headless match, called in worker processes
+    :param bot_classes: names of bot classes of bots/bots.py in the order of seats
+    :param seed: seed of the match
+    :param tanks: number of tanks of each bot
+    :param max_turns: maximum number of turns, bots left after them draw
+    :return: (index of the winner in bot_classes or None for a draw, list of (CPU seconds, attacks) of the bots,
+             CPU seconds of the whole match) tuple
+    """
+    players = [TimedBot(getattr(bots.bots, name)()) for name in bot_classes]
+    manager = GameManager(tanks, players, headless=True, seed=seed)
+    start = time.process_time()
+    left = manager.run_headless(max_turns)
+    match_cpu_time = time.process_time() - start
+    winner = next((i for i, player in enumerate(players) if left == [player.get_name()]), None)
+    return winner, [(player.cpu_time, player.attacks) for player in players], match_cpu_time
+
+
+def _init_worker():
+    """
+    Prepares a worker process: headless pygame and no console output of game events
+    :return: none
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    pygame.init()
+    events.set_event_log(events.EventLog(console_level=None))
+
+
+class _InlineExecutor:
+    """
+    Executor running each task at once in the calling process, used with one worker
+    """
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+    def shutdown(self):
+        pass
+
+
+def look_schedule(min_matches, max_matches):
+    """
+    Returns numbers of matches at which results of a pair are looked at
+    :param min_matches: first look
+    :param max_matches: last look
+    :return: list of numbers of matches, each is double the previous one except the last one
+    """
+    looks = []
+    matches = max(min_matches, 1)
+    while matches < max_matches:
+        looks.append(matches)
+        matches *= 2
+    return looks + [max_matches]
+
+
+class Pairing:
+    """
+    Statistics of the matches of two bots, decided at the looks of look_schedule
+    """
+    def __init__(self, first, second, looks, confidence, even_margin):
+        """
+        Init function
+        :param first: name of the first bot class, win rates are its
+        :param second: name of the second bot class
+        :param looks: numbers of matches at which the result is looked at
+        :param confidence: overall confidence level, each look uses the level corrected for the number of looks
+        :param even_margin: pairs whose interval lies within 1/2 +- even_margin are even
+        """
+        self.first = first
+        self.second = second
+        self.looks = looks
+        self.confidence = 1 - (1 - confidence) / len(looks)
+        self.even_margin = even_margin
+        self.wins = [0, 0]
+        self.draws = 0
+        self.started = 0
+        self.running = 0
+        # index of the next look, name of the better bot or "even" once decided
+        self.next_look = 0
+        self.result = None
+
+    @property
+    def matches(self):
+        """
+        Number of finished matches
+        """
+        return self.wins[0] + self.wins[1] + self.draws
+
+    def win_rate(self):
+        """
+        Returns win rate of the first bot, draws count as half a win
+        :return: win rate, 0.5 without matches
+        """
+        return (self.wins[0] + self.draws / 2) / self.matches if self.matches else 0.5
+
+    def interval(self):
+        """
+        Returns confidence interval of the win rate of the first bot at the confidence of one look
+        :return: (low, high) tuple
+        """
+        return wilson_interval(self.wins[0] + self.draws / 2, self.matches, self.confidence)
+
+    def uncertainty(self):
+        """
+        Returns width of the confidence interval of the win rate
+        :return: width of the interval
+        """
+        low, high = self.interval()
+        return high - low
+
+    def is_open(self):
+        """
+        Checks whether more matches of the pair should be started, matches after the next look are not
+        started before the look is made
+        :return: True if the pair is undecided and below its next look
+        """
+        return self.result is None and self.next_look < len(self.looks) and \
+            self.started < self.looks[self.next_look]
+
+    def add_result(self, winner):
+        """
+        Adds result of a match and makes the looks reached by it
+        :param winner: 0 if the first bot won, 1 if the second one won, None for a draw
+        :return: none
+        """
+        if winner is None:
+            self.draws += 1
+        else:
+            self.wins[winner] += 1
+        while self.result is None and self.next_look < len(self.looks) and \
+                self.matches >= self.looks[self.next_look]:
+            self.next_look += 1
+            self.result = self.decision()
+
+    def decision(self):
+        """
+        Returns result of the pair from its current interval
+        :return: name of the better bot, "even", or None if undecided
+        """
+        low, high = self.interval()
+        if low > 0.5:
+            return self.first
+        if high < 0.5:
+            return self.second
+        if 0.5 - self.even_margin <= low and high <= 0.5 + self.even_margin:
+            return "even"
+        return None
+
+
+class Evaluation:
+    """
+    Plays matches of all pairs of bots until their results are decided (see the module description)
+    """
+    def __init__(self, bot_classes, workers=None, confidence=evaluation_confidence,
+                 min_matches=evaluation_min_matches, max_matches=evaluation_max_matches,
+                 even_margin=evaluation_even_margin, seed=0, tanks=1, max_turns=evaluation_max_turns):
+        """
+        Init function
+        :param bot_classes: names of bot classes of bots/bots.py
+        :param workers: number of worker processes, number of CPUs by default; 1 plays in this process
+        :param confidence: confidence level of the decision of each pair over all its looks
+        :param min_matches: number of matches of a pair at the first look
+        :param max_matches: maximum number of matches of a pair, the pair stays undecided after them
+        :param even_margin: pairs whose interval lies within 1/2 +- even_margin are even
+        :param seed: seed of the first match of each pair
+        :param tanks: number of tanks of each bot
+        :param max_turns: maximum number of turns of a match, bots left after them draw
+        """
+        self.bot_classes = list(bot_classes)
+        self.workers = workers or os.cpu_count() or 1
+        self.confidence = confidence
+        self.min_matches = min_matches
+        self.max_matches = max_matches
+        self.even_margin = even_margin
+        self.seed = seed
+        self.tanks = tanks
+        self.max_turns = max_turns
+        looks = look_schedule(min_matches, max_matches)
+        self.pairings = [Pairing(first, second, looks, confidence, even_margin)
+                         for first, second in combinations(self.bot_classes, 2)]
+        # bot class name -> [CPU seconds in attack, attacks, CPU seconds of its matches]
+        self.cpu_times = {name: [0.0, 0, 0.0] for name in self.bot_classes}
+        self.wall_time = 0.0
+
+    def next_pairing(self):
+        """
+        Chooses the pair which gets the next match: the open pair with the fewest running matches,
+        then with the widest interval
+        :return: Pairing, None if no pair can start a match now
+        """
+        candidates = [pairing for pairing in self.pairings if pairing.is_open()]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda pairing: (pairing.running, -pairing.uncertainty()))
+
+    def record(self, pairing, swapped, outcome):
+        """
+        Adds result of a match to the statistics
+        :param pairing: Pairing of the match
+        :param swapped: True if the second bot of the pair had the first seat
+        :param outcome: result of play_match
+        :return: none
+        """
+        winner, bot_times, match_cpu_time = outcome
+        seats = [pairing.second, pairing.first] if swapped else [pairing.first, pairing.second]
+        pairing.add_result(None if winner is None else [pairing.first, pairing.second].index(seats[winner]))
+        for name, (cpu_time, attacks) in zip(seats, bot_times):
+            self.cpu_times[name][0] += cpu_time
+            self.cpu_times[name][1] += attacks
+            self.cpu_times[name][2] += match_cpu_time
+
+    def run(self):
+        """
+        Plays the matches
+        :return: self
+        """
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+            previous_log = None
+        else:
+            executor = _InlineExecutor()
+            pygame.init()
+            previous_log = events.set_event_log(events.EventLog(console_level=None))
+        start = time.perf_counter()
+        running = {}
+        try:
+            while True:
+                while len(running) < 2 * self.workers:
+                    pairing = self.next_pairing()
+                    if pairing is None:
+                        break
+                    swapped = pairing.started % 2 == 1
+                    seats = [pairing.second, pairing.first] if swapped else [pairing.first, pairing.second]
+                    future = executor.submit(play_match, seats, self.seed + pairing.started, self.tanks,
+                                             self.max_turns)
+                    pairing.started += 1
+                    pairing.running += 1
+                    running[future] = pairing, swapped
+                if not running:
+                    break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    pairing, swapped = running.pop(future)
+                    pairing.running -= 1
+                    self.record(pairing, swapped, future.result())
+        finally:
+            executor.shutdown()
+            if self.workers <= 1:
+                events.set_event_log(previous_log).close()
+        self.wall_time = time.perf_counter() - start
+        return self
+
+    def matches(self):
+        """
+        Returns number of played matches
+        :return: number of matches
+        """
+        return sum(pairing.matches for pairing in self.pairings)
+
+    def report(self):
+        """
+        Returns text report of the evaluation
+        :return: text
+        """
+        lines = [f"{'pair':40} {'matches':>7} {'wins':>9} {'draws':>5} {'win rate':>8} {'interval':>13}  result"]
+        for pairing in self.pairings:
+            low, high = pairing.interval()
+            result = pairing.result
+            result = "even" if result == "even" else f"{result} is better" if result else "undecided"
+            lines.append(f"{pairing.first + ' vs ' + pairing.second:40} {pairing.matches:7} "
+                         f"{pairing.wins[0]:4}:{pairing.wins[1]:<4} {pairing.draws:5} {pairing.win_rate():8.3f} "
+                         f"{low:6.3f}-{high:<6.3f}  {result}")
+        lines.append("")
+        lines.append(f"{'bot':20} {'attacks':>8} {'attack CPU s':>12} {'ms/attack':>9} {'share of match CPU':>18}")
+        for name, (cpu_time, attacks, match_cpu_time) in self.cpu_times.items():
+            lines.append(f"{name:20} {attacks:8} {cpu_time:12.3f} {1000 * cpu_time / max(attacks, 1):9.3f} "
+                         f"{cpu_time / match_cpu_time if match_cpu_time else 0:18.1%}")
+        lines.append("")
+        lines.append(f"{self.matches()} matches in {self.wall_time:.1f} s with {self.workers} workers, "
+                     f"{self.matches() / self.wall_time if self.wall_time else 0:.1f} matches/s")
+        return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bots", nargs="+", default=builtin_bots, help="bot classes of bots/bots.py")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: number of CPUs)")
+    parser.add_argument("--confidence", type=float, default=evaluation_confidence)
+    parser.add_argument("--min-matches", type=int, default=evaluation_min_matches)
+    parser.add_argument("--max-matches", type=int, default=evaluation_max_matches)
+    parser.add_argument("--even-margin", type=float, default=evaluation_even_margin)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first match of each pair")
+    parser.add_argument("--tanks", type=int, default=1, help="tanks of each bot")
+    parser.add_argument("--max-turns", type=int, default=evaluation_max_turns)
+    args = parser.parse_args()
+
+    evaluation = Evaluation(args.bots, args.workers, args.confidence, args.min_matches, args.max_matches,
+                            args.even_margin, args.seed, args.tanks, args.max_turns)
+    print(evaluation.run().report())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,612 @@
+"""
+Asyncio gateway for bots running as local network services.
+
+Bots written in any language may listen on a TCP or Unix socket and speak the bot protocol:
+every message is a JSON object on its own line (or, with the msgpack codec, a msgpack map
+prefixed with its length as 4 byte big-endian integer).
+
+    request   {"id": 7, "type": "attack", "match": "m1", "bot": "XBot",
+               "state": {"turn": 3, "wind": 0.0, "tanks": [["XBot", 100, 250, 100], ...], "heights": [...]}}
+    response  {"id": 7, "angle": 45, "power": 80}   or   {"id": 7, "error": "message"}
+    notice    {"type": "update_last_hit", "match": "m1", "bot": "XBot", "position": [640, 120]}
+
+Tanks are [name, x, y, health] in bot coordinates (y is the height above the bottom of the display),
+heights are ground y coordinates of the display (see GameStateSnapshot). Requests carry an id, so
+many matches share a small pool of connections and responses may come in any order. Notices have
+no id and no response. Messages longer than the message limit, or ones which can not be decoded,
+are skipped; a request among them is answered with an error, the connection stays open.
+
+    python bots/gateway.py --address tcp://127.0.0.1:8765   # serve the bots of bots/bots.py
+"""
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import os
+import re
+import struct
+import sys
+import threading
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from bots.bots import TankBotInterface
+from game_core.constants import *
+from game_core.snapshot import GameStateSnapshot
+
+try:
+    import msgpack
+except ImportError:  # msgpack codec is optional
+    msgpack = None
+
+
+class MessageError(ValueError):
+    """
+    Message which is too long or can not be decoded, the stream continues with the next message
+    """
+    def __init__(self, text, message_id=None):
+        """
+        Init function
+        :param text: description of the error
+        :param message_id: id of the skipped request if it could be read from the start of the message
+        """
+        super().__init__(text)
+        self.message_id = message_id
+
+
+class JsonCodec:
+    """
+    Line-delimited JSON messages, the limit of their length is the limit of the StreamReader
+    """
+    name = "json"
+    # requests are encoded with their id first
+    id_pattern = re.compile(rb'\s*\{\s*"id"\s*:\s*(\d+)')
+
+    def __init__(self, limit=bot_message_limit):
+        self.limit = limit
+
+    def encode(self, message):
+        return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+    def message_id(self, data):
+        """
+        Reads id of a message from its start
+        :param data: first bytes of the message
+        :return: id or None
+        """
+        match = self.id_pattern.match(data)
+        return int(match.group(1)) if match else None
+
+    async def read(self, reader):
+        """
+        Reads one message
+        :param reader: asyncio StreamReader created with limit=self.limit
+        :return: message or None at the end of stream
+        """
+        try:
+            line = await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None
+            line = e.partial
+        except asyncio.LimitOverrunError:
+            start = await self.skip_line(reader)
+            raise MessageError(f"message is longer than {self.limit} bytes", self.message_id(start))
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            raise MessageError(f"invalid JSON message: {e}", self.message_id(line))
+
+    @staticmethod
+    async def skip_line(reader):
+        """
+        Skips a line longer than the limit of the reader
+        :param reader: asyncio StreamReader
+        :return: first bytes of the line
+        """
+        start = b""
+        while True:
+            try:
+                await reader.readuntil(b"\n")
+                return start
+            except asyncio.LimitOverrunError as e:
+                # the bytes before the newline (or all buffered bytes) are consumed, the next try ends the line
+                data = await reader.readexactly(max(e.consumed, 1))
+                start = start or data[:100]
+            except asyncio.IncompleteReadError:
+                return start
+
+
+class MsgpackCodec:
+    """
+    Msgpack messages prefixed with their length
+    """
+    name = "msgpack"
+
+    def __init__(self, limit=bot_message_limit):
+        if msgpack is None:
+            raise ImportError("msgpack codec requires the msgpack package")
+        self.limit = limit
+
+    def encode(self, message):
+        payload = msgpack.packb(message)
+        return struct.pack(">I", len(payload)) + payload
+
+    def message_id(self, data):
+        """
+        Reads id of a message from its start
+        :param data: first bytes of the message
+        :return: id or None
+        """
+        unpacker = msgpack.Unpacker()
+        unpacker.feed(data)
+        try:
+            if unpacker.read_map_header() and unpacker.unpack() == "id":
+                return unpacker.unpack()
+        except Exception:
+            pass
+        return None
+
+    async def read(self, reader):
+        """
+        Reads one message
+        :param reader: asyncio StreamReader
+        :return: message or None at the end of stream
+        """
+        try:
+            header = await reader.readexactly(4)
+            length = struct.unpack(">I", header)[0]
+            if length > self.limit:
+                start = await reader.readexactly(min(length, 100))
+                # skipped in chunks, so the long message is never held in memory
+                for skipped in range(len(start), length, 65536):
+                    await reader.readexactly(min(65536, length - skipped))
+                raise MessageError(f"message is longer than {self.limit} bytes", self.message_id(start))
+            payload = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            return None
+        try:
+            return msgpack.unpackb(payload)
+        except Exception as e:
+            raise MessageError(f"invalid msgpack message: {e}", self.message_id(payload[:100]))
+
+
+codecs = {"json": JsonCodec, "msgpack": MsgpackCodec}
+
+
+async def open_connection(address, limit=bot_message_limit):
+    """
+    Opens connection to the address
+    :param address: "tcp://host:port" or "unix:///path/to/socket"
+    :param limit: maximum length of a message
+    :return: (reader, writer)
+    """
+    if address.startswith("unix://"):
+        return await asyncio.open_unix_connection(address[len("unix://"):], limit=limit)
+    if address.startswith("tcp://"):
+        host, port = address[len("tcp://"):].rsplit(":", 1)
+        return await asyncio.open_connection(host, int(port), limit=limit)
+    raise ValueError(f"Unsupported bot address: {address}")
+
+
+def snapshot_to_state(snapshot):
+    """
+    Converts game state snapshot to protocol representation
+    :param snapshot: GameStateSnapshot
+    :return: dictionary with turn, wind, tanks and heights
+    """
+    return {"turn": snapshot.turn, "wind": snapshot.wind, "tanks": snapshot.tanks.tolist(),
+            "heights": snapshot.heights.tolist()}
+
+
+def state_to_snapshot(state):
+    """
+    Converts protocol representation of the game state to snapshot
+    :param state: dictionary with turn, wind, tanks and heights
+    :return: GameStateSnapshot
+    """
+    tanks = GameStateSnapshot.tanks_array([(name, (x, y), health) for name, x, y, health in state["tanks"]])
+    return GameStateSnapshot(tanks, np.array(state["heights"], dtype=np.int64), state["wind"], state["turn"])
+
+
+class EventLoopThread:
+    """
+    Asyncio event loop running in a background thread, used to call coroutines from the synchronous game
+    """
+    def __init__(self, name):
+        self.name = name
+        self.loop = None
+        self.thread = None
+
+    def start(self):
+        """
+        Starts the loop thread
+        :return: none
+        """
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True)
+        self.thread.start()
+
+    def run(self, coroutine):
+        """
+        Runs coroutine in the loop and waits for its result
+        :param coroutine: coroutine object
+        :return: result of the coroutine
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def stop(self):
+        """
+        Stops the loop and its thread
+        :return: none
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class BotConnection:
+    """
+    One connection of the gateway pool, requests are matched with responses by their id
+    """
+    def __init__(self, reader, writer, codec):
+        self.reader = reader
+        self.writer = writer
+        self.codec = codec
+        self.pending = {}
+        self.reader_task = asyncio.ensure_future(self.read_responses())
+
+    def is_open(self):
+        return not self.reader_task.done()
+
+    async def read_responses(self):
+        """
+        Resolves pending requests with responses until the connection is closed
+        :return: none
+        """
+        try:
+            while True:
+                try:
+                    message = await self.codec.read(self.reader)
+                except MessageError as e:
+                    # only the request of the skipped response fails, without its id the request times out
+                    future = self.pending.pop(e.message_id, None)
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+                    continue
+                if message is None:
+                    break
+                future = self.pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except ConnectionError as e:
+            error = e
+        else:
+            error = ConnectionError("bot server closed the connection")
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self.pending.clear()
+
+    async def send(self, message):
+        self.writer.write(self.codec.encode(message))
+        await self.writer.drain()
+
+    async def request(self, request_id, message):
+        """
+        Sends request and returns future of its response
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            await self.send(message)
+        except ConnectionError:
+            self.pending.pop(request_id, None)
+            raise
+        return future
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self.reader_task
+
+
+class BotGateway:
+    """
+    Client side of the bot protocol. Requests of all matches and bots are multiplexed over a pool of
+    connections to one bot server, every request has a deadline.
+    Coroutines attack and update_last_hit may be awaited from asyncio code; synchronous code (GameManager)
+    uses NetworkBot proxies, which run them in the gateway's own event loop thread.
+    """
+    def __init__(self, address, pool_size=4, codec="json", deadline=bot_turn_timeout, limit=bot_message_limit):
+        """
+        Init function
+        :param address: "tcp://host:port" or "unix:///path/to/socket"
+        :param pool_size: maximum number of connections
+        :param codec: "json" or "msgpack"
+        :param deadline: seconds for the answer of an attack request
+        :param limit: maximum length of a message in bytes
+        """
+        self.address = address
+        self.pool_size = pool_size
+        self.codec = codecs[codec](limit)
+        self.deadline = deadline
+        self.connections = []
+        self.request_ids = itertools.count(1)
+        self.loop_thread = None
+        self.connecting = None
+
+    async def get_connection(self):
+        """
+        Returns connection with the least pending requests, a new one is opened while the pool is not full
+        :return: BotConnection
+        """
+        self.connections = [connection for connection in self.connections if connection.is_open()]
+        idle = [connection for connection in self.connections if not connection.pending]
+        if idle or len(self.connections) >= self.pool_size:
+            return min(self.connections, key=lambda connection: len(connection.pending))
+        # one connection is opened at a time, concurrent requests wait for it instead of opening more
+        if self.connecting is None:
+            self.connecting = asyncio.ensure_future(open_connection(self.address, self.codec.limit))
+        connecting = self.connecting
+        try:
+            reader, writer = await connecting
+        finally:
+            if self.connecting is connecting:
+                self.connecting = None
+        connection = next((connection for connection in self.connections if connection.reader is reader), None)
+        if connection is None:
+            connection = BotConnection(reader, writer, self.codec)
+            self.connections.append(connection)
+        return connection
+
+    async def attack(self, match_id, bot_name, snapshot, deadline=None):
+        """
+        Asks the bot for angle and power
+        :param match_id: identifier of the match
+        :param bot_name: name of the bot on the server
+        :param snapshot: GameStateSnapshot
+        :param deadline: seconds for the answer, gateway's deadline by default
+        :return: (angle, power)
+        """
+        request_id = next(self.request_ids)
+        message = {"id": request_id, "type": "attack", "match": match_id, "bot": bot_name,
+                   "state": snapshot_to_state(snapshot)}
+        connection = await self.get_connection()
+        future = await connection.request(request_id, message)
+        try:
+            response = await asyncio.wait_for(future, deadline or self.deadline)
+        except asyncio.TimeoutError:
+            connection.pending.pop(request_id, None)
+            raise TimeoutError(f"bot {bot_name} did not answer in {deadline or self.deadline} s")
+        except MessageError as e:
+            raise RuntimeError(f"bot {bot_name}: {e}")
+        if "error" in response:
+            raise RuntimeError(f"bot {bot_name}: {response['error']}")
+        return response["angle"], response["power"]
+
+    async def update_last_hit(self, match_id, bot_name, position):
+        """
+        Notifies the bot about its last hit
+        :param match_id: identifier of the match
+        :param bot_name: name of the bot on the server
+        :param position: coordinates of the hit
+        :return: none
+        """
+        connection = await self.get_connection()
+        await connection.send({"type": "update_last_hit", "match": match_id, "bot": bot_name,
+                               "position": [int(position[0]), int(position[1])]})
+
+    async def aclose(self):
+        """
+        Closes all connections
+        :return: none
+        """
+        for connection in self.connections:
+            await connection.close()
+        self.connections = []
+
+    def start(self):
+        """
+        Starts event loop thread used by NetworkBot proxies
+        :return: self
+        """
+        if self.loop_thread is None:
+            self.loop_thread = EventLoopThread("bot-gateway")
+            self.loop_thread.start()
+        return self
+
+    def run(self, coroutine):
+        """
+        Runs coroutine of the gateway in its event loop thread and waits for the result
+        """
+        self.start()
+        return self.loop_thread.run(coroutine)
+
+    def close(self):
+        """
+        Closes connections and stops the event loop thread
+        :return: none
+        """
+        if self.loop_thread is not None:
+            self.loop_thread.run(self.aclose())
+            self.loop_thread.stop()
+            self.loop_thread = None
+
+
+class NetworkBot(TankBotInterface):
+    """
+    Proxy of a bot served by a bot server, it can be passed to GameManager like any other bot
+    """
+    def __init__(self, name, gateway, preferred_color="", match_id="default"):
+        """
+        Init function
+        :param name: name of the bot on the server
+        :param gateway: BotGateway connected to the server
+        :param preferred_color: preferred color of the tank
+        :param match_id: identifier of the match, bots of the server keep separate state for each match
+        """
+        super().__init__(name, preferred_color)
+        self.gateway = gateway
+        self.match_id = match_id
+
+    def get_state(self):
+        """
+        State of the bot lives on the bot server, it is not saved in checkpoints
+        :return: None
+        """
+        return None
+
+    def attack(self, other_bots):
+        return self.gateway.run(self.gateway.attack(self.match_id, self.get_name(), other_bots))
+
+    def update_last_hit(self, position):
+        super().update_last_hit(position)
+        try:
+            self.gateway.run(self.gateway.update_last_hit(self.match_id, self.get_name(), position))
+        except (ConnectionError, OSError):
+            return
+
+
+class BotServer:
+    """
+    Stand-in bot server hosting TankBotInterface objects, used for tests and as an example of the protocol.
+    Each match gets its own copies of the bots.
+    """
+    def __init__(self, bots, codec="json", limit=bot_message_limit):
+        """
+        Init function
+        :param bots: list of bot objects, they are addressed by name
+        :param codec: "json" or "msgpack"
+        :param limit: maximum length of a message in bytes
+        """
+        self.bots = {bot.get_name(): bot for bot in bots}
+        self.codec = codecs[codec](limit)
+        self.match_bots = {}
+        self.server = None
+        self.loop_thread = None
+
+    def get_bot(self, match_id, bot_name):
+        """
+        Returns bot instance of the match
+        """
+        key = match_id, bot_name
+        if key not in self.match_bots:
+            self.match_bots[key] = copy.deepcopy(self.bots[bot_name])
+        return self.match_bots[key]
+
+    async def answer(self, message, writer):
+        """
+        Answers one attack request, bots run in the default executor so slow bots do not block others
+        """
+        try:
+            bot = self.get_bot(message["match"], message["bot"])
+            snapshot = state_to_snapshot(message["state"])
+            angle, power = await asyncio.get_running_loop().run_in_executor(None, bot.attack, snapshot)
+            response = {"id": message["id"], "angle": float(angle), "power": float(power)}
+        except Exception as e:
+            response = {"id": message["id"], "error": f"{type(e).__name__}: {e}"}
+        await self.respond(response, writer)
+
+    async def respond(self, response, writer):
+        """
+        Sends a response, a closed connection is ignored
+        """
+        try:
+            writer.write(self.codec.encode(response))
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves one gateway connection, requests are answered concurrently
+        """
+        tasks = set()
+        try:
+            while True:
+                try:
+                    message = await self.codec.read(reader)
+                except MessageError as e:
+                    if e.message_id is not None:
+                        await self.respond({"id": e.message_id, "error": str(e)}, writer)
+                    continue
+                if message is None:
+                    break
+                if message.get("type") == "attack":
+                    task = asyncio.ensure_future(self.answer(message, writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif message.get("type") == "update_last_hit":
+                    self.get_bot(message["match"], message["bot"]).update_last_hit(tuple(message["position"]))
+        except ConnectionError:
+            pass
+        for task in list(tasks):
+            task.cancel()
+        writer.close()
+
+    async def serve(self, address):
+        """
+        Starts listening
+        :param address: "tcp://host:port" (port 0 picks a free port) or "unix:///path/to/socket"
+        :return: address the server listens on
+        """
+        if address.startswith("unix://"):
+            self.server = await asyncio.start_unix_server(self.handle_connection, address[len("unix://"):],
+                                                          limit=self.codec.limit)
+            return address
+        host, port = address[len("tcp://"):].rsplit(":", 1)
+        self.server = await asyncio.start_server(self.handle_connection, host, int(port), limit=self.codec.limit)
+        return f"tcp://{host}:{self.server.sockets[0].getsockname()[1]}"
+
+    def start(self, address):
+        """
+        Starts the server in a background thread
+        :param address: address to listen on
+        :return: address the server listens on
+        """
+        self.loop_thread = EventLoopThread("bot-server")
+        self.loop_thread.start()
+        return self.loop_thread.run(self.serve(address))
+
+    def stop(self):
+        """
+        Stops the server started by start
+        :return: none
+        """
+        async def close_server():
+            self.server.close()
+            await self.server.wait_closed()
+
+        self.loop_thread.run(close_server())
+        self.loop_thread.stop()
+
+
+def main():
+    import bots.bots
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--address", default="tcp://127.0.0.1:8765", help="tcp://host:port or unix:///path")
+    parser.add_argument("--codec", choices=sorted(codecs), default="json")
+    args = parser.parse_args()
+
+    server = BotServer([bots.bots.RandomAttacker(), bots.bots.XBot(), bots.bots.PreciseAttacker(),
+                        bots.bots.PhoenixDestructor()], args.codec)
+
+    async def serve_forever():
+        print(f"Serving bots on {await server.serve(args.address)}")
+        await server.server.serve_forever()
+
+    asyncio.run(serve_forever())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+import multiprocessing
+import os
+import time
+from contextlib import redirect_stdout
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from bots.bots import TankBotInterface
+from game_core import events
+from game_core.constants import *
+from game_core.snapshot import GameStateSnapshot
+
+try:
+    import resource
+except ImportError:  # not available on Windows, memory limit is not applied there
+    resource = None
+
+
+class LimitedOutput:
+    """
+    Text stream which keeps only the first characters written to it
+    """
+    def __init__(self, limit):
+        """
+        Init function
+        :param limit: maximum number of kept characters
+        """
+        self.limit = limit
+        self.parts = []
+        self.length = 0
+        self.dropped = 0
+
+    def write(self, text):
+        kept = text[:max(0, self.limit - self.length)]
+        if kept:
+            self.parts.append(kept)
+            self.length += len(kept)
+        self.dropped += len(text) - len(kept)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        """
+        Returns kept text with a note about dropped characters
+        :return: text
+        """
+        text = "".join(self.parts)
+        if self.dropped:
+            text += f"\n... {self.dropped} characters dropped"
+        return text
+
+
+def limit_memory(memory_limit):
+    """
+    Limits address space of the current process to its present size plus memory_limit bytes
+    :param memory_limit: number of bytes the process may allocate, None for no limit
+    :return: none
+    """
+    if resource is None or not memory_limit:
+        return
+    try:
+        with open("/proc/self/statm") as statm:
+            current_size = int(statm.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        current_size = 0
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = current_size + memory_limit
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def run_bot_worker(connection, bot_object, memory_limit, output_limit):
+    """
+    Main function of the bot process, executes commands received from SandboxedBot until the pipe is closed.
+    Commands:
+        ("attack", tanks, heights_name, heights_length, wind, turn) -> ("result", angle, power, output)
+                                                                   or ("error", message, output)
+        ("last_hit", position)                                      -> no reply
+        ("close",)                                                  -> no reply, process ends
+    :param connection: worker end of the pipe
+    :param bot_object: bot executed in this process
+    :param memory_limit: number of bytes the bot may allocate
+    :param output_limit: maximum number of characters the bot may print in one turn
+    :return: none
+    """
+    limit_memory(memory_limit)
+    heights_memory = None
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            break
+        command = message[0]
+        if command == "attack":
+            tanks, heights_name, heights_length, wind, turn = message[1:]
+            if heights_memory is None or heights_memory.name != heights_name:
+                if heights_memory is not None:
+                    heights_memory.close()
+                heights_memory = SharedMemory(heights_name)
+            heights = np.ndarray((heights_length,), dtype=np.int64, buffer=heights_memory.buf)
+            output = LimitedOutput(output_limit)
+            with redirect_stdout(output):
+                try:
+                    angle, power = bot_object.attack(GameStateSnapshot(tanks, heights, wind, turn))
+                    reply = ("result", float(angle), float(power))
+                except Exception as e:
+                    reply = ("error", f"{type(e).__name__}: {e}")
+            del heights
+            connection.send(reply + (output.getvalue(),))
+        elif command == "last_hit":
+            try:
+                bot_object.update_last_hit(message[1])
+            except Exception:
+                pass
+        elif command == "close":
+            break
+    connection.close()
+
+
+class SandboxedBot(TankBotInterface):
+    """
+    Proxy of a bot hosted in a persistent worker process.
+
+    The bot can not crash or block the game: exceptions, crashes and timeouts of the worker make the bot
+    lose its turn, and a crashed or stuck worker is started again for the next turn. The heightmap is
+    published through shared memory, so it is never pickled; only the small tanks array is sent
+    through the pipe. A snapshot passed to the sandboxed bot is valid only during its attack call.
+    Memory of the worker is limited and output printed by the bot is captured, cut to output_limit
+    characters per turn and logged as "bot.output" events with the bot's name, at most output_rate lines
+    per second.
+    """
+    def __init__(self, bot_object, memory_limit=bot_memory_limit, turn_timeout=bot_turn_timeout,
+                 output_limit=bot_output_limit, output_rate=bot_output_rate):
+        """
+        Init function
+        :param bot_object: bot to host, it is moved to the worker process
+        :param memory_limit: number of bytes the bot may allocate, None for no limit
+        :param turn_timeout: seconds the bot may think about one attack
+        :param output_limit: maximum number of characters the bot may print in one turn
+        :param output_rate: maximum number of output lines logged per second
+        """
+        super().__init__(bot_object.get_name(), bot_object.get_preferred_color())
+        self.bot_object = bot_object
+        self.allow_speculation = bot_object.allow_speculation
+        self.memory_limit = memory_limit
+        self.turn_timeout = turn_timeout
+        self.output_limit = output_limit
+        self.output_rate = output_rate
+        # lines which may be logged now, they are refilled at output_rate up to one second of lines
+        self.output_allowance = output_rate
+        self.output_time = time.monotonic()
+        self.process = None
+        self.connection = None
+        self.heights_memory = None
+
+    def start(self):
+        """
+        Starts the worker process
+        :return: none
+        """
+        context = multiprocessing.get_context()
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(target=run_bot_worker, name=f"bot-{self.get_name()}",
+                                       args=(worker_connection, self.bot_object, self.memory_limit,
+                                             self.output_limit),
+                                       daemon=True)
+        self.process.start()
+        worker_connection.close()
+
+    def stop(self):
+        """
+        Stops the worker process, it is killed if it does not end by itself
+        :return: none
+        """
+        if self.process is None:
+            return
+        try:
+            self.connection.send(("close",))
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+        self.process = None
+        self.connection = None
+
+    def close(self):
+        """
+        Stops the worker and releases shared memory
+        :return: none
+        """
+        self.stop()
+        if self.heights_memory is not None:
+            self.heights_memory.close()
+            self.heights_memory.unlink()
+            self.heights_memory = None
+
+    def get_state(self):
+        """
+        State of the bot lives in the worker process, it is not saved in checkpoints
+        :return: None
+        """
+        return None
+
+    def publish_heights(self, heights):
+        """
+        Copies heightmap to the shared memory block, the block is created on first use
+        :param heights: heightmap array
+        :return: none
+        """
+        if self.heights_memory is None or self.heights_memory.size < heights.nbytes:
+            if self.heights_memory is not None:
+                self.heights_memory.close()
+                self.heights_memory.unlink()
+            self.heights_memory = SharedMemory(create=True, size=max(heights.nbytes, 1))
+        shared_heights = np.ndarray(heights.shape, dtype=np.int64, buffer=self.heights_memory.buf)
+        shared_heights[:] = heights
+        del shared_heights
+
+    def attack(self, other_bots):
+        """
+        Asks the bot in the worker process for angle and power
+        :param other_bots: GameStateSnapshot
+        :return: (angle, power)
+        """
+        # shared memory is created before the worker, so the worker uses the resource tracker of the game
+        self.publish_heights(other_bots.heights)
+        if self.process is None or not self.process.is_alive():
+            self.stop()
+            self.start()
+        try:
+            self.connection.send(("attack", np.array(other_bots.tanks), self.heights_memory.name,
+                                  len(other_bots.heights), other_bots.wind, other_bots.turn))
+            answered = self.connection.poll(self.turn_timeout)
+            reply = self.connection.recv() if answered else None
+        except (EOFError, OSError):
+            self.process.join(1)
+            exit_code = self.process.exitcode
+            self.stop()
+            raise RuntimeError(f"bot process ended (exit code {exit_code})")
+        if not answered:
+            self.process.kill()
+            self.stop()
+            raise TimeoutError(f"no answer in {self.turn_timeout} s")
+
+        if reply[-1]:
+            self.log_output(reply[-1].splitlines())
+        if reply[0] == "error":
+            raise RuntimeError(reply[1])
+        return reply[1], reply[2]
+
+    def log_output(self, lines):
+        """
+        Logs lines printed by the bot, lines over the rate limit are dropped
+        :param lines: list of lines
+        :return: none
+        """
+        now = time.monotonic()
+        self.output_allowance = min(self.output_rate,
+                                    self.output_allowance + (now - self.output_time) * self.output_rate)
+        self.output_time = now
+        kept = min(len(lines), int(self.output_allowance))
+        self.output_allowance -= kept
+        for line in lines[:kept]:
+            events.emit("bot.output", "[{bot}] {line}", bot=self.get_name(), line=line)
+        if kept < len(lines):
+            events.emit("bot.output_dropped", "[{bot}] ... {lines} lines dropped", events.WARNING,
+                        bot=self.get_name(), lines=len(lines) - kept)
+
+    def update_last_hit(self, position):
+        """
+        Stores the last hit and passes it to the bot in the worker process
+        :param position: coordinates of last hit
+        :return: none
+        """
+        super().update_last_hit(position)
+        if self.process is not None:
+            try:
+                self.connection.send(("last_hit", position))
+            except (OSError, ValueError):
+                pass
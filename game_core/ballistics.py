@@ -0,0 +1,324 @@
+"""
+Inverse ballistics of the simple shell for bots.
+
+Flight of a shell depends only on the integer angle and power chosen by a bot: the turret is set exactly
+to the angle, the turret end is offset from the tank position by the angle alone, and every step of
+shell_trajectory adds integer increments which do not depend on the start. So all trajectories are
+computed once relative to the tank position, with the same arithmetic as the game. For each angle,
+power and column distance from the tank the table keeps the y coordinate in which the shell crosses
+that column. A shot at a target is then found by comparing one (angle, power) slice of the table with
+the target height and checking terrain clearance of the few candidates.
+Trajectories of negative angles are mirror images of positive ones and are not stored.
+
+The tables are generated once and stored as .npy files in trajectory_cache_dir, named after a hash
+of the physics constants, so a change of the constants makes a new cache. They are memory-mapped,
+so processes of bots share them. fire_simple_shell reads shell positions from the same cache.
+"""
+import hashlib
+import os
+from math import sin, cos, radians, degrees
+
+import numpy as np
+
+from game_core.constants import *
+from game_core.utils import shell_trajectory
+
+# bots choose angles -90..90 and powers 0..100, angle 0 and power 0 are not fired by the game
+min_angle = -90
+max_angle = 90
+max_power = 100
+# y of columns the shell never crosses
+unreachable = np.iinfo(np.int16).max
+# version of the layout of cached tables, part of physics_version
+table_format = 1
+
+_shell_steps = None
+_elapsed_times = None
+
+
+def muzzle_offset(angle):
+    """
+    Returns position of the turret end relative to the tank position, as in Tank.update_turret_end_coordinates
+    :param angle: angle in degrees
+    :return: (dx, dy) tuple
+    """
+    turret_angle = radians(angle)
+    return int(sin(turret_angle) * turret_length), -2 - int(cos(turret_angle) * turret_length)
+
+
+def physics_version():
+    """
+    Returns version of the shot physics, cached tables are stored under it and are rebuilt when it changes
+    :return: short hash of the constants the trajectories depend on
+    """
+    constants = (table_format, display_width, display_height, turret_length, min_shell_speed, max_shell_speed,
+                 shell_speed_step, max_angle, max_power)
+    return hashlib.sha1(repr(constants).encode()).hexdigest()[:12]
+
+
+def cached_array(name, build):
+    """
+    Returns array from the trajectory cache as read-only memory map, it is built and stored on the first use
+    :param name: name of the table
+    :param build: function computing the array
+    :return: NumPy array
+    """
+    path = os.path.join(trajectory_cache_dir, f"{name}-{physics_version()}.npy")
+    if os.path.exists(path):
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            pass
+    array = build()
+    try:
+        os.makedirs(trajectory_cache_dir, exist_ok=True)
+        # written to a temporary file first, so other processes never map a half written table
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as cache_file:
+            np.save(cache_file, array)
+        os.replace(temporary_path, path)
+        return np.load(path, mmap_mode="r")
+    except OSError:
+        return array
+
+
+def build_shell_steps():
+    """
+    Computes shell positions of all shots relative to the turret end, with the arithmetic of shell_trajectory
+    :return: int32 array of shape (2, 91 angles, 101 powers, steps) with x and y offsets after each step,
+             steps go on until every shell falls 2 * display_height below the turret end
+    """
+    speeds = np.array([min_shell_speed + shell_speed_step * power for power in range(max_power + 1)])
+    turret_angles = [radians(angle) for angle in range(max_angle + 1)]
+    horizontal_speeds = np.array([[[speed * sin(turret_angle)] for speed in speeds] for turret_angle in turret_angles])
+    vertical_speeds = np.array([[[speed * cos(turret_angle)] for speed in speeds] for turret_angle in turret_angles])
+
+    steps = 64
+    while True:
+        # elapsed time is accumulated by repeated addition, like in shell_trajectory
+        elapsed_times = np.add.accumulate(np.full(steps, 0.1))
+        xs = np.cumsum(np.trunc(horizontal_speeds * elapsed_times), axis=2)
+        ys = np.cumsum(np.trunc(-(vertical_speeds - 10 * elapsed_times / 2) * elapsed_times), axis=2)
+        if (ys[:, :, -1] > 2 * display_height).all():
+            return np.stack([xs, ys]).astype(np.int32)
+        steps *= 2
+
+
+def shell_steps():
+    """
+    Returns shell positions of all shots relative to the turret end (see build_shell_steps), from the cache
+    :return: read-only int32 array
+    """
+    global _shell_steps
+    if _shell_steps is None:
+        _shell_steps = cached_array("trajectories", build_shell_steps)
+    return _shell_steps
+
+
+def lookup_shell_trajectory(start_position, gun_angle, power):
+    """
+    Generates the same positions as shell_trajectory, read from the precomputed table when the turret is set to
+    an integer angle in degrees and power is an integer, so the shot is not integrated again
+    :param start_position: (x, y) coordinates of the turret end
+    :param gun_angle: turret angle in radians
+    :param power: shell power (0-100)
+    :return: generator of (previous position, current position) tuples
+    """
+    angle = round(degrees(gun_angle))
+    if radians(angle) != gun_angle or power != int(power) or not 0 <= power <= max_power:
+        yield from shell_trajectory(start_position, gun_angle, power)
+        return
+
+    steps = shell_steps()
+    direction = 1 if angle >= 0 else -1
+    xs = (start_position[0] + direction * steps[0, abs(angle), int(power)]).tolist()
+    ys = (start_position[1] + steps[1, abs(angle), int(power)]).tolist()
+    shell_position = tuple(start_position)
+    for shell_x, shell_y in zip(xs, ys):
+        prev_shell_position, shell_position = shell_position, (shell_x, shell_y)
+        yield prev_shell_position, shell_position
+    # shots starting above the display fly longer than the table, the rest is integrated from its last position
+    yield from shell_trajectory(shell_position, gun_angle, power, elapsed_time_after(len(xs)))
+
+
+def elapsed_time_after(steps):
+    """
+    Returns flight time of the step following the given number of steps, accumulated by repeated addition
+    like in shell_trajectory, so a continued shot stays exactly on its trajectory
+    :param steps: number of steps already made
+    :return: elapsed time in seconds
+    """
+    global _elapsed_times
+    if _elapsed_times is None or len(_elapsed_times) <= steps:
+        _elapsed_times = np.add.accumulate(np.full(steps + 1, 0.1)).tolist()
+    return _elapsed_times[steps]
+
+
+def relative_trajectories(angle):
+    """
+    Returns trajectories of all powers for the angle.
+    Trajectories end before the shell falls 2 * display_height below the tank, where the game stops every shot.
+    :param angle: angle in degrees
+    :return: (xs, ys) arrays of shape (powers, steps + 1) relative to the tank position, first point is
+             the turret end, points after the end of a trajectory repeat its last point
+    """
+    start_x, start_y = muzzle_offset(angle)
+    steps = shell_steps()
+    rows = max_power + 1
+    xs = np.hstack([np.zeros((rows, 1), dtype=np.int64), steps[0, abs(angle)]]) * (1 if angle >= 0 else -1) + start_x
+    ys = np.hstack([np.zeros((rows, 1), dtype=np.int64), steps[1, abs(angle)]]) + start_y
+    # the game stops the shot before checking the segment which ends below the limit
+    below_limit = ys > 2 * display_height
+    last = np.where(below_limit.any(axis=1), np.argmax(below_limit, axis=1) - 1, ys.shape[1] - 1)
+    end_points = np.minimum(np.arange(xs.shape[1]), last[:, np.newaxis])
+    rows = np.arange(rows)[:, np.newaxis]
+    return xs[rows, end_points], ys[rows, end_points]
+
+
+class TrajectoryTable:
+    """
+    Column crossings of all trajectories relative to the tank position
+    """
+    def __init__(self, crossings=None):
+        """
+        Init function
+        :param crossings: precomputed table (see build), it is taken from the trajectory cache when None
+        """
+        self.crossings = cached_array("crossings", self.build) if crossings is None else crossings
+
+    @staticmethod
+    def build():
+        """
+        Computes the table
+        :return: int16 array of shape (91 angles, 101 powers, display_width columns) with y coordinate
+                 (rounded down) in which the shell crosses the column distance from the tank, relative to the
+                 tank position; unreachable where the shell does not get to the column
+        """
+        columns = np.arange(display_width)
+        crossings = np.full((max_angle + 1, max_power + 1, display_width), unreachable, dtype=np.int16)
+        for angle in range(1, max_angle + 1):
+            xs, ys = relative_trajectories(angle)
+            for power in range(max_power + 1):
+                reached = columns <= xs[power, -1]
+                path = np.interp(columns[reached], xs[power], ys[power])
+                crossings[angle, power, reached] = np.clip(np.floor(path), -unreachable, unreachable - 1)
+                crossings[angle, power, :xs[power, 0]] = unreachable
+        return crossings
+
+    def path(self, angle, power):
+        """
+        Returns y coordinates of the shell in columns of the shot direction
+        :param angle: angle in degrees, sign gives the direction
+        :param power: power
+        :return: int16 array, index is the distance from the tank
+        """
+        return self.crossings[abs(angle), power]
+
+
+class BallisticSolver:
+    """
+    Finds angle and power hitting a target, in display coordinates (y grows downwards)
+    """
+    def __init__(self, table=None):
+        """
+        Init function
+        :param table: TrajectoryTable, shared default table when None
+        """
+        self.table = table or default_table()
+
+    def ground_profile(self, tank_x, direction, heights):
+        """
+        Returns ground heights in the columns of the shot direction
+        :param tank_x: x coordinate of the tank
+        :param direction: 1 for right, -1 for left
+        :param heights: heightmap
+        :return: array, index is the distance from the tank
+        """
+        # there is no ground outside of the display, the shell flies through these columns
+        profile = np.full(display_width, np.iinfo(np.int64).max, dtype=np.int64)
+        if direction > 0:
+            visible = np.asarray(heights[tank_x:tank_x + display_width])
+        else:
+            visible = np.asarray(heights[max(0, tank_x - display_width + 1):tank_x + 1])[::-1]
+        profile[:len(visible)] = visible
+        return profile
+
+    def landing(self, tank_position, angle, power, heights):
+        """
+        Predicts where the shot hits the terrain or the bottom of the display
+        :param tank_position: (x, y) position of the tank
+        :param angle: angle in degrees
+        :param power: power
+        :param heights: heightmap
+        :return: (x, y) of the hit or None if the shell leaves the display
+        """
+        direction = 1 if angle >= 0 else -1
+        relative_path = self.table.path(angle, power)
+        path = relative_path.astype(np.int64) + tank_position[1]
+        ground = self.ground_profile(tank_position[0], direction, heights)
+        hits = np.flatnonzero((path >= ground) & (relative_path != unreachable))
+        if not len(hits):
+            return None
+        return tank_position[0] + direction * int(hits[0]), int(min(path[hits[0]], display_height))
+
+    def solve(self, tank_position, target, heights, tolerance=tank_height, max_candidates=20):
+        """
+        Finds a shot which reaches the target column at the target height and clears the terrain before it
+        :param tank_position: (x, y) position of the shooting tank
+        :param target: (x, y) point to hit
+        :param heights: heightmap
+        :param tolerance: maximum vertical distance from the target
+        :param max_candidates: number of closest shots checked for terrain clearance
+        :return: (angle, power) with angle in degrees, or None if no shot reaches the target
+        """
+        distance = int(target[0]) - int(tank_position[0])
+        direction = 1 if distance >= 0 else -1
+        column = abs(distance)
+        if column >= display_width:
+            return None
+        target_y = int(target[1]) - int(tank_position[1])
+        misses = np.abs(self.table.crossings[:, :, column].astype(np.int64) - target_y)
+        misses[0, :] = unreachable
+        misses[:, 0] = unreachable
+        candidates = np.flatnonzero(misses <= tolerance)
+        if not len(candidates):
+            return None
+        candidates = candidates[np.argsort(misses.flat[candidates], kind="stable")][:max_candidates]
+
+        ground = self.ground_profile(tank_position[0], direction, heights)[:column] - int(tank_position[1])
+        for candidate in candidates:
+            angle, power = divmod(int(candidate), max_power + 1)
+            path = self.table.crossings[angle, power, :column]
+            start = muzzle_offset(angle)[0]
+            if (path[start:] < ground[start:]).all():
+                return direction * angle, power
+        return None
+
+    def solve_for_bot(self, snapshot, my_name, target_name):
+        """
+        Finds a shot at another tank for a bot
+        :param snapshot: GameStateSnapshot given to the bot
+        :param my_name: name of the shooting tank
+        :param target_name: name of the target tank
+        :return: (angle, power) or None
+        """
+        tanks = {tank["name"]: tank["position"] for tank in snapshot}
+        my_x, my_y = tanks[my_name]
+        target_x, target_y = tanks[target_name]
+        # bots get the height above the bottom of the display, the solver uses display coordinates
+        return self.solve((my_x, display_height - my_y), (target_x, display_height - target_y + tank_height // 2),
+                          snapshot.heights)
+
+
+_default_table = None
+
+
+def default_table():
+    """
+    Returns trajectory table shared by all solvers, it is loaded on the first call
+    :return: TrajectoryTable
+    """
+    global _default_table
+    if _default_table is None:
+        _default_table = TrajectoryTable()
+    return _default_table
@@ -0,0 +1,82 @@
+from game_core.constants import *
+
+
+class Camera:
+    """
+    Horizontal viewport of the world.
+
+    The world (terrain, tanks, shells) may be many times wider than the display, the display shows
+    view_width columns of it starting at world column x. Everything in the world is kept in world
+    coordinates and converted to display coordinates only when drawn, so drawing costs depend on the
+    visible columns, not on the width of the world. The world is as high as the display.
+    """
+    def __init__(self, map_width=world_width, view_width=display_width):
+        """
+        Init function
+        :param map_width: width of the world
+        :param view_width: width of the display
+        """
+        self.map_width = map_width
+        self.view_width = view_width
+        self.x = 0
+
+    def move_to(self, x):
+        """
+        Moves left edge of the view to the world column x, the view never leaves the world
+        :param x: world x coordinate
+        :return: none
+        """
+        self.x = int(min(max(x, 0), max(self.map_width - self.view_width, 0)))
+
+    def center_on(self, x):
+        """
+        Moves the view so that the world column x is in its middle
+        :param x: world x coordinate
+        :return: none
+        """
+        self.move_to(x - self.view_width // 2)
+
+    def follow(self, x, margin=camera_margin):
+        """
+        Centers the view on x if x is closer than margin to its edges, otherwise the view stays
+        :param x: world x coordinate
+        :param margin: distance from the edges of the view
+        :return: True if the view moved
+        """
+        if self.x + margin <= x < self.x + self.view_width - margin:
+            return False
+        previous = self.x
+        self.center_on(x)
+        return self.x != previous
+
+    def visible_columns(self):
+        """
+        Returns world columns shown on the display
+        :return: slice of the heightmap
+        """
+        return slice(self.x, min(self.x + self.view_width, self.map_width))
+
+    def is_visible(self, x, margin=0):
+        """
+        Checks whether world column x is on the display
+        :param x: world x coordinate
+        :param margin: distance outside the view which still counts as visible (e.g. width of a sprite)
+        :return: True if visible
+        """
+        return self.x - margin <= x < self.x + self.view_width + margin
+
+    def to_screen(self, position):
+        """
+        Converts world coordinates to display coordinates
+        :param position: (x, y) world coordinates
+        :return: (x, y) display coordinates as tuple
+        """
+        return position[0] - self.x, position[1]
+
+    def to_world(self, position):
+        """
+        Converts display coordinates to world coordinates
+        :param position: (x, y) display coordinates
+        :return: (x, y) world coordinates as tuple
+        """
+        return position[0] + self.x, position[1]
@@ -0,0 +1,43 @@
+import os
+import pickle
+import tempfile
+
+from game_core.constants import *
+
+
+def write_checkpoint(path, state):
+    """
+    Writes a checkpoint atomically: the state is pickled to a temporary file in the same folder, synced to disk
+    and renamed over the previous checkpoint, so a process killed while writing leaves the previous checkpoint
+    :param path: path of the checkpoint file
+    :param state: picklable state (see GameManager.capture_state)
+    :return: none
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(dir=folder, prefix=".checkpoint-")
+    try:
+        with os.fdopen(descriptor, "wb") as stream:
+            pickle.dump((checkpoint_version, state), stream, protocol=pickle.HIGHEST_PROTOCOL)
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def read_checkpoint(path):
+    """
+    Reads a checkpoint written by write_checkpoint
+    :param path: path of the checkpoint file
+    :return: state, None if there is no checkpoint
+    """
+    try:
+        with open(path, "rb") as stream:
+            version, state = pickle.load(stream)
+    except FileNotFoundError:
+        return None
+    if version != checkpoint_version:
+        raise ValueError(f"Checkpoint {path} has version {version}, version {checkpoint_version} is supported")
+    return state
@@ -0,0 +1,57 @@
+from functools import lru_cache
+
+import numpy as np
+import pygame
+
+from game_core.constants import *
+
+
+@lru_cache(maxsize=1)
+def player_palette():
+    """
+    Returns names of colors given to players without a valid free preferred color, in the order they are given.
+    The palette starts with the former fixed list of free colors, the other colors of pygame.color.THECOLORS
+    follow in farthest-first order: each next color is the one most different from all colors before it
+    and from player_reserved_colors, so even large matches get distinguishable colors. Colors too dark
+    to see on the black sky are left out.
+    The order depends only on the pygame color table, so it is the same in every match.
+    :return: tuple of color names
+    """
+    names = list(player_base_colors)
+    candidates = sorted(name for name in pygame.color.THECOLORS if name not in names)
+    rgb = np.array([tuple(pygame.color.THECOLORS[name])[:3] for name in candidates], dtype=float)
+    bright = rgb @ np.array([0.299, 0.587, 0.114]) >= player_color_min_brightness
+    candidates = [name for name, keep in zip(candidates, bright) if keep]
+    rgb = rgb[bright]
+
+    # colors of the sky, highlight of the active tank and ground are kept away from as if they were chosen
+    chosen = np.array([tuple(pygame.color.THECOLORS[name])[:3] for name in names] + list(player_reserved_colors),
+                      dtype=float)
+    # distance of each candidate to the nearest chosen color
+    distances = np.sqrt(((rgb[:, np.newaxis, :] - chosen[np.newaxis, :, :]) ** 2).sum(axis=2)).min(axis=1)
+    while len(candidates) and distances.max() > 0:
+        index = int(np.argmax(distances))
+        names.append(candidates[index])
+        distances = np.minimum(distances, np.sqrt(((rgb - rgb[index]) ** 2).sum(axis=1)))
+    return tuple(names)
+
+
+def assign_colors(preferred_colors):
+    """
+    Assigns distinct colors to players, in the order of players. A player gets its preferred color if it is
+    a pygame color not used yet, otherwise the first unused color of player_palette.
+    :param preferred_colors: list of preferred color names of the players
+    :return: list of color names
+    """
+    used = set()
+    palette = iter(player_palette())
+    colors = []
+    for preferred_color in preferred_colors:
+        if preferred_color in pygame.color.THECOLORS and \
+                tuple(pygame.color.THECOLORS[preferred_color]) not in used:
+            color = preferred_color
+        else:
+            color = next(name for name in palette if tuple(pygame.color.THECOLORS[name]) not in used)
+        used.add(tuple(pygame.color.THECOLORS[color]))
+        colors.append(color)
+    return colors
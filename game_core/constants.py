@@ -4,6 +4,11 @@ from math import pi
 # set up global variables
 display_width = 1600
 display_height = 900
+# width of the world (terrain), it may be many times the display width, the display shows the part
+# of the world seen by the camera (see camera.py); the world is as high as the display
+world_width = display_width
+# the camera moves when the followed tank or shell gets closer than this to the edge of the display
+camera_margin = 200
 
 # color constants
 white = (255, 255, 255)
@@ -19,6 +24,11 @@ dark_green = (0x13, 0x70, 0x2c)
 orange = (0xDC, 0x64, 0x0F)
 dark_gray = (0x54, 0x4C, 0x46)
 player_colors = [red, green, blue, nice_color, orange, dark_gray]
+# pygame colors given to players without a valid free preferred color come first from this list,
+# then from the rest of pygame colors at least this bright (see colors.py)
+player_base_colors = ['magenta', 'cyan', 'orange', 'yellow', 'purple', 'blue', 'green', 'red']
+player_color_min_brightness = 80
+player_reserved_colors = [black, white, dark_green]
 
 # tank constants
 tank_width = 40
@@ -33,6 +43,8 @@ initial_turret_angle = -pi/2
 initial_tank_health = 100
 tank_explosion_power = 40
 tank_explosion_radius = 100
+# smallest distance between centers of tanks placed at the start of a match
+tank_spacing = tank_width + 10
 
 # simple shell constants
 min_shell_speed = 12
@@ -41,17 +53,92 @@ shell_speed_step = (max_shell_speed-min_shell_speed)/100
 simple_shell_power = 80
 simple_shell_radius = 50
 
+# explosion debris constants (see debris.py), life in frames of 60 fps animation
+debris_particles_per_radius = 8
+debris_life = 60
+debris_gravity = 0.5
+
 # temporary simple ground
 ground_height_min = 500
 ground_height_max = 800
 
+# terrain is summarized in chunks of this many columns (see terrain.py)
+terrain_chunk_width = 64
+# heightmaps of maps wider than terrain_spill_width columns are kept in memory-mapped temporary files
+# in terrain_spill_dir, None keeps all heightmaps in memory
+terrain_spill_dir = None
+terrain_spill_width = 100000
+
+# physics backend used for terrain and collisions: "numpy" or "shapely" (reference implementation)
+physics_backend = "numpy"
+# folder of precomputed trajectory tables (see ballistics.py)
+trajectory_cache_dir = "cache"
+
 # player settings
+# health bars of one HUD page, with more players the HUD shows the page of the active player
 health_bar_init_positions = [(10, 10), (1390, 10), (10, 65), (1390, 65), (10, 120), (1390, 120)]
 health_bar_length = 200
 players_number = 3
-max_players_number = 6
+max_players_number = 64
 tanks_number = 1
-max_tanks_number = 1
+max_tanks_number = 20
+# players with at least this many tanks get one health bar for all their tanks
+compact_hud_tanks_number = 3
+
+# in simultaneous mode all bots aim at the same time and their shells fly together (see GameManager);
+# with more workers bots are asked in parallel threads, so bots using the random module make seeded
+# matches irreproducible
+simultaneous_turns = False
+simultaneous_bot_workers = 1
+
+# with speculation the bots of the next players are asked for their attacks while the current shell flies
+# (see speculation.py), one player for each worker; only bots with allow_speculation are asked early
+speculative_bot_decisions = False
+speculative_bot_workers = 1
+
+# bot sandbox settings, with the sandbox each bot runs in its own process (see bots/sandbox.py)
+bot_sandbox_enabled = False
+bot_memory_limit = 512 * 1024 * 1024
+bot_turn_timeout = 5.0
+bot_output_limit = 2000
+# lines of bot output forwarded to the event log per second, each bot may use up one second of them at once
+bot_output_rate = 20
+# maximum size in bytes of one message of the bot protocol (see bots/gateway.py), snapshots of wide worlds
+# are megabytes long
+bot_message_limit = 64 * 1024 * 1024
+
+# profiling settings
+profiling_enabled = False
+profiling_output_dir = "profiles"
+profiling_cprofile = False
+
+# event log (see events.py): JSON lines file (None disables it), lowest levels of the file and of the console
+# (None disables the console), sampling {event name: n} keeps each n-th event of the name
+event_log_path = None
+event_log_level = "INFO"
+event_console_level = "INFO"
+event_log_sampling = {}
+event_log_background = False
+event_log_buffer_size = 256
+
+# match checkpoints (see checkpoint.py): file of the checkpoint (None disables them), headless matches write it
+# every checkpoint_turns turns
+checkpoint_file = None
+checkpoint_turns = 20
+checkpoint_version = 1
+
+# bot evaluation settings (see bots/evaluation.py)
+evaluation_confidence = 0.95
+evaluation_min_matches = 20
+evaluation_max_matches = 400
+evaluation_even_margin = 0.1
+evaluation_max_turns = 200
+
+# match results database (see results.py), None disables recording
+results_db_path = None
+results_batch_size = 1000
+elo_k_factor = 32
+elo_initial_rating = 1500
 
 
 # PyGame fonts
@@ -0,0 +1,68 @@
+import numpy as np
+
+from game_core.constants import *
+from libs.pyIgnition import particles
+from libs.pyIgnition.particleEffect import ParticleEffect
+
+
+class DebrisEffect(ParticleEffect):
+    """
+    Explosion debris which falls on the terrain.
+
+    Particles are thrown out of the explosion, fall with gravity and settle on the ground where they land.
+    The terrain is not made of pyIgnition obstacles: after each update all particles are checked against
+    the heightmap with one array lookup, particles at or below the ground are put on its surface and stopped.
+    """
+    def __init__(self, game_display, heights=None):
+        """
+        Init function
+        :param game_display: display to draw on
+        :param heights: heightmap, ground y for each x (see Ground.heights), debris falls to the bottom of the
+                        display when None
+        """
+        super().__init__(game_display, (0, 0), (display_width, display_height))
+        self.heights = np.full(display_width, display_height) if heights is None else heights
+        self.CreateDirectedGravity(debris_gravity, 0.0, [0, 1])
+
+    def explode(self, point, size, count=None):
+        """
+        Throws debris out of the explosion
+        :param point: (x, y) coordinates of the explosion
+        :param size: radius of the explosion
+        :param count: number of particles, debris_particles_per_radius per pixel of radius by default
+        :return: none
+        """
+        count = size * debris_particles_per_radius if count is None else count
+        source = self.CreateSource((float(point[0]), float(point[1])), initspeed=size / 12,
+                                   initdirectionrandrange=1.3, initspeedrandrange=size / 15, particlelife=debris_life,
+                                   drawtype=particles.DRAWTYPE_CIRCLE, colour=white, radius=3.0)
+        source.CreateParticleKeyframe(debris_life // 4, colour=orange, radius=2.0)
+        source.CreateParticleKeyframe(debris_life, colour=dark_gray, radius=1.0)
+        source.CreateParticles(count)
+
+    def settle(self):
+        """
+        Puts particles which got into the ground on its surface and stops them
+        :return: none
+        """
+        if not len(self.positions):
+            return
+        columns = np.floor(self.positions[:, 0]).astype(np.int64)
+        on_map = (columns >= 0) & (columns < len(self.heights))
+        # particles rest one pixel above the ground, so gravity of one frame does not take them off the surface
+        surface = np.full(len(columns), np.inf)
+        surface[on_map] = self.heights[columns[on_map]] - 1
+        landed = self.positions[:, 1] >= surface
+        self.positions[landed, 1] = surface[landed]
+        self.velocities[landed] = 0.0
+
+    def Update(self):
+        super().Update()
+        self.settle()
+
+    def is_finished(self):
+        """
+        Checks if all debris is gone
+        :return: True when no particle is left
+        """
+        return self.GetParticleCount() == 0
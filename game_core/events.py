@@ -0,0 +1,234 @@
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+from time import time
+
+from game_core.constants import *
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+level_names = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+def level_number(level):
+    """
+    Converts a level name to its number
+    :param level: level name, number or None
+    :return: level number, None for None
+    """
+    if level is None or isinstance(level, int):
+        return level
+    return {name: number for number, name in level_names.items()}[level.upper()]
+
+
+def _json_value(value):
+    """
+    Converts values json does not know (NumPy scalars and arrays, snapshots) for JSON lines
+    :param value: value of an event field
+    :return: value json can write
+    """
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+class EventLog:
+    """
+    Structured log of game events replacing print in the game loop.
+
+    An event has a name (e.g. "tank.hit"), a level, fields and a message template formatted with the fields.
+    Events at or above the file level are written to a file as JSON lines, events at or above the console level
+    are written to stdout as their messages. Events below both levels return at once, events with sampling
+    keep only each n-th occurrence, so telemetry of hot paths may stay on. Events are buffered and written
+    in batches of buffer_size, when flushed or when the log is closed; with background=True formatting and
+    writing is done by a writer thread. Each write is a whole number of lines, so logs of several processes
+    appended to one file do not mix within a line.
+    """
+    def __init__(self, path=None, level=event_log_level, console_level=event_console_level, sampling=None,
+                 background=event_log_background, buffer_size=event_log_buffer_size):
+        """
+        Init function
+        :param path: path of the JSON lines file the events are appended to, None disables the file
+        :param level: lowest level written to the file (name or number)
+        :param console_level: lowest level written to stdout, None disables the console
+        :param sampling: dictionary event name -> n, only each n-th event of the name is kept
+        :param background: if True events are written by a writer thread
+        :param buffer_size: number of buffered events written together
+        """
+        self.file = open(path, "a", encoding="utf-8") if path is not None else None
+        self.level = level_number(level) if path is not None else None
+        self.console_level = level_number(console_level)
+        self.min_level = min([level for level in (self.level, self.console_level) if level is not None],
+                             default=ERROR + 1)
+        self.sampling = dict(sampling or {})
+        self.seen = {}
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.queue = None
+        self.thread = None
+        if background:
+            self.queue = queue.SimpleQueue()
+            self.thread = threading.Thread(target=self._write_in_background, name="event-log", daemon=True)
+            self.thread.start()
+
+    def emit(self, name, message="", level=INFO, **fields):
+        """
+        Logs an event
+        :param name: name of the event
+        :param message: message for the console, formatted with the fields only when written
+        :param level: level of the event
+        :param fields: values of the event
+        :return: none
+        """
+        if level < self.min_level:
+            return
+        every = self.sampling.get(name)
+        if every:
+            count = self.seen.get(name, 0)
+            self.seen[name] = count + 1
+            if count % every:
+                return
+        event = (time(), level, name, message, fields)
+        if self.queue is not None:
+            self.queue.put(event)
+            return
+        with self.lock:
+            self.buffer.append(event)
+            if len(self.buffer) < self.buffer_size:
+                return
+            events, self.buffer = self.buffer, []
+        self._write(events)
+
+    def _write(self, events):
+        """
+        Writes events to the file and the console
+        :param events: list of (time, level, name, message, fields) tuples
+        :return: none
+        """
+        if self.file is not None:
+            pid = os.getpid()
+            lines = [json.dumps({"time": event_time, "pid": pid, "level": level_names.get(level, level),
+                                 "event": name, **fields}, default=_json_value) + "\n"
+                     for event_time, level, name, message, fields in events if level >= self.level]
+            if lines:
+                self.file.write("".join(lines))
+                self.file.flush()
+        # stdout is None without a console (pythonw) and inside redirect_stdout(None)
+        if self.console_level is not None and sys.stdout is not None:
+            lines = [message.format(**fields) + "\n"
+                     for event_time, level, name, message, fields in events if level >= self.console_level]
+            if lines:
+                sys.stdout.write("".join(lines))
+                sys.stdout.flush()
+
+    def _write_in_background(self):
+        """
+        Loop of the writer thread: takes all waiting events and writes them at once. A threading.Event in
+        the queue is set when the events before it are written, None stops the thread.
+        :return: none
+        """
+        while True:
+            items = [self.queue.get()]
+            while len(items) < self.buffer_size:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            events = [item for item in items if isinstance(item, tuple)]
+            if events:
+                self._write(events)
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if None in items:
+                return
+
+    def flush(self):
+        """
+        Writes all buffered events
+        :return: none
+        """
+        if self.thread is not None:
+            if self.thread.is_alive():
+                written = threading.Event()
+                self.queue.put(written)
+                written.wait()
+            return
+        with self.lock:
+            events, self.buffer = self.buffer, []
+        if events:
+            self._write(events)
+
+    def close(self):
+        """
+        Writes all buffered events, stops the writer thread and closes the file
+        :return: none
+        """
+        self.flush()
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        # events emitted after closing are buffered and written by flush
+        self.thread = None
+        self.queue = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.level = None
+
+
+_event_log = None
+
+
+def get_event_log():
+    """
+    Returns the event log of the process, created from constants when first used and closed at exit
+    :return: EventLog
+    """
+    global _event_log
+    if _event_log is None:
+        _event_log = EventLog(event_log_path, sampling=event_log_sampling)
+    return _event_log
+
+
+def set_event_log(event_log):
+    """
+    Replaces the event log of the process, the previous one is flushed
+    :param event_log: new EventLog, None to create one from constants when next used
+    :return: previous EventLog or None
+    """
+    global _event_log
+    previous, _event_log = _event_log, event_log
+    if previous is not None:
+        previous.flush()
+    return previous
+
+
+def emit(name, message="", level=INFO, **fields):
+    """
+    Logs an event to the event log of the process (see EventLog.emit)
+    :param name: name of the event
+    :param message: message for the console, formatted with the fields only when written
+    :param level: level of the event
+    :param fields: values of the event
+    :return: none
+    """
+    (_event_log or get_event_log()).emit(name, message, level, **fields)
+
+
+def flush():
+    """
+    Writes buffered events of the event log of the process
+    :return: none
+    """
+    if _event_log is not None:
+        _event_log.flush()
+
+
+atexit.register(lambda: _event_log and _event_log.close())
@@ -1,77 +1,152 @@
+import pickle
 import pygame
-from shapely.geometry import LineString
-from math import sin, cos, radians
-
+import random
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from math import radians
+
+from game_core import events
+from game_core.ballistics import lookup_shell_trajectory
+from game_core.camera import Camera
+from game_core.checkpoint import write_checkpoint
+from game_core.colors import assign_colors
 from game_core.constants import *
 from game_core.ground import Ground
+from game_core.physics import get_backend
+from game_core.placement import FreeGround
 from game_core.player import Player
-from game_core.utils import animate_ground_sloughing, halt_whole_game, animate_explosion, message_to_screen
+from game_core.profiling import Profiler
+from game_core.results import ResultStore, rank_players
+from game_core.snapshot import GameStateSnapshot
+from game_core.speculation import DecisionSpeculator
+from game_core.utils import animate_ground_sloughing, halt_whole_game, animate_explosion, message_to_screen, \
+    sys_text_object
 
 
 class GameManager:
     """
     Class which represents game manager object in game
     """
-    def __init__(self, tank_number, player_objects):
+    def __init__(self, tank_number, player_objects, profiler=None, headless=False, seed=None, backend=None,
+                 map_width=None, simultaneous=None, speculative=None, results=None, checkpoint_path=None,
+                 checkpoint_interval=None):
         """
         Init function
         :param player_number: number of players
         :param tank_number: number of tanks for each player
+        :param profiler: Profiler collecting match timings, by default configured from constants
+        :param headless: if True, game runs without window, sounds, animations and waiting
+        :param seed: seed of random generator applied at the start of each match, None for random matches
+        :param backend: physics backend name or instance, physics_backend constant by default
+        :param map_width: width of the world, world_width constant by default; the display shows a part of it
+        :param simultaneous: if True, all players shoot in each turn (see play_simultaneous_turn),
+                             simultaneous_turns constant by default
+        :param speculative: if True, the next bots decide while the current shell flies (see speculation.py),
+                            speculative_bot_decisions constant by default
+        :param results: ResultStore recording the matches, by default configured from constants
+        :param checkpoint_path: file headless matches are checkpointed to, checkpoint_file constant by default
+        :param checkpoint_interval: number of turns between checkpoints, checkpoint_turns constant by default
         """
         self.players = []
         self.active_player = None
-        self.game_display = pygame.display.set_mode((display_width, display_height))
-        pygame.display.set_caption('ScorchedEarth')
+        self.active_tank = None
+        self.headless = headless
+        self.simultaneous = simultaneous_turns if simultaneous is None else simultaneous
+        speculative = speculative_bot_decisions if speculative is None else speculative
+        self.speculator = DecisionSpeculator() if speculative else None
+        self.seed = seed
+        self.backend = get_backend(backend or physics_backend)
         self.clock = pygame.time.Clock()
-        self.strike_earth_sound = pygame.mixer.Sound(sound_explosion1)
-        self.normal_strike_sound = pygame.mixer.Sound(sound_explosion2)
+        self.camera = Camera(map_width or world_width)
+        if headless:
+            self.game_display = pygame.Surface((display_width, display_height))
+            self.strike_earth_sound = None
+            self.normal_strike_sound = None
+        else:
+            self.game_display = pygame.display.set_mode((display_width, display_height))
+            pygame.display.set_caption('ScorchedEarth')
+            self.strike_earth_sound = pygame.mixer.Sound(sound_explosion1)
+            self.normal_strike_sound = pygame.mixer.Sound(sound_explosion2)
         self.ground = None
         self.players_number = len(player_objects)
         self.player_objects = player_objects
         self.taken_colors = []
         self.tank_number = tank_number
-        self.free_colors = ['red', 'green', 'blue', 'purple', 'yellow', 'orange', 'cyan', 'magenta']
-        self.player_color_dict = {}
+        self.profiler = profiler or Profiler(profiling_enabled, profiling_output_dir, profiling_cprofile)
+        self.results = results or ResultStore(results_db_path)
+        # (turn, player) tuples of players out of the game, in the order they were eliminated
+        self.eliminated = []
+        self.checkpoint_path = checkpoint_path or checkpoint_file
+        self.checkpoint_interval = checkpoint_interval or checkpoint_turns
+        # picklable data of the caller saved with each checkpoint, e.g. progress of a tournament
+        self.checkpoint_data = {}
+        self.match_number = 0
+        self.turn = 0
+        # shells are not affected by wind yet, bots always get calm weather
+        self.wind = 0.0
 
     def reinitialize_players(self):
         """
         Reinitialize available tanks in the game
         :return: none
         """
-        self.ground = Ground(self.game_display)
+        self.match_number += 1
+        self.turn = 0
+        if self.speculator:
+            self.speculator.discard()
+        if self.seed is not None:
+            random.seed(self.seed)
+        self.profiler.start_match()
+        self.eliminated = []
+        self.results.start_match(self.seed, self.backend.name, self.camera.map_width, self.tank_number,
+                                 self.simultaneous)
+        with self.profiler.timer("ground.reinitialize"):
+            self.ground = Ground(self.game_display, backend=self.backend, width=self.camera.map_width)
         self.players = []
-        # Get the RGB values from Pygame's color dictionary
-        for i, player in enumerate(self.player_objects):
-            preferred_color = player.get_preferred_color()
-            # Color is valid and not taken
-            if preferred_color not in self.taken_colors and preferred_color in pygame.color.THECOLORS:
-                color = preferred_color
-                self.taken_colors.append(preferred_color)
-            # Color already taken or invalid :(
-            else:
-                color = self.free_colors.pop()
-            # Create player object
-            self.players.append(Player(self.game_display, self.tank_number, pygame.color.THECOLORS[color], i, player))
-        init_tanks_positions = []
+        # Colors are assigned again in each match, the same way for the same players
+        self.taken_colors = assign_colors([player.get_preferred_color() for player in self.player_objects])
+        for i, (player, color) in enumerate(zip(self.player_objects, self.taken_colors)):
+            # Create player object with the RGB values from Pygame's color dictionary
+            self.players.append(Player(self.game_display, self.tank_number, pygame.color.THECOLORS[color], i, player,
+                                       self.headless, self.camera))
+        free_ground = FreeGround(len(self.ground.heights))
         for player in self.players:
-            player.initialize_tanks(init_tanks_positions, self.ground)
+            player.initialize_tanks(free_ground, self.ground)
         self.active_player = self.players[0]
 
-    def check_collision(self, prev_shell_position, current_shell_position):
+    def tank_boxes(self):
+        """
+        Returns tanks of all players in the order of collision checks and their bounding boxes
+        :return: (list of tanks, array of (left, top, right, bottom) rows) tuple
+        """
+        tanks = [tank for player in self.players for tank in player.active_tanks]
+        boxes = np.array([(tank.position[0] - int(tank_width / 2), tank.position[1],
+                           tank.position[0] + int(tank_width / 2), tank.position[1] + tank_height)
+                          for tank in tanks], dtype=float).reshape(-1, 4)
+        return tanks, boxes
+
+    def check_collision(self, prev_shell_position, current_shell_position, tank_boxes=None):
         """
         Checks collision of shell with other objects and return coordinates of shell collision
         :param prev_shell_position: Coordinates of previous shell position
         :param current_shell_position: Coordinates of updated shell position
+        :param tank_boxes: result of tank_boxes, computed again if None
         :return: Coordinates of collision or None if no collision detected
         """
-        line1 = LineString([prev_shell_position, current_shell_position])
-
-        for player in self.players:
-            intersection = player.check_collision_with_tanks(line1)
+        self.profiler.count("check_collision.calls")
+        tanks, boxes = tank_boxes or self.tank_boxes()
+        # only tanks whose box overlaps the box of the segment can be hit, they are checked in the original order
+        left, right = sorted((prev_shell_position[0], current_shell_position[0]))
+        top, bottom = sorted((prev_shell_position[1], current_shell_position[1]))
+        near = (boxes[:, 0] <= right + 1) & (boxes[:, 2] >= left - 1) & \
+               (boxes[:, 1] <= bottom + 1) & (boxes[:, 3] >= top - 1)
+        for index in np.flatnonzero(near).tolist():
+            intersection = tanks[index].check_collision_with_tank(prev_shell_position, current_shell_position,
+                                                                  self.backend)
             if intersection:
                 return intersection
 
-        return self.ground.check_collision(line1)
+        return self.ground.check_collision(prev_shell_position, current_shell_position)
 
     def correct_ground(self, point, explosion_radius):
         """
@@ -80,10 +155,13 @@ class GameManager:
         :param explosion_radius: radius of explosion
         :return: none
         """
-        left_ground = self.ground.update_after_explosion(point, explosion_radius)
+        with self.profiler.timer("ground.update_after_explosion"):
+            left_ground = self.ground.update_after_explosion(point, explosion_radius)
         if len(left_ground) > 0:
-            self.draw_all()
-            animate_ground_sloughing(self.game_display, left_ground, self.ground)
+            if not self.headless:
+                self.draw_all()
+                frames = animate_ground_sloughing(self.game_display, left_ground, self.ground, self.camera)
+                self.profiler.count("ground.sloughing_frames", frames)
             self.ground.update_after_sloughing(left_ground)
 
     def apply_players_damages(self, collision_point, shell_power, shell_radius):
@@ -96,12 +174,33 @@ class GameManager:
         """
         explosion_points = []
         for player in self.players:
-            explosion_points.extend(player.apply_damage(collision_point, shell_power, shell_radius))
+            explosion_points.extend(player.apply_damage(collision_point, shell_power, shell_radius, self.ground.heights))
         if len(explosion_points) > 0:
             for point in explosion_points:
                 self.correct_ground(point, tank_explosion_radius)
                 self.apply_players_damages(point, tank_explosion_power, tank_explosion_radius)
 
+    def explode_shell(self, collision_point, shooter):
+        """
+        Applies explosion of a shell: changes the ground, damages tanks and lets tanks fall on the new ground
+        :param collision_point: point of collision
+        :param shooter: player who fired the shell, damages are recorded for it
+        :return: True if a tank of another player was damaged (only known when results are recorded)
+        """
+        if self.results.enabled:
+            healths = [(player, tank, tank.tank_health) for player in self.players for tank in player.active_tanks]
+        self.correct_ground(collision_point, simple_shell_radius)
+        self.apply_players_damages(collision_point, simple_shell_power, simple_shell_radius)
+        self.correct_tanks_heights()
+        hit = False
+        if self.results.enabled:
+            for player, tank, health in healths:
+                if tank.tank_health < health:
+                    self.results.record_damage(self.turn, shooter.name, player.name, health - tank.tank_health,
+                                               tank.tank_health == 0)
+                    hit = hit or player is not shooter
+        return hit
+
     def correct_tanks_heights(self):
         """
         Corrects heights of all players' tanks
@@ -110,49 +209,190 @@ class GameManager:
         for player in self.players:
             player.correct_tanks_heights(self.ground)
 
-    def fire_simple_shell(self, tank_object):
+    def fire_simple_shell(self, tank_object, shooter=None):
         """
         Show animation of shooting simple shell
         :param tank_object: tank object that shoots the shell
+        :param shooter: player owning the tank, the active player by default
         :return: none
         """
+        shooter = shooter or self.active_player
         (power, gun_angle, fire_sound, color, gun_end_coord) = tank_object.get_init_data_for_shell()
-        pygame.mixer.Sound.play(fire_sound)
-        speed = min_shell_speed + shell_speed_step * power
-        shell_position = list(gun_end_coord)
-        elapsed_time = 0.1
+        if not self.headless:
+            pygame.mixer.Sound.play(fire_sound)
+        shell_position = gun_end_coord
+        steps = 0
+        # tanks do not move while the shell flies
+        tank_boxes = self.tank_boxes()
+        hit = False
+
+        for prev_shell_position, shell_position in lookup_shell_trajectory(gun_end_coord, gun_angle, power):
+            steps += 1
+            if not self.headless:
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        halt_whole_game()
 
-        fire = True
+            if shell_position[1] > 2 * display_height:
+                break
 
-        while fire:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    halt_whole_game()
+            collision_point = self.check_collision(prev_shell_position, shell_position, tank_boxes)
 
-            prev_shell_position = list(shell_position)
-            vertical_speed = -((speed * cos(gun_angle)) - 10 * elapsed_time / 2)
-            horizontal_speed = (speed * sin(gun_angle))
-            shell_position[0] += int(horizontal_speed * elapsed_time)
-            shell_position[1] += int(vertical_speed * elapsed_time)
-            elapsed_time += 0.1
+            if collision_point:
+                if not self.headless:
+                    animate_explosion(self.game_display, collision_point, self.strike_earth_sound, simple_shell_radius,
+                                      self.ground.heights, self.camera)
+                hit = self.explode_shell(collision_point, shooter)
+            elif not self.headless:
+                # the view follows the shell, the scene is drawn again when it moves
+                if self.camera.follow(shell_position[0]):
+                    self.draw_all()
+                pygame.draw.circle(self.game_display, color, self.camera.to_screen(shell_position), 4)
+
+            if not self.headless:
+                pygame.display.update()
+                self.clock.tick(60)
+            if collision_point:
+                break
+        self.profiler.count("fire_simple_shell.shots")
+        self.profiler.count("fire_simple_shell.steps", steps)
+        self.results.record_shot(self.turn, shooter.name, shell_position, hit)
+        return shell_position[0], shell_position[1]
 
+    def shell_path(self, tank_object):
+        """
+        Returns positions of the shell fired by the tank with its current angle and power, until the shell falls
+        so low that the game stops it
+        :param tank_object: tank object that shoots the shell
+        :return: list of (x, y) positions, the first one is the turret end
+        """
+        (power, gun_angle, fire_sound, color, gun_end_coord) = tank_object.get_init_data_for_shell()
+        positions = [tuple(gun_end_coord)]
+        for prev_shell_position, shell_position in lookup_shell_trajectory(gun_end_coord, gun_angle, power):
+            positions.append(shell_position)
             if shell_position[1] > 2 * display_height:
                 break
+        return positions
 
-            collision_point = self.check_collision(prev_shell_position, shell_position)
-
+    def find_shell_impacts(self, paths):
+        """
+        Finds where shells flying together hit tanks or terrain, all in the state of the start of the turn.
+        Segments of all shells are checked at once against tank boxes and terrain chunk summaries, the exact
+        checks of check_collision run only for the segments close to a tank or the ground.
+        :param paths: list of shell paths (see shell_path)
+        :return: list of (step, collision point) tuples, step is None for shells which hit nothing
+        """
+        tanks, boxes = self.tank_boxes()
+        # the last segment of a stopped shell ends below the limit and is not checked, like in fire_simple_shell
+        checked = [path[:-1] if path[-1][1] > 2 * display_height else path for path in paths]
+        shells = np.repeat(np.arange(len(paths)), [max(len(path) - 1, 0) for path in checked])
+        starts = np.array([position for path in checked for position in path[:-1]], dtype=np.int64).reshape(-1, 2)
+        ends = np.array([position for path in checked for position in path[1:]], dtype=np.int64).reshape(-1, 2)
+        steps = np.concatenate([np.arange(1, len(path)) for path in checked] + [np.zeros(0, dtype=int)])
+
+        lefts, rights = np.minimum(starts[:, 0], ends[:, 0]), np.maximum(starts[:, 0], ends[:, 0])
+        tops, bottoms = np.minimum(starts[:, 1], ends[:, 1]), np.maximum(starts[:, 1], ends[:, 1])
+        near = (boxes[np.newaxis, :, 0] <= rights[:, np.newaxis] + 1) & \
+               (boxes[np.newaxis, :, 2] >= lefts[:, np.newaxis] - 1) & \
+               (boxes[np.newaxis, :, 1] <= bottoms[:, np.newaxis] + 1) & \
+               (boxes[np.newaxis, :, 3] >= tops[:, np.newaxis] - 1)
+        candidates = near.any(axis=1) | ~self.ground.chunks.are_above_ground(starts, ends)
+
+        impacts = [(None, None)] * len(paths)
+        for index in np.flatnonzero(candidates).tolist():
+            shell = int(shells[index])
+            if impacts[shell][0] is not None:
+                continue
+            start, end = tuple(starts[index].tolist()), tuple(ends[index].tolist())
+            self.profiler.count("check_collision.calls")
+            collision_point = None
+            for tank_index in np.flatnonzero(near[index]).tolist():
+                collision_point = tanks[tank_index].check_collision_with_tank(start, end, self.backend)
+                if collision_point:
+                    break
+            collision_point = collision_point or self.ground.check_collision(start, end)
             if collision_point:
-                animate_explosion(self.game_display, collision_point, self.strike_earth_sound, simple_shell_radius)
-                self.correct_ground(collision_point, simple_shell_radius)
-                self.apply_players_damages(collision_point, simple_shell_power, simple_shell_radius)
-                self.correct_tanks_heights()
-                fire = False
-            else:
-                pygame.draw.circle(self.game_display, color, (shell_position[0], shell_position[1]), 4)
+                impacts[shell] = (int(steps[index]), collision_point)
+        return impacts
 
-            pygame.display.update()
-            self.clock.tick(60)
-        return shell_position[0], shell_position[1]
+    def collect_attacks(self, players, snapshot):
+        """
+        Asks bots of the players for angle and power, in parallel threads with simultaneous_bot_workers > 1
+        :param players: list of players
+        :param snapshot: GameStateSnapshot given to all bots
+        :return: list of (angle, power) tuples in the order of players
+        """
+        with self.profiler.timer("bot.attack"):
+            if simultaneous_bot_workers > 1 and len(players) > 1:
+                with ThreadPoolExecutor(simultaneous_bot_workers) as pool:
+                    return list(pool.map(lambda player: player.get_angle_and_power_from_bot(snapshot), players))
+            return [player.get_angle_and_power_from_bot(snapshot) for player in players]
+
+    def play_simultaneous_turn(self):
+        """
+        Plays a turn in which all players shoot at once: every bot gets the same snapshot, all shells fly
+        together over the terrain and tanks of the start of the turn, then the explosions are resolved
+        in deterministic order, by the step in which the shell hit and then by the order of players
+        :return: none
+        """
+        snapshot = self.generate_snapshot()
+        players = list(self.players)
+        # the tank of the active player is already chosen, the others fire their next tanks
+        shooters = [self.active_tank if player is self.active_player else player.next_active_tank()
+                    for player in players]
+        attacks = self.collect_attacks(players, snapshot)
+
+        fired = []
+        for player, tank, (angle, power) in zip(players, shooters, attacks):
+            self.results.record_turn(self.turn, player.name, angle, power)
+            if angle and power:
+                tank.set_turret_angle(radians(angle))
+                tank.update_tank_power(power - tank.get_current_power())
+                events.emit("bot.attack", "Team {bot} attacked with angle={angle}, power={power}", bot=player.name,
+                            angle=angle, power=power, match=self.match_number, turn=self.turn)
+                fired.append((player, tank))
+        paths = [self.shell_path(tank) for player, tank in fired]
+        impacts = self.find_shell_impacts(paths)
+        self.profiler.count("fire_simple_shell.shots", len(fired))
+        self.profiler.count("fire_simple_shell.steps", sum(len(path) - 1 for path in paths))
+
+        if not self.headless:
+            for player, tank in fired:
+                pygame.mixer.Sound.play(tank.fire_sound)
+        # explosions come in the order of steps, shells still flying are drawn until their impact
+        order = sorted(range(len(fired)), key=lambda shell: (impacts[shell][0] is None, impacts[shell][0] or 0, shell))
+        last_step = max([step for step, point in impacts if step is not None], default=0)
+        resolved = 0
+        hits = [False] * len(fired)
+        for step in range(1, last_step + 1):
+            if not self.headless:
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        halt_whole_game()
+                for shell, path in enumerate(paths):
+                    if (impacts[shell][0] is None or step < impacts[shell][0]) and step < len(path):
+                        pygame.draw.circle(self.game_display, fired[shell][1].player_color,
+                                           self.camera.to_screen(path[step]), 4)
+            while resolved < len(order) and impacts[order[resolved]][0] == step:
+                shell = order[resolved]
+                collision_point = impacts[shell][1]
+                if not self.headless:
+                    animate_explosion(self.game_display, collision_point, self.strike_earth_sound, simple_shell_radius,
+                                      self.ground.heights, self.camera)
+                hits[shell] = self.explode_shell(collision_point, fired[shell][0])
+                resolved += 1
+            if not self.headless:
+                pygame.display.update()
+                self.clock.tick(60)
+
+        self.update_players()
+        # Update bots with their hit positions
+        for (player, tank), path, (step, collision_point), hit in zip(fired, paths, impacts, hits):
+            shell_position = collision_point or path[-1]
+            self.results.record_shot(self.turn, player.name, shell_position, hit)
+            player.update_last_hit_position((shell_position[0], display_height-shell_position[1]))
+        self.active_tank = self.active_player.next_active_tank()
+        self.turn += 1
 
     def update_players(self):
         """
@@ -163,14 +403,18 @@ class GameManager:
         for player in self.players:
             if player.is_in_game():
                 left_players.append(player)
+            else:
+                self.eliminated.append((self.turn, player))
 
         if self.active_player in left_players:
             self.active_player = left_players[(left_players.index(self.active_player) + 1) % len(left_players)]
         else:
             if len(left_players) > 0:
+                # the first player still in game after the eliminated active player, several players
+                # after it may be eliminated in the same turn
                 init_index = self.players.index(self.active_player)
-                while True:
-                    self.active_player = self.players[(init_index + 1) % len(self.players)]
+                for i in range(1, len(self.players) + 1):
+                    self.active_player = self.players[(init_index + i) % len(self.players)]
                     if self.active_player in left_players:
                         break
 
@@ -181,31 +425,298 @@ class GameManager:
         Draws all elements on display
         :return: none
         """
-        self.game_display.fill(black)
-        self.ground.draw()
-        for player in self.players:
-            player.draw_tanks_and_bars()
-
-        self.active_tank.show_tanks_angle()
-        self.active_tank.show_tanks_power()
-
-    def generate_tank_list(self):
+        with self.profiler.timer("draw_all"):
+            self.game_display.fill(black)
+            self.ground.draw(self.camera)
+            # only health bars of the HUD page of the active player are drawn
+            page = self.active_player.hud_page
+            for player in self.players:
+                player.draw_tanks_and_bars(player.hud_page == page)
+            self.draw_hud_summary(page)
+
+            self.active_tank.show_tanks_angle()
+            self.active_tank.show_tanks_power()
+
+    def draw_hud_summary(self, page):
         """
-        Generate a list of active tanks for the bots.
-        :return: list of dictionaries of tanks
+        Shows which players are on the shown HUD page, when the players do not fit on one page
+        :param page: shown HUD page
+        :return: none
         """
-        tank_list = []
+        page_size = len(health_bar_init_positions)
+        if self.players_number <= page_size:
+            return
+        first = page * page_size + 1
+        last = min(first + page_size - 1, self.players_number)
+        (text_surface, rect_size) = sys_text_object(
+            f"Players {first}-{last} of {self.players_number}, {len(self.players)} in game", white, FontSize.XSMALL)
+        self.game_display.blit(text_surface, [int(display_width / 2) - int(rect_size.width / 2), 90])
+
+    def tanks_in_bot_order(self, active_player=None, active_tank=None):
+        """
+        Yields active tanks in the order the bots get them.
+        Players with more tanks have an entry for each of them, the tank which fires next comes first,
+        so bots looking for their own name find the tank they aim with.
+        :param active_player: player on turn, the active player by default
+        :param active_tank: tank of the player on turn, the active tank by default
+        :return: generator of (player, tank) tuples
+        """
+        active_player = active_player or self.active_player
+        active_tank = active_tank or self.active_tank
         for player in self.players:
             tanks = player.active_tanks
             if not tanks:
                 continue
-            new_dict = {}
-            new_dict["name"] = player.bot_object.get_name()
-            new_dict["position"] = (tanks[0].position[0], display_height - tanks[0].position[1])
-            new_dict["health"] = tanks[0].tank_health
-            tank_list.append(new_dict)
+            first = active_tank if player is active_player else player.next_tank
+            if first in tanks:
+                yield player, first
+            for tank in tanks:
+                if tank is not first:
+                    yield player, tank
+
+    def generate_tank_list(self, active_player=None, active_tank=None):
+        """
+        Generate a list of active tanks for the bots (see tanks_in_bot_order).
+        :param active_player: player on turn, the active player by default
+        :param active_tank: tank of the player on turn, the active tank by default
+        :return: list of dictionaries of tanks
+        """
+        return [{"name": player.bot_object.get_name(),
+                 "position": (tank.position[0], display_height - tank.position[1]),
+                 "health": tank.tank_health} for player, tank in self.tanks_in_bot_order(active_player, active_tank)]
+
+    def generate_snapshot(self, active_player=None, active_tank=None, turn=None):
+        """
+        Generate immutable snapshot of the game state for the bots, the heightmap is shared, not copied,
+        and the tanks array is filled directly from the tanks.
+        :param active_player: player on turn, the active player by default
+        :param active_tank: tank of the player on turn, the active tank by default
+        :param turn: number of the turn, the current turn by default
+        :return: GameStateSnapshot
+        """
+        names = {player: player.bot_object.get_name() for player in self.players}
+        dtype = GameStateSnapshot.tanks_dtype(max([len(name) for name in names.values()] + [1]))
+        tanks = np.fromiter(((names[player], tank.position[0], display_height - tank.position[1], tank.tank_health)
+                             for player, tank in self.tanks_in_bot_order(active_player, active_tank)), dtype=dtype)
+        return GameStateSnapshot(tanks, self.ground.frozen_heights(), self.wind, self.turn if turn is None else turn)
+
+    def snapshot_key(self, snapshot):
+        """
+        Returns key of the game state of the snapshot, snapshots with equal keys have the same content
+        :param snapshot: GameStateSnapshot generated now
+        :return: hashable key
+        """
+        return self.match_number, self.ground.version, snapshot.tanks.tobytes(), snapshot.wind, snapshot.turn
+
+    def speculate_next_turns(self):
+        """
+        Lets the bots of the next players (one for each worker of the speculator) decide on the states
+        expected if the shots before their turns change nothing, while the shot is played
+        :return: none
+        """
+        index = self.players.index(self.active_player)
+        for ahead in range(1, min(self.speculator.workers, len(self.players) - 1) + 1):
+            player = self.players[(index + ahead) % len(self.players)]
+            snapshot = self.generate_snapshot(player, player.next_tank, self.turn + ahead)
+            self.speculator.speculate(player, snapshot, self.snapshot_key(snapshot))
+
+    def aim_active_tank(self, angle, power):
+        """
+        Turns turret of the active tank to the given angle and sets its power, animated unless headless
+        :param angle: angle in degrees
+        :param power: shell power
+        :return: none
+        """
+        # Animate the change of angle
+        rad_angle = radians(angle)
+        current_angle = self.active_tank.get_current_angle()
+        angle_delta = angle_step if current_angle < rad_angle else -angle_step # In which direction should we move the angle
+        num_of_changes = int((current_angle - rad_angle) / angle_step)
+        for i in range(abs(num_of_changes)):
+            self.active_tank.update_turret_angle(angle_delta)
+            if not self.headless:
+                pygame.time.wait(50)
+                self.draw_all()
+                pygame.display.update()
+        # animation moves in angle steps, the shot goes exactly at the requested angle (see ballistics.py)
+        self.active_tank.set_turret_angle(rad_angle)
+
+        # Animate the change of power
+        current_power = self.active_tank.get_current_power()
+        power_delta = 1 if current_power < power else -1
+        power_changes = abs(current_power - power)
+        for i in range(power_changes):
+            self.active_tank.update_tank_power(power_delta)
+            if not self.headless:
+                pygame.time.wait(20)
+                self.draw_all()
+                pygame.display.update()
+
+    def play_turn(self):
+        """
+        Plays a turn of the active player: asks the bot for angle and power and fires the shell
+        :return: none
+        """
+        # Get power and angle from the bot object, the decision made early is used if it was made for this state
+        snapshot = self.generate_snapshot()
+        decision = self.speculator.take(self.active_player, self.snapshot_key(snapshot)) if self.speculator else None
+        if decision is not None:
+            self.profiler.count("bot.speculation.hits")
+            angle, power = decision
+        else:
+            with self.profiler.timer("bot.attack"), self.profiler.timer(f"bot.attack.{self.active_player.name}"):
+                angle, power = self.active_player.get_angle_and_power_from_bot(snapshot)
+        if self.speculator:
+            self.speculate_next_turns()
+        self.results.record_turn(self.turn, self.active_player.name, angle, power)
+        if angle and power:
+            self.aim_active_tank(angle, power)
+            if not self.headless:
+                pygame.time.wait(500) # Wait before shooting
+            events.emit("bot.attack", "Team {bot} attacked with angle={angle}, power={power}",
+                        bot=self.active_player.name, angle=angle, power=power, match=self.match_number, turn=self.turn)
+            shooting_player = self.active_player
+            shell_position = self.fire_simple_shell(self.active_tank)
+            self.update_players()
+            # Update bot with their hit position
+            shooting_player.update_last_hit_position((shell_position[0], display_height-shell_position[1]))
+        else:
+            self.update_players()
 
-        return tank_list
+        self.active_tank = self.active_player.next_active_tank()
+        self.turn += 1
+
+    def finish_match(self):
+        """
+        Exports profile of the match and records its ranking
+        :return: none
+        """
+        self.profiler.finish_match(self.match_number)
+        events.emit("match.end", "Match {match} finished after {turns} turns, left in game: {left}",
+                    match=self.match_number, turns=self.turn, left=[player.name for player in self.players],
+                    seed=self.seed)
+        events.flush()
+        ranking = rank_players(self.players, self.eliminated)
+        self.results.finish_match(self.turn, [
+            (player.name, player.player_number, rank, len(player.active_tanks),
+             sum(tank.get_tank_health() for tank in player.active_tanks)) for player, rank in ranking])
+
+    def capture_state(self, finished=False):
+        """
+        Returns full state of the match between two turns, restore_state continues the match from it exactly.
+        Rows of the match recorded by the results store so far are committed first.
+        :param finished: True if the match is over
+        :return: dictionary of picklable values
+        """
+        if self.speculator:
+            # the bot must not run while its state is taken, its early decision is asked for again
+            self.speculator.discard()
+        bots = []
+        for bot in self.player_objects:
+            try:
+                bots.append(pickle.dumps(bot.get_state(), protocol=pickle.HIGHEST_PROTOCOL))
+            except Exception as e:
+                events.emit("checkpoint.bot_state", "State of the bot {bot} is not saved: {error}", events.WARNING,
+                            bot=bot.get_name(), error=str(e))
+                bots.append(None)
+        players = sorted(self.players + [player for turn, player in self.eliminated],
+                         key=lambda player: player.player_number)
+        active_tanks = self.active_player.active_tanks
+        return {"finished": finished,
+                "match_number": self.match_number,
+                "turn": self.turn,
+                "seed": self.seed,
+                "wind": self.wind,
+                "colors": list(self.taken_colors),
+                "heights": np.array(self.ground.heights),
+                "ground_height": self.ground.ground_height,
+                "ground_version": self.ground.version,
+                "players": [player.get_state() for player in players],
+                "left_players": [player.player_number for player in self.players],
+                "eliminated": [(turn, player.player_number) for turn, player in self.eliminated],
+                "active_player": self.active_player.player_number,
+                "active_tank": active_tanks.index(self.active_tank) if self.active_tank in active_tanks else None,
+                "random": random.getstate(),
+                "numpy_random": np.random.get_state(),
+                "bots": bots,
+                "results_match": self.results.checkpoint(),
+                "data": self.checkpoint_data}
+
+    def restore_state(self, state):
+        """
+        Continues the match from state returned by capture_state, the players must be the same bots
+        :param state: dictionary returned by capture_state
+        :return: none
+        """
+        if len(state["players"]) != len(self.player_objects):
+            raise ValueError(f"Checkpoint has {len(state['players'])} players, the game has {len(self.player_objects)}")
+        if self.speculator:
+            self.speculator.discard()
+        self.match_number = state["match_number"]
+        self.turn = state["turn"]
+        self.seed = state["seed"]
+        self.wind = state["wind"]
+        self.profiler.start_match()
+        self.ground = Ground(self.game_display, heights=state["heights"], backend=self.backend)
+        self.ground.ground_height = state["ground_height"]
+        self.ground.version = state["ground_version"]
+        self.camera.map_width = len(self.ground.heights)
+        self.taken_colors = list(state["colors"])
+        players = []
+        for i, (bot, color, player_state) in enumerate(zip(self.player_objects, self.taken_colors, state["players"])):
+            player = Player(self.game_display, self.tank_number, pygame.color.THECOLORS[color], i, bot, self.headless,
+                            self.camera)
+            player.set_state(player_state)
+            players.append(player)
+        self.players = [players[i] for i in state["left_players"]]
+        self.eliminated = [(turn, players[i]) for turn, i in state["eliminated"]]
+        self.active_player = players[state["active_player"]]
+        self.active_tank = None if state["active_tank"] is None else \
+            self.active_player.active_tanks[state["active_tank"]]
+        for bot, bot_state in zip(self.player_objects, state["bots"]):
+            bot_state = None if bot_state is None else pickle.loads(bot_state)
+            if bot_state is not None:
+                bot.set_state(bot_state)
+        self.checkpoint_data = state["data"]
+        self.results.resume_match(state["results_match"], self.turn)
+        # random numbers are taken by creating tanks, generators are restored last
+        random.setstate(state["random"])
+        np.random.set_state(state["numpy_random"])
+
+    def save_checkpoint(self, finished=False):
+        """
+        Writes state of the match to the checkpoint file atomically (see checkpoint.py)
+        :param finished: True if the match is over
+        :return: none
+        """
+        with self.profiler.timer("checkpoint"):
+            write_checkpoint(self.checkpoint_path, self.capture_state(finished))
+        events.emit("match.checkpoint", "Match {match} saved after {turns} turns", events.DEBUG,
+                    match=self.match_number, turns=self.turn, path=self.checkpoint_path)
+
+    def run_headless(self, max_turns=1000, state=None):
+        """
+        Plays a whole match without window and user input. With checkpoint_path the match is checkpointed every
+        checkpoint_interval turns.
+        :param max_turns: maximum number of turns, the match is stopped after them
+        :param state: state of an unfinished match to continue (see capture_state and read_checkpoint),
+                      a new match is started if None
+        :return: names of players left in game
+        """
+        if state is None:
+            self.reinitialize_players()
+            self.active_tank = self.players[0].next_active_tank()
+        else:
+            self.restore_state(state)
+        while len(self.players) > 1 and self.turn < max_turns:
+            if self.simultaneous:
+                self.play_simultaneous_turn()
+            else:
+                self.play_turn()
+            if self.checkpoint_path and self.turn % self.checkpoint_interval == 0 and len(self.players) > 1:
+                self.save_checkpoint()
+        self.finish_match()
+        return [player.name for player in self.players]
 
     def run(self):
         """
@@ -245,45 +756,20 @@ class GameManager:
                     game_exit = True
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_SPACE:  # Play turn
-                        # Get power and angle from the bot object
-
-                        angle, power = self.active_player.get_angle_and_power_from_bot(self.generate_tank_list())
-                        if angle and power:
-                            # Animate the change of angle
-                            rad_angle = radians(angle)
-                            current_angle = self.active_tank.get_current_angle()
-                            angle_delta = angle_step if current_angle < rad_angle else -angle_step # In which direction should we move the angle
-                            num_of_changes = int((current_angle - rad_angle) / angle_step)
-                            for i in range(abs(num_of_changes)):
-                                self.active_tank.update_turret_angle(angle_delta)
-                                pygame.time.wait(50)
-                                self.draw_all()
-                                pygame.display.update()
-
-                            # Animate the change of power
-                            current_power = self.active_tank.get_current_power()
-                            power_delta = 1 if current_power < power else -1
-                            power_changes = abs(current_power - power)
-                            for i in range(power_changes):
-                                self.active_tank.update_tank_power(power_delta)
-                                pygame.time.wait(20)
-                                self.draw_all()
-                                pygame.display.update()
-                            pygame.time.wait(500) # Wait before shooting
-                            print(f"Team {self.active_player.name} attacked with angle={angle}, power={power}")
-                            shell_position = self.fire_simple_shell(self.active_tank)
-                            self.update_players()
-                            # Update bot with their hit position
-                            self.active_player.update_last_hit_position((shell_position[0], display_height-shell_position[1]))
+                        if self.simultaneous:
+                            self.play_simultaneous_turn()
                         else:
-                            self.update_players()
-
-                        self.active_tank = self.active_player.next_active_tank()
+                            self.play_turn()
+                        events.flush()
 
+            if self.active_tank:
+                self.camera.follow(self.active_tank.position[0])
             self.draw_all()
 
-            if len(self.players) <= 1:
+            # after Q or closing the window on the game over screen the match is already finished
+            if len(self.players) <= 1 and not game_over and not game_exit:
                 game_over = True
+                self.finish_match()
 
             if self.active_tank:
                 self.active_tank.show_tank_special()
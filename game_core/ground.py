@@ -1,102 +1,135 @@
 import pygame
+import numpy as np
 from random import randint
-from shapely.geometry import LineString, Point, MultiPoint
 from game_core.constants import *
+from game_core.physics import get_backend
+from game_core.snapshot import read_only
+from game_core.terrain import TerrainChunks, store_heights
 
 
 class Ground:
-    def __init__(self, game_display):
+    def __init__(self, game_display, heights=None, backend=None, width=None):
+        """
+        Init function
+        :param game_display: handle to display
+        :param heights: initial ground heights, random terrain is generated if None
+        :param backend: physics backend name or instance, physics_backend constant by default
+        :param width: width of generated terrain, world_width constant by default
+        """
         self.game_display = game_display
+        self.backend = get_backend(backend or physics_backend)
+        self.width = width or world_width
         self.ground_height = 0
-        self.points = []
-        self.reinitialize()
+        self.heights = None
+        # summaries of terrain chunks, kept up to date with every change of heights
+        self.chunks = None
+        # number of changes of heights, states of the game with the same version have the same terrain
+        self.version = 0
+        # heights array is shared with snapshots, it is copied before the next change (copy on write)
+        self.heights_shared = False
+        if heights is None:
+            self.reinitialize()
+        else:
+            self.heights = store_heights(heights)
+            self.width = len(self.heights)
+            self.chunks = TerrainChunks(self.heights)
 
     def reinitialize(self):
-        heights = []
-        x_step = int(display_width/10)
-        for i in range(11):
-            heights.append((x_step*i, randint(ground_height_min, ground_height_max)))
-        ground_line = LineString(heights)
-        for i in range(display_width):
-            point = ground_line.intersection(LineString([(i, 0), (i, display_height)]))
-            self.points.append([int(point.x), int(point.y)])
-
+        self.heights = store_heights(self.backend.generate_heights(self.width))
+        self.chunks = TerrainChunks(self.heights)
+        self.heights_shared = False
         self.ground_height = randint(ground_height_min, ground_height_max)
 
-    def draw(self):
-        for i in range(display_width):
-            pygame.draw.line(self.game_display,
-                             dark_green,
-                             (i, display_height),
-                             (self.points[i][0], self.points[i][1]))
-
-    def check_collision(self, line):
-        intersection_point = None
-        step = 1
-        if int(line.coords[0][0]) > int(line.coords[1][0]):
-            step = -1
-        for index in range(int(line.coords[0][0]), int(line.coords[1][0]), step):
-            ground_line = LineString([[index, display_height],
-                                      [index, self.get_ground_height_at_point(index)]])
-            intersection = ground_line.intersection(line)
-            if intersection:
-                intersection_point = int(intersection.x), int(intersection.y)
-                break
-
-        if not intersection_point:
-            display_line = LineString([[0, display_height], [display_width, display_height]])
-            intersection_display = display_line.intersection(line)
-            if intersection_display:
-                intersection_point = int(intersection_display.x), int(intersection_display.y)
-
-        return intersection_point
+    def draw(self, camera=None):
+        """
+        Draws the columns of the terrain seen by the camera, flat chunks are filled as one rectangle
+        :param camera: Camera, the start of the world is drawn if None
+        :return: none
+        """
+        start = camera.x if camera else 0
+        stop = min(start + display_width, len(self.heights))
+        first, last = self.chunks.chunk_range(start, stop)
+        for chunk in range(first, last):
+            left = max(chunk * self.chunks.chunk_width, start)
+            right = min((chunk + 1) * self.chunks.chunk_width, stop)
+            top = int(self.chunks.tops[chunk])
+            if top == self.chunks.bottoms[chunk]:
+                if top < display_height:
+                    self.game_display.fill(dark_green, (left - start, top, right - left, display_height - top))
+                continue
+            for i, height in enumerate(self.heights[left:right].tolist(), left - start):
+                pygame.draw.line(self.game_display,
+                                 dark_green,
+                                 (i, display_height),
+                                 (i, height))
+
+    def check_collision(self, start, end):
+        # most shell steps are in the sky above the chunks they pass over and need no column checks
+        if self.chunks.is_above_ground(start, end):
+            return None
+        return self.backend.segment_terrain_collision(self.heights, start, end)
+
+    def frozen_heights(self):
+        """
+        Returns read-only heightmap which stays unchanged when the ground changes later.
+        The heightmap is not copied now, the ground copies it before its next change.
+        :return: non-writeable NumPy array
+        """
+        self.heights_shared = True
+        return read_only(self.heights)
+
+    def detach_heights(self):
+        """
+        Makes own copy of heightmap if it is shared with snapshots, called before any change of heights
+        :return: none
+        """
+        if self.heights_shared:
+            self.heights = store_heights(self.heights)
+            self.heights_shared = False
 
     def get_ground_height_at_point(self, x_coord):
-        if x_coord < 0 or x_coord >= display_width:
+        if x_coord < 0 or x_coord >= len(self.heights):
             return display_height
-        return self.points[x_coord][1]
+        return int(self.heights[x_coord])
+
+    def get_ground_heights(self, start, stop):
+        """
+        Returns ground heights of the columns start..stop-1, columns outside the map have display_height
+        :param start: first column
+        :param stop: column after the last one
+        :return: NumPy array of heights
+        """
+        ground_heights = np.full(stop - start, display_height, dtype=np.int64)
+        left, right = max(start, 0), min(stop, len(self.heights))
+        if left < right:
+            ground_heights[left - start:right - start] = self.heights[left:right]
+        return ground_heights
 
     def correct_heights(self, interval, new_height):
-        for i in range(interval[0], interval[1]):
-            self.points[i][1] = new_height
+        self.detach_heights()
+        self.version += 1
+        self.heights[max(interval[0], 0):interval[1]] = new_height
+        self.chunks.refresh(self.heights, interval[0], interval[1])
 
     def update_after_explosion(self, explosion_point, explosion_radius):
-        left_ground = []
-        explosion_circle = Point(explosion_point).buffer(explosion_radius).boundary
-        max_left = max(0, explosion_point[0]-explosion_radius)
-        max_right = min(display_width, explosion_point[0]+explosion_radius)
-        for i in range(max_left, max_right):
-            ground_line = LineString([[i, display_height], self.points[i]])
-            intersection = explosion_circle.intersection(ground_line)
-            if explosion_point[1] + explosion_radius > display_height:
-                left_start = explosion_point[1] - explosion_radius
-                if self.points[i][1] < left_start:
-                    left_ground.append([[i, left_start], [i, self.points[i][1]]])
-                    self.points[i][1] = display_height
-                else:
-                    self.points[i][1] = display_height
-            elif isinstance(intersection, MultiPoint):
-                first_point = intersection.geoms[0]
-                second_point = intersection.geoms[1]
-                fst_coordinate = i, min(int(first_point.coords[0][1]), int(second_point.coords[0][1]))
-                snd_coordinate = i, max(int(first_point.coords[0][1]), int(second_point.coords[0][1]))
-
-                left_length = fst_coordinate[1] - self.points[i][1]
-                if left_length > 0:
-                    left_ground.append([[i, fst_coordinate[1]], [i, self.points[i][1]]])
-                self.points[i][1] = snd_coordinate[1]
-            elif isinstance(intersection, Point):
-                if not explosion_circle.contains(intersection):
-                    self.points[i][1] = int(intersection.coords[0][1])
-
-        self.points[explosion_point[0]][1] += explosion_radius
+        self.detach_heights()
+        self.version += 1
+        left_ground = self.backend.carve_crater(self.heights, explosion_point, explosion_radius)
+        # only chunks under the crater are summarized again, the crater center may be raised by the backend
+        center_x = explosion_point[0] % len(self.heights)
+        self.chunks.refresh(self.heights, explosion_point[0] - explosion_radius, explosion_point[0] + explosion_radius)
+        self.chunks.refresh(self.heights, center_x, center_x + 1)
         return left_ground
 
     def draw_temp_after_explosion(self, explosion_point, explosion_radius):
         pygame.draw.circle(self.game_display, black, explosion_point, explosion_radius)
 
     def update_after_sloughing(self, left_ground):
+        self.detach_heights()
+        self.version += 1
         for line in left_ground:
             length = line[0][1] - line[1][1]
-            self.points[line[0][0]][1] -= length
-
+            self.heights[line[0][0]] -= length
+        if left_ground:
+            columns = [line[0][0] for line in left_ground]
+            self.chunks.refresh(self.heights, min(columns), max(columns) + 1)
@@ -0,0 +1,27 @@
+from importlib import import_module
+
+from game_core.physics.base import PhysicsBackend
+
+# backend name: (module, class), modules are imported only when the backend is requested
+backends = {
+    "numpy": ("game_core.physics.numpy_backend", "NumpyBackend"),
+    "shapely": ("game_core.physics.shapely_backend", "ShapelyBackend"),
+}
+
+_instances = {}
+
+
+def get_backend(backend):
+    """
+    Returns physics backend instance
+    :param backend: name of the backend (see backends) or PhysicsBackend instance
+    :return: PhysicsBackend instance, backends are stateless, so one instance per name is shared
+    """
+    if isinstance(backend, PhysicsBackend):
+        return backend
+    if backend not in _instances:
+        if backend not in backends:
+            raise ValueError(f"Unknown physics backend: {backend}, available: {', '.join(sorted(backends))}")
+        module_name, class_name = backends[backend]
+        _instances[backend] = getattr(import_module(module_name), class_name)()
+    return _instances[backend]
@@ -0,0 +1,84 @@
+from abc import ABC, abstractmethod
+from math import sqrt
+
+from game_core.constants import world_width
+
+
+def terrain_segments(width, x_step):
+    """
+    Number of straight segments of generated terrain, one per x_step columns (10 on a map as wide as the display)
+    :param width: width of the map
+    :param x_step: width of one segment
+    :return: number of segments
+    """
+    return max(1, -(-width // x_step))
+
+
+class PhysicsBackend(ABC):
+    """
+    Interface of terrain and collision physics used by Ground, Player and GameManager.
+    Terrain is a heightmap: NumPy integer array with ground y coordinate for each x of the world, the world
+    is as wide as the heightmap (see world_width) and as high as the display.
+    All coordinates are world coordinates (y grows downwards).
+    """
+    name = ""
+
+    @abstractmethod
+    def generate_heights(self, width=world_width):
+        """
+        Generates random terrain, random numbers are taken from the random module
+        :param width: width of the world
+        :return: sequence of ground heights, one for each x coordinate
+        """
+        pass
+
+    @abstractmethod
+    def segment_terrain_collision(self, heights, start, end):
+        """
+        Checks collision of shell segment with terrain and bottom of the world
+        :param heights: heightmap
+        :param start: (x, y) coordinates of previous shell position
+        :param end: (x, y) coordinates of current shell position
+        :return: coordinates of collision as tuple or None
+        """
+        pass
+
+    @abstractmethod
+    def segment_tank_collision(self, tank_position, start, end):
+        """
+        Checks collision of shell segment with tank body
+        :param tank_position: (x, y) coordinates of tank
+        :param start: (x, y) coordinates of previous shell position
+        :param end: (x, y) coordinates of current shell position
+        :return: coordinates of collision as tuple or None
+        """
+        pass
+
+    @abstractmethod
+    def carve_crater(self, heights, explosion_point, explosion_radius):
+        """
+        Removes ground destroyed by explosion, heightmap is modified in place
+        :param heights: heightmap
+        :param explosion_point: (x, y) coordinates of explosion
+        :param explosion_radius: radius of explosion
+        :return: list of ground pieces left above the crater, each as [[x, bottom y], [x, top y]]
+        """
+        pass
+
+    def explosion_damages(self, tank_positions, explosion_point, explosion_power, explosion_radius):
+        """
+        Calculates damage of explosion for each tank
+        :param tank_positions: list of (x, y) tank coordinates
+        :param explosion_point: (x, y) coordinates of explosion
+        :param explosion_power: power of explosion
+        :param explosion_radius: radius of explosion
+        :return: list of damages in the order of tank_positions
+        """
+        damages = []
+        for position in tank_positions:
+            distance = int(sqrt((explosion_point[0]-position[0])**2+(explosion_point[1]-position[1])**2))
+            damage = 0
+            if distance < explosion_radius:
+                damage = int(((explosion_radius - distance) / explosion_radius) * explosion_power)
+            damages.append(damage)
+        return damages
@@ -0,0 +1,192 @@
+import numpy as np
+from math import sin, cos, pi
+from random import randint
+
+from game_core.constants import *
+from game_core.physics.base import PhysicsBackend, terrain_segments
+
+
+def truncated_division(numerator, denominator):
+    """
+    Exact equivalent of int(numerator / denominator) for integers
+    """
+    quotient = abs(numerator) // abs(denominator)
+    return quotient if (numerator >= 0) == (denominator > 0) else -quotient
+
+
+def segment_intersection(p1, p2, q1, q2):
+    """
+    Intersection of two segments with integer coordinates, computed exactly.
+    Overlapping collinear segments return the common point nearest to p1.
+    :return: intersection coordinates truncated to integers as tuple or None
+    """
+    rx, ry = p2[0] - p1[0], p2[1] - p1[1]
+    sx, sy = q2[0] - q1[0], q2[1] - q1[1]
+    qpx, qpy = q1[0] - p1[0], q1[1] - p1[1]
+    denominator = rx * sy - ry * sx
+    if denominator == 0:
+        return _collinear_intersection(p1, p2, q1, q2)
+
+    t_numerator = qpx * sy - qpy * sx
+    u_numerator = qpx * ry - qpy * rx
+    if denominator < 0:
+        denominator, t_numerator, u_numerator = -denominator, -t_numerator, -u_numerator
+    if not (0 <= t_numerator <= denominator and 0 <= u_numerator <= denominator):
+        return None
+    return (truncated_division(p1[0] * denominator + t_numerator * rx, denominator),
+            truncated_division(p1[1] * denominator + t_numerator * ry, denominator))
+
+
+def _collinear_intersection(p1, p2, q1, q2):
+    """
+    Intersection of parallel (or degenerated to points) segments
+    """
+    def cross(origin, a, b):
+        return (a[0] - origin[0]) * (b[1] - origin[1]) - (a[1] - origin[1]) * (b[0] - origin[0])
+
+    # all four points must lie on one line
+    line_start, line_end = (p1, p2) if p1 != p2 else (q1, q2)
+    if line_start == line_end:
+        return tuple(p1) if tuple(p1) == tuple(q1) else None
+    if cross(line_start, line_end, p1) or cross(line_start, line_end, p2) or \
+            cross(line_start, line_end, q1) or cross(line_start, line_end, q2):
+        return None
+
+    # project on the axis along which the line changes more
+    axis = 0 if abs(line_end[0] - line_start[0]) >= abs(line_end[1] - line_start[1]) else 1
+    low = max(min(p1[axis], p2[axis]), min(q1[axis], q2[axis]))
+    high = min(max(p1[axis], p2[axis]), max(q1[axis], q2[axis]))
+    if low > high:
+        return None
+    candidates = [point for point in (p1, p2, q1, q2) if low <= point[axis] <= high]
+    nearest = min(candidates, key=lambda point: abs(point[axis] - p1[axis]))
+    return int(nearest[0]), int(nearest[1])
+
+
+class NumpyBackend(PhysicsBackend):
+    """
+    Physics backend using NumPy arrays and exact integer arithmetic.
+    Gives the same results as ShapelyBackend (see test/parity.py) without Shapely.
+    """
+    name = "numpy"
+
+    def __init__(self):
+        # vertices of explosion circle, the same polygon as Shapely buffer of a point (16 segments per quadrant),
+        # Shapely puts the vertices on the axes exactly
+        angle_increment = 2 * pi / 64
+        angles = [(-1.0 * i) * angle_increment for i in range(64)] + [0.0]
+        self.circle_cos = np.array([0.0 if i % 32 == 16 else cos(angle) for i, angle in enumerate(angles)])
+        self.circle_sin = np.array([0.0 if i % 32 == 0 else sin(angle) for i, angle in enumerate(angles)])
+
+    def generate_heights(self, width=world_width):
+        x_step = int(display_width/10)
+        segments = terrain_segments(width, x_step)
+        heights = np.array([randint(ground_height_min, ground_height_max) for i in range(segments + 1)],
+                           dtype=np.int64)
+        xs = np.arange(width, dtype=np.int64)
+        segment = np.minimum(xs // x_step, segments - 1)
+        offset = xs - segment * x_step
+        return heights[segment] + (offset * (heights[segment + 1] - heights[segment])) // x_step
+
+    def segment_terrain_collision(self, heights, start, end):
+        x0, y0 = int(start[0]), int(start[1])
+        x1, y1 = int(end[0]), int(end[1])
+        if x0 != x1:
+            step = 1 if x1 > x0 else -1
+            columns = np.arange(x0, x1, step)
+            inside = (columns >= 0) & (columns < len(heights))
+            ground = np.full(len(columns), display_height, dtype=np.int64)
+            ground[inside] = heights[columns[inside]]
+
+            # y of the shell at each column is numerators / denominator
+            denominator = x1 - x0
+            numerators = y0 * denominator + (columns - x0) * (y1 - y0)
+            if denominator < 0:
+                denominator, numerators = -denominator, -numerators
+            # columns without ground (off the display or carved to the bottom) are degenerated and never hit
+            hits = (numerators >= np.minimum(ground, display_height) * denominator) & \
+                   (numerators <= np.maximum(ground, display_height) * denominator) & \
+                   (ground != display_height)
+            if hits.any():
+                first = int(np.argmax(hits))
+                return int(columns[first]), truncated_division(int(numerators[first]), denominator)
+
+        return segment_intersection((x0, y0), (x1, y1), (0, display_height), (len(heights), display_height))
+
+    def segment_tank_collision(self, tank_position, start, end):
+        x, y = int(tank_position[0]), int(tank_position[1])
+        start = int(start[0]), int(start[1])
+        end = int(end[0]), int(end[1])
+        half_width = int(tank_width / 2)
+        if max(start[0], end[0]) < x - half_width or min(start[0], end[0]) > x + half_width or \
+                max(start[1], end[1]) < y or min(start[1], end[1]) > y + tank_height:
+            return None
+        tank_lines = (((x - half_width, y), (x + half_width, y)),
+                      ((x - half_width, y), (x - half_width, y + tank_height)),
+                      ((x + half_width, y), (x + half_width, y + tank_height)),
+                      ((x - half_width, y + tank_height), (x + half_width, y + tank_height)))
+        for line_start, line_end in tank_lines:
+            intersection = segment_intersection(start, end, line_start, line_end)
+            if intersection:
+                return intersection
+        return None
+
+    def carve_crater(self, heights, explosion_point, explosion_radius):
+        center_x, center_y = explosion_point
+        max_left = max(0, center_x - explosion_radius)
+        max_right = min(len(heights), center_x + explosion_radius)
+        columns = np.arange(max_left, max_right)
+        ground = heights[max_left:max_right].copy()
+        left_ground = []
+
+        if center_y + explosion_radius > display_height:
+            left_start = center_y - explosion_radius
+            for i in np.nonzero(ground < left_start)[0]:
+                left_ground.append([[int(columns[i]), left_start], [int(columns[i]), int(ground[i])]])
+            heights[max_left:max_right] = display_height
+        else:
+            # intersections of vertical ground lines (columns) with edges of the explosion polygon
+            vertices_x = center_x + explosion_radius * self.circle_cos
+            vertices_y = center_y + explosion_radius * self.circle_sin
+            ax, bx = vertices_x[:-1], vertices_x[1:]
+            ay, by = vertices_y[:-1], vertices_y[1:]
+            x = columns.astype(float)[:, np.newaxis]
+            crossing = (x >= np.minimum(ax, bx)) & (x <= np.maximum(ax, bx)) & (ax != bx)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                y = ay + (x - ax) * (by - ay) / (bx - ax)
+            at_vertex = (x == ax) | (x == bx)
+            y = np.where(x == bx, by, y)
+            y = np.where(x == ax, ay, y)
+
+            ground_column = ground[:, np.newaxis]
+            crossing &= (y >= np.minimum(ground_column, display_height)) & \
+                        (y <= np.maximum(ground_column, display_height))
+            lowest = np.where(crossing, y, np.inf).min(axis=1)
+            highest = np.where(crossing, y, -np.inf).max(axis=1)
+            any_crossing = crossing.any(axis=1)
+
+            # ground line crosses the explosion circle twice, ground above the crater is left for sloughing
+            two_points = any_crossing & (highest > lowest)
+            top = np.trunc(np.where(two_points, lowest, 0)).astype(np.int64)
+            bottom = np.trunc(np.where(two_points, highest, 0)).astype(np.int64)
+            for i in np.nonzero(two_points & (top > ground))[0]:
+                left_ground.append([[int(columns[i]), int(top[i])], [int(columns[i]), int(ground[i])]])
+            new_ground = np.where(two_points, bottom, ground)
+
+            # ground top is inside the circle, ground is lowered to the bottom of the circle
+            # (a crossing exactly in a vertex lies on the circle and leaves the ground untouched)
+            one_point = any_crossing & (highest == lowest) & ~(crossing & at_vertex).any(axis=1)
+            new_ground = np.where(one_point, np.trunc(np.where(one_point, lowest, 0)).astype(np.int64), new_ground)
+            heights[max_left:max_right] = new_ground
+
+        heights[center_x] += explosion_radius
+        return left_ground
+
+    def explosion_damages(self, tank_positions, explosion_point, explosion_power, explosion_radius):
+        if not tank_positions:
+            return []
+        positions = np.asarray(tank_positions, dtype=float)
+        distances = np.sqrt((explosion_point[0] - positions[:, 0]) ** 2 +
+                            (explosion_point[1] - positions[:, 1]) ** 2).astype(np.int64)
+        damages = ((explosion_radius - distances) / explosion_radius) * explosion_power
+        return [int(damage) if distance < explosion_radius else 0 for damage, distance in zip(damages, distances)]
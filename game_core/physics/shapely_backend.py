@@ -0,0 +1,91 @@
+from random import randint
+from shapely.geometry import LineString, Point, MultiPoint
+
+from game_core.constants import *
+from game_core.physics.base import PhysicsBackend, terrain_segments
+
+
+class ShapelyBackend(PhysicsBackend):
+    """
+    Reference physics backend using Shapely geometry
+    """
+    name = "shapely"
+
+    def generate_heights(self, width=world_width):
+        heights = []
+        x_step = int(display_width/10)
+        for i in range(terrain_segments(width, x_step) + 1):
+            heights.append((x_step*i, randint(ground_height_min, ground_height_max)))
+        ground_line = LineString(heights)
+        points = []
+        for i in range(width):
+            point = ground_line.intersection(LineString([(i, 0), (i, display_height)]))
+            points.append(int(point.y))
+        return points
+
+    def segment_terrain_collision(self, heights, start, end):
+        line = LineString([start, end])
+        intersection_point = None
+        step = 1
+        if int(line.coords[0][0]) > int(line.coords[1][0]):
+            step = -1
+        for index in range(int(line.coords[0][0]), int(line.coords[1][0]), step):
+            ground_height = display_height if index < 0 or index >= len(heights) else int(heights[index])
+            ground_line = LineString([[index, display_height], [index, ground_height]])
+            intersection = ground_line.intersection(line)
+            if intersection:
+                intersection_point = int(intersection.x), int(intersection.y)
+                break
+
+        if not intersection_point:
+            display_line = LineString([[0, display_height], [len(heights), display_height]])
+            intersection_display = display_line.intersection(line)
+            if intersection_display:
+                intersection_point = int(intersection_display.x), int(intersection_display.y)
+
+        return intersection_point
+
+    def segment_tank_collision(self, tank_position, start, end):
+        shell_line = LineString([start, end])
+        x, y = tank_position
+        tank_line1 = LineString([[x - int(tank_width / 2), y], [x + int(tank_width / 2), y]])
+        tank_line2 = LineString([[x - int(tank_width / 2), y], [x - int(tank_width / 2), y + tank_height]])
+        tank_line3 = LineString([[x + int(tank_width / 2), y], [x + int(tank_width / 2), y + tank_height]])
+        tank_line4 = LineString([[x - int(tank_width / 2), y + tank_height], [x + int(tank_width / 2), y + tank_height]])
+        for tank_line in (tank_line1, tank_line2, tank_line3, tank_line4):
+            intersection = tank_line.intersection(shell_line)
+            if intersection:
+                return int(intersection.x), int(intersection.y)
+        return None
+
+    def carve_crater(self, heights, explosion_point, explosion_radius):
+        left_ground = []
+        explosion_circle = Point(explosion_point).buffer(explosion_radius).boundary
+        max_left = max(0, explosion_point[0]-explosion_radius)
+        max_right = min(len(heights), explosion_point[0]+explosion_radius)
+        for i in range(max_left, max_right):
+            ground_line = LineString([[i, display_height], [i, int(heights[i])]])
+            intersection = explosion_circle.intersection(ground_line)
+            if explosion_point[1] + explosion_radius > display_height:
+                left_start = explosion_point[1] - explosion_radius
+                if heights[i] < left_start:
+                    left_ground.append([[i, left_start], [i, int(heights[i])]])
+                    heights[i] = display_height
+                else:
+                    heights[i] = display_height
+            elif isinstance(intersection, MultiPoint):
+                first_point = intersection.geoms[0]
+                second_point = intersection.geoms[1]
+                fst_coordinate = i, min(int(first_point.coords[0][1]), int(second_point.coords[0][1]))
+                snd_coordinate = i, max(int(first_point.coords[0][1]), int(second_point.coords[0][1]))
+
+                left_length = fst_coordinate[1] - heights[i]
+                if left_length > 0:
+                    left_ground.append([[i, fst_coordinate[1]], [i, int(heights[i])]])
+                heights[i] = snd_coordinate[1]
+            elif isinstance(intersection, Point):
+                if not explosion_circle.contains(intersection):
+                    heights[i] = int(intersection.coords[0][1])
+
+        heights[explosion_point[0]] += explosion_radius
+        return left_ground
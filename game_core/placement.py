@@ -0,0 +1,74 @@
+from bisect import bisect_left, bisect_right
+from random import randrange
+
+from game_core.constants import *
+
+
+class FreeGround:
+    """
+    Bookkeeping of x coordinates where the center of a new tank may still be placed.
+
+    Free coordinates are kept as sorted, disjoint half-open intervals. A new tank takes a uniformly random
+    free coordinate, found with one randrange over the total free length, and blocks the coordinates closer
+    than tank_spacing to it. Placing a tank costs O(number of intervals) and never retries, so filling
+    the map with dozens of tanks takes linear time and a full map is reported instead of looping forever.
+    """
+    def __init__(self, map_width):
+        """
+        Init function
+        :param map_width: width of the world
+        """
+        tab = 5 + int(tank_width / 2)
+        self.starts = [tab]
+        self.stops = [map_width - tab]
+
+    def free_length(self):
+        """
+        Returns number of free coordinates
+        :return: total length of free intervals
+        """
+        return sum(stop - start for start, stop in zip(self.starts, self.stops))
+
+    def random_position(self):
+        """
+        Picks a random free x coordinate, random numbers are taken from the random module
+        :return: x coordinate
+        """
+        total = self.free_length()
+        if total <= 0:
+            raise ValueError("No free ground left for another tank, use a wider map or fewer tanks")
+        offset = randrange(total)
+        for start, stop in zip(self.starts, self.stops):
+            if offset < stop - start:
+                return start + offset
+            offset -= stop - start
+
+    def take(self, x):
+        """
+        Marks coordinates too close to a tank placed at x as taken
+        :param x: x coordinate of the placed tank
+        :return: none
+        """
+        blocked_start, blocked_stop = x - tank_spacing + 1, x + tank_spacing
+        # intervals which may overlap the blocked range
+        first = bisect_right(self.stops, blocked_start)
+        last = bisect_left(self.starts, blocked_stop)
+        starts, stops = [], []
+        for start, stop in zip(self.starts[first:last], self.stops[first:last]):
+            if start < blocked_start:
+                starts.append(start)
+                stops.append(min(stop, blocked_start))
+            if stop > blocked_stop:
+                starts.append(max(start, blocked_stop))
+                stops.append(stop)
+        self.starts[first:last] = starts
+        self.stops[first:last] = stops
+
+    def place(self):
+        """
+        Picks a random free x coordinate and takes it
+        :return: x coordinate
+        """
+        x = self.random_position()
+        self.take(x)
+        return x
@@ -1,24 +1,28 @@
-from random import randrange
+from game_core import events
 from game_core.constants import *
 from game_core.tank import Tank
+from game_core.utils import draw_health_bar
 
 
 class Player:
     """
     Class which represents player object in game
     """
-    def __init__(self, game_display, number_of_tanks, color, player_number, bot_object):
+    def __init__(self, game_display, number_of_tanks, color, player_number, bot_object, headless=False, camera=None):
         """
         Initialize player
         :param game_display: main game screen
         :param number_of_tanks: initial number of tanks
         :param color: player's color
-        :param player_number: players number, relevant in choosing health bar positions
+        :param player_number: players number, relevant in choosing health bar positions and HUD page
+        :param headless: if True, player's tanks are not animated and have no sounds
+        :param camera: Camera of the game display, passed to the tanks
         """
         self.number_of_tanks = number_of_tanks
         self.color = color
         self.player_number = player_number
-        self.health_bars_pos = health_bar_init_positions[player_number]
+        self.health_bars_pos = health_bar_init_positions[player_number % len(health_bar_init_positions)]
+        self.hud_page = player_number // len(health_bar_init_positions)
         self.active_tanks = []
         self.game_display = game_display
         self.next_tank = None
@@ -26,18 +30,26 @@ class Player:
         self.in_game = False
         self.bot_object = bot_object
         self.name = bot_object.get_name()
+        self.headless = headless
+        self.camera = camera
 
 
-    def get_angle_and_power_from_bot(self, tank_list):
+    def get_angle_and_power_from_bot(self, snapshot):
+        """
+        Asks the bot for angle and power of the shot
+        :param snapshot: GameStateSnapshot given to the bot
+        :return: (angle, power) or (None, None) if the bot failed
+        """
         try:
-            angle, power = self.bot_object.attack(tank_list)
+            angle, power = self.bot_object.attack(snapshot)
             angle, power = int(angle), int(power)
             if not -90 <= angle <= 90:
-                raise Exception("Wrong angle value: {angle}")
+                raise Exception(f"Wrong angle value: {angle}")
             if not 0 <= power <= 100:
-                raise Exception("Wrong power value: {power}")
+                raise Exception(f"Wrong power value: {power}")
         except Exception as e:
-            print(f"Error caused by a bot {self.bot_object.get_name()}: {e}")
+            events.emit("bot.error", "Error caused by a bot {bot}: {error}", events.WARNING,
+                        bot=self.bot_object.get_name(), error=str(e))
             return None, None
 
         return angle, power
@@ -46,38 +58,56 @@ class Player:
 
     def update_last_hit_position(self, position):
         self.bot_object.update_last_hit(position)
-    def initialize_tanks(self, actual_tanks_positions, ground):
+    def initialize_tanks(self, free_ground, ground):
         """
         Reinitialize available tanks in the game of specified player
+        :param free_ground: FreeGround of the match, the places of the tanks are taken from it
+        :param ground: ground object handle
         :return: none
         """
         self.active_tanks = []
-        tab = 5+int(tank_width/2)
-        # initialize possible health bar positions
-        health_bar_positions = [(self.health_bars_pos[0] + (health_bar_length+10)*i*(-1)**self.player_number,
-                                 self.health_bars_pos[1])
-                                for i in range(self.number_of_tanks)]
+        # initialize possible health bar positions, in compact HUD the player has one bar for all tanks
+        if self.is_compact_hud():
+            health_bar_positions = [None] * self.number_of_tanks
+        else:
+            health_bar_positions = [(self.health_bars_pos[0] + (health_bar_length+10)*i*(-1)**self.player_number,
+                                     self.health_bars_pos[1])
+                                    for i in range(self.number_of_tanks)]
         for i in range(self.number_of_tanks):
-            generate = True
-            while generate:
-                tank_pos_x = randrange(tab, display_width-tab)
-                good_choice = True
-                for tank in actual_tanks_positions:
-                    if abs(tank_pos_x - tank[0]) < tank_width+10:
-                        good_choice = False
-                        break
-                if good_choice:
-                    ground_height = self.define_optimal_height(tank_pos_x, ground)
-                    initial_y_coord = ground_height - full_tank_height
-                    self.active_tanks.append(
-                        Tank(self.game_display, (tank_pos_x, initial_y_coord), health_bar_positions[i], self.color, self.name))
-                    ground.correct_heights((tank_pos_x-int(tank_width/2), tank_pos_x+int(tank_width/2)),
-                                           ground_height)
-                    actual_tanks_positions.append((tank_pos_x, initial_y_coord))
-                    generate = False
+            tank_pos_x = free_ground.place()
+            ground_height = self.define_optimal_height(tank_pos_x, ground)
+            initial_y_coord = ground_height - full_tank_height
+            self.active_tanks.append(
+                Tank(self.game_display, (tank_pos_x, initial_y_coord), health_bar_positions[i], self.color, self.name,
+                     self.headless, self.camera))
+            ground.correct_heights((tank_pos_x-int(tank_width/2), tank_pos_x+int(tank_width/2)),
+                                   ground_height)
         self.next_tank = self.active_tanks[0]
         self.in_game = True
 
+    def get_state(self):
+        """
+        Returns state of the player's tanks saved in match checkpoints, destroyed tanks are left out
+        :return: dictionary of picklable values
+        """
+        return {"in_game": self.in_game, "tanks": [tank.get_state() for tank in self.active_tanks],
+                "next_tank": self.active_tanks.index(self.next_tank) if self.next_tank in self.active_tanks else None}
+
+    def set_state(self, state):
+        """
+        Creates the player's tanks from state returned by get_state
+        :param state: dictionary returned by get_state
+        :return: none
+        """
+        self.active_tanks = []
+        for tank_state in state["tanks"]:
+            tank = Tank(self.game_display, tank_state["position"], tank_state["health_bar_position"], self.color,
+                        self.name, self.headless, self.camera)
+            tank.set_state(tank_state)
+            self.active_tanks.append(tank)
+        self.next_tank = None if state["next_tank"] is None else self.active_tanks[state["next_tank"]]
+        self.in_game = state["in_game"]
+
     def define_optimal_height(self, x_coord, ground):
         """
         Defines optimal height for tank
@@ -85,28 +115,49 @@ class Player:
         :param ground: ground object handle
         :return: optimal height
         """
-        ground_heights = []
-        for index in range(x_coord - int(tank_width / 2), x_coord + int(tank_width / 2)):
-            ground_heights.append(ground.get_ground_height_at_point(index))
-        return int(sum(ground_heights)/len(ground_heights))
+        ground_heights = ground.get_ground_heights(x_coord - int(tank_width / 2), x_coord + int(tank_width / 2))
+        return int(int(ground_heights.sum())/len(ground_heights))
+
+    def is_compact_hud(self):
+        """
+        Tells if the player has one health bar for all tanks instead of a bar for each tank
+        :return: flag True/False
+        """
+        return self.number_of_tanks >= compact_hud_tanks_number
 
-    def draw_tanks_and_bars(self):
+    def draw_tanks_and_bars(self, show_bars=True):
         """
         Draw all active tanks and their health bars
+        :param show_bars: if False, only tanks are drawn (the player is not on the shown HUD page)
         :return: none
         """
         for tank in self.active_tanks:
             tank.draw_tank()
-            tank.draw_health_bar()
+            if show_bars:
+                tank.draw_health_bar()
+        if show_bars and self.is_compact_hud():
+            self.draw_health_bar()
+
+    def draw_health_bar(self, active=False):
+        """
+        Draws one health bar with health of all the player's tanks, in percent of their initial health
+        :param active: if True, the bar is white
+        :return: none
+        """
+        health = sum(tank.get_tank_health() for tank in self.active_tanks) // self.number_of_tanks
+        draw_health_bar(self.game_display, self.health_bars_pos, health,
+                        f"{self.name[:15]} {len(self.active_tanks)}/{self.number_of_tanks} ({health}%)",
+                        self.color, active)
 
     def draw_current_tank_info(self):
         tank.show_tanks_power()
         tank.show_tanks_angle()
 
-    def update_tanks_list(self):
+    def update_tanks_list(self, heights=None):
         """
         Check which tanks are present in the game and delete destroyed ones, sets up next tank, sets up if player is
         still active
+        :param heights: heightmap the debris of destroyed tanks falls on
         :return: none
         """
         left_tanks = []
@@ -114,7 +165,7 @@ class Player:
             if tank.get_tank_health() > 0:
                 left_tanks.append(tank)
             else:
-                tank.self_destruct()
+                tank.self_destruct(heights)
 
         if len(left_tanks) == 0:
             self.next_tank = None
@@ -130,31 +181,34 @@ class Player:
 
             self.active_tanks = left_tanks
 
-    def check_collision_with_tanks(self, line):
+    def check_collision_with_tanks(self, start, end, backend):
         """
         Checks if collision took place with any of the player's tanks
-        :param line: last line of shell trajectory
+        :param start: coordinates of previous shell position
+        :param end: coordinates of current shell position
+        :param backend: physics backend
         :return: collision point as tuple if collision took place, None otherwise
         """
         for tank in self.active_tanks:
-            intersection = tank.check_collision_with_tank(line)
+            intersection = tank.check_collision_with_tank(start, end, backend)
             if intersection:
                 return intersection
         return None
 
-    def apply_damage(self, collision_point, shell_power, shell_radius):
+    def apply_damage(self, collision_point, shell_power, shell_radius, heights=None):
         """
         Applies if necessary any damage to each tank of the player
         :param collision_point: coordinates of collision/eplosion
         :param shell_power: power of explosion
         :param shell_radius: radius of explosion
+        :param heights: heightmap the debris of destroyed tanks falls on
         :return: returns coordinates of destroyed tanks, so that tanks exposions could be applied
         """
         destructed_tanks = []
         for tank in self.active_tanks:
             if tank.apply_damage(collision_point, shell_power, shell_radius):
                 destructed_tanks.append(tank.get_tank_position())
-        self.update_tanks_list()
+        self.update_tanks_list(heights)
         return destructed_tanks
 
     def next_active_tank(self):
@@ -182,9 +236,12 @@ class Player:
         """
         for tank in self.active_tanks:
             tank_pos_x = tank.get_tank_position()[0]
-            opt_height = self.define_optimal_height(tank.get_tank_position()[0], ground)
+            interval = (tank_pos_x-int(tank_width/2), tank_pos_x+int(tank_width/2))
+            ground_heights = ground.get_ground_heights(*interval)
+            opt_height = int(int(ground_heights.sum())/len(ground_heights))
             new_height = opt_height - full_tank_height
             tank.animate_tank_fall(new_height)
             tank.update_tank_position((tank_pos_x, new_height))
-            ground.correct_heights((tank_pos_x-int(tank_width/2), tank_pos_x+int(tank_width/2)),
-                                   opt_height)
+            # ground under tanks untouched by the explosion is already flat and is not copied or changed
+            if (ground_heights != opt_height).any():
+                ground.correct_heights(interval, opt_height)
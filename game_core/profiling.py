@@ -0,0 +1,139 @@
+import cProfile
+import json
+import os
+from time import perf_counter
+
+
+class _NullTimer:
+    """
+    Context manager which does nothing, returned by disabled profiler
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_null_timer = _NullTimer()
+
+
+class _Timer:
+    """
+    Context manager which measures one phase and reports it to the profiler
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.name, perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """
+    Collects per-phase timers and counters of a match
+    """
+    def __init__(self, enabled=False, output_dir=None, use_cprofile=False):
+        """
+        Init function
+        :param enabled: if False all calls are no-ops
+        :param output_dir: directory where match summaries are exported, None disables export
+        :param use_cprofile: if True the whole match is also run under cProfile
+        """
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.use_cprofile = use_cprofile
+        self.timers = {}
+        self.counters = {}
+        self.cprofile = None
+
+    def start_match(self):
+        """
+        Clears collected data and starts cProfile if requested
+        :return: none
+        """
+        if not self.enabled:
+            return
+        self.timers = {}
+        self.counters = {}
+        if self.use_cprofile:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def timer(self, name):
+        """
+        Returns context manager measuring time spent in a phase
+        :param name: name of the phase
+        :return: context manager
+        """
+        if not self.enabled:
+            return _null_timer
+        return _Timer(self, name)
+
+    def record(self, name, seconds):
+        """
+        Adds one measurement of a phase
+        :param name: name of the phase
+        :param seconds: measured duration
+        :return: none
+        """
+        if not self.enabled:
+            return
+        stats = self.timers.get(name)
+        if stats is None:
+            self.timers[name] = [1, seconds, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = min(stats[2], seconds)
+            stats[3] = max(stats[3], seconds)
+
+    def count(self, name, amount=1):
+        """
+        Increases a counter
+        :param name: name of the counter
+        :param amount: value to add
+        :return: none
+        """
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self):
+        """
+        Returns collected data as dictionary which can be serialized to JSON
+        :return: dictionary with timers and counters
+        """
+        timers = {}
+        for name, (calls, total, minimum, maximum) in sorted(self.timers.items()):
+            timers[name] = {"calls": calls, "total": total, "mean": total / calls, "min": minimum, "max": maximum}
+        return {"timers": timers, "counters": dict(sorted(self.counters.items()))}
+
+    def finish_match(self, match_number):
+        """
+        Stops cProfile and exports JSON summary (and pstats dump) to the output directory
+        :param match_number: number of the finished match, used in file names
+        :return: path of the JSON summary or None if nothing was exported
+        """
+        if not self.enabled:
+            return None
+        if self.cprofile:
+            self.cprofile.disable()
+        if self.output_dir is None:
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"match-{match_number}.json")
+        with open(path, "w") as summary_file:
+            json.dump(self.summary(), summary_file, indent=2)
+        if self.cprofile:
+            self.cprofile.dump_stats(os.path.join(self.output_dir, f"match-{match_number}.pstats"))
+            self.cprofile = None
+        return path
@@ -0,0 +1,344 @@
+import sqlite3
+from itertools import combinations
+from time import time
+
+from game_core.constants import *
+
+_schema = """
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    seed INTEGER,
+    backend TEXT NOT NULL,
+    map_width INTEGER NOT NULL,
+    tanks_number INTEGER NOT NULL,
+    simultaneous INTEGER NOT NULL,
+    started REAL NOT NULL,
+    turns INTEGER
+);
+CREATE TABLE IF NOT EXISTS turns (
+    match_id INTEGER NOT NULL REFERENCES matches(id),
+    turn INTEGER NOT NULL,
+    bot_name TEXT NOT NULL,
+    angle REAL,
+    power REAL
+);
+CREATE TABLE IF NOT EXISTS shots (
+    match_id INTEGER NOT NULL REFERENCES matches(id),
+    turn INTEGER NOT NULL,
+    bot_name TEXT NOT NULL,
+    impact_x INTEGER NOT NULL,
+    impact_y INTEGER NOT NULL,
+    hit INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS damages (
+    match_id INTEGER NOT NULL REFERENCES matches(id),
+    turn INTEGER NOT NULL,
+    shooter TEXT NOT NULL,
+    target TEXT NOT NULL,
+    damage INTEGER NOT NULL,
+    destroyed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rankings (
+    match_id INTEGER NOT NULL REFERENCES matches(id),
+    bot_name TEXT NOT NULL,
+    player_number INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    tanks_left INTEGER NOT NULL,
+    health_left INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS matches_seed ON matches(seed);
+CREATE INDEX IF NOT EXISTS turns_match ON turns(match_id);
+CREATE INDEX IF NOT EXISTS turns_bot ON turns(bot_name);
+CREATE INDEX IF NOT EXISTS shots_match ON shots(match_id);
+CREATE INDEX IF NOT EXISTS shots_bot ON shots(bot_name, hit);
+CREATE INDEX IF NOT EXISTS damages_match ON damages(match_id);
+CREATE INDEX IF NOT EXISTS damages_shooter ON damages(shooter);
+CREATE INDEX IF NOT EXISTS damages_target ON damages(target);
+CREATE INDEX IF NOT EXISTS rankings_match ON rankings(match_id, rank);
+CREATE INDEX IF NOT EXISTS rankings_bot ON rankings(bot_name);
+"""
+
+
+def rank_players(players, eliminated):
+    """
+    Ranks players of a finished match. Players left in game share rank 1 if the match was stopped with more
+    of them, ordered by their health; eliminated players follow, the later a player was eliminated the better.
+    Players eliminated in the same turn share their rank.
+    :param players: players left in game
+    :param eliminated: list of (turn, player) tuples in the order players were eliminated
+    :return: list of (player, rank) tuples from the best one
+    """
+    ranking = [(player, 1) for player in sorted(players, key=lambda player: -sum(
+        tank.get_tank_health() for tank in player.active_tanks))]
+    rank = 1
+    previous_turn = None
+    for index, (turn, player) in enumerate(reversed(eliminated)):
+        if turn != previous_turn:
+            rank = len(players) + index + 1
+            previous_turn = turn
+        ranking.append((player, rank))
+    return ranking
+
+
+class ResultStore:
+    """
+    Local SQLite database of match results: matches, bot decisions of each turn, shots, damages and final rankings.
+
+    Events of the current match are collected in memory and written in one transaction when the match
+    is finished or when results_batch_size rows wait, so recording costs one commit per match instead of one
+    per event. A match whose process was stopped before its end is not committed and leaves no rows, unless
+    it was checkpointed; rows of unfinished matches are left out of all aggregations.
+    Bot names and seeds are indexed, aggregations over thousands of matches (elo_ratings, hit_rates) read
+    each needed table once.
+    """
+    def __init__(self, path=None, batch_size=results_batch_size):
+        """
+        Init function
+        :param path: path of the database file (":memory:" for a temporary one), None disables recording
+        :param batch_size: number of waiting rows which are written before the end of the match
+        """
+        self.enabled = path is not None
+        self.path = path
+        self.batch_size = batch_size
+        self.connection = None
+        self.match_id = None
+        self.pending = {"turns": [], "shots": [], "damages": [], "rankings": []}
+        if self.enabled:
+            self.connection = sqlite3.connect(path, timeout=30)
+            if path != ":memory:":
+                # readers (e.g. a running tournament report) do not block the writer
+                self.connection.execute("PRAGMA journal_mode=WAL")
+                self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(_schema)
+
+    def start_match(self, seed, backend, map_width, tanks_number, simultaneous):
+        """
+        Starts recording of a new match, the waiting rows of an unfinished match are thrown away
+        :param seed: seed of the match, None for random matches
+        :param backend: name of the physics backend
+        :param map_width: width of the world
+        :param tanks_number: number of tanks of each player
+        :param simultaneous: True for simultaneous turns
+        :return: none
+        """
+        if not self.enabled:
+            return
+        self.connection.rollback()
+        for rows in self.pending.values():
+            rows.clear()
+        cursor = self.connection.execute(
+            "INSERT INTO matches (seed, backend, map_width, tanks_number, simultaneous, started) "
+            "VALUES (?, ?, ?, ?, ?, ?)", (seed, backend, map_width, tanks_number, int(simultaneous), time()))
+        self.match_id = cursor.lastrowid
+
+    def _add(self, table, row):
+        """
+        Adds a row of the current match to the waiting rows of the table
+        :param table: name of the table
+        :param row: values without the match id
+        :return: none
+        """
+        self.pending[table].append((self.match_id,) + row)
+        if len(self.pending[table]) >= self.batch_size:
+            self.write_pending()
+
+    def record_turn(self, turn, bot_name, angle, power):
+        """
+        Records decision of a bot
+        :param turn: number of the turn
+        :param bot_name: name of the bot
+        :param angle: angle in degrees, None if the bot did not attack
+        :param power: shell power, None if the bot did not attack
+        :return: none
+        """
+        if self.enabled:
+            self._add("turns", (turn, bot_name, angle, power))
+
+    def record_shot(self, turn, bot_name, impact, hit):
+        """
+        Records where a shell ended
+        :param turn: number of the turn
+        :param bot_name: name of the shooting bot
+        :param impact: (x, y) world coordinates of the explosion or of the point where the shell was stopped
+        :param hit: True if the shell damaged a tank of another player
+        :return: none
+        """
+        if self.enabled:
+            self._add("shots", (turn, bot_name, int(impact[0]), int(impact[1]), int(hit)))
+
+    def record_damage(self, turn, shooter, target, damage, destroyed):
+        """
+        Records damage taken by a tank from the shell of a player, explosions of destroyed tanks count
+        as a part of the shell which destroyed them
+        :param turn: number of the turn
+        :param shooter: name of the shooting bot
+        :param target: name of the bot owning the tank
+        :param damage: health points taken
+        :param destroyed: True if the tank was destroyed
+        :return: none
+        """
+        if self.enabled:
+            self._add("damages", (turn, shooter, target, int(damage), int(destroyed)))
+
+    def finish_match(self, turns, ranking):
+        """
+        Records final ranking and commits the match
+        :param turns: number of played turns
+        :param ranking: list of (bot name, player number, rank, tanks left, health left) tuples
+        :return: none
+        """
+        if not self.enabled or self.match_id is None:
+            return
+        for row in ranking:
+            self.pending["rankings"].append((self.match_id,) + tuple(row))
+        self.connection.execute("UPDATE matches SET turns = ? WHERE id = ?", (turns, self.match_id))
+        self.write_pending()
+        self.connection.commit()
+        self.match_id = None
+
+    def write_pending(self):
+        """
+        Inserts all waiting rows, they are committed with the match
+        :return: none
+        """
+        inserts = {"turns": "INSERT INTO turns VALUES (?, ?, ?, ?, ?)",
+                   "shots": "INSERT INTO shots VALUES (?, ?, ?, ?, ?, ?)",
+                   "damages": "INSERT INTO damages VALUES (?, ?, ?, ?, ?, ?)",
+                   "rankings": "INSERT INTO rankings VALUES (?, ?, ?, ?, ?, ?)"}
+        for table, rows in self.pending.items():
+            if rows:
+                self.connection.executemany(inserts[table], rows)
+                rows.clear()
+
+    def checkpoint(self):
+        """
+        Commits rows of the current match recorded so far, called when the match is checkpointed
+        :return: id of the current match, None if nothing is recorded
+        """
+        if not self.enabled or self.match_id is None:
+            return None
+        self.write_pending()
+        self.connection.commit()
+        return self.match_id
+
+    def resume_match(self, match_id, turn):
+        """
+        Continues recording of a match resumed from its checkpoint. Rows of the turns after the checkpoint
+        and the ranking are removed, they were recorded by the stopped process and are recorded again.
+        :param match_id: id returned by checkpoint, None starts no recording
+        :param turn: first turn played after the checkpoint
+        :return: none
+        """
+        if not self.enabled or match_id is None:
+            return
+        self.connection.rollback()
+        for rows in self.pending.values():
+            rows.clear()
+        for table in ("turns", "shots", "damages"):
+            self.connection.execute(f"DELETE FROM {table} WHERE match_id = ? AND turn >= ?", (match_id, turn))
+        self.connection.execute("DELETE FROM rankings WHERE match_id = ?", (match_id,))
+        self.connection.execute("UPDATE matches SET turns = NULL WHERE id = ?", (match_id,))
+        self.match_id = match_id
+
+    def close(self):
+        """
+        Closes the database, an unfinished match is not committed
+        :return: none
+        """
+        if self.connection is not None:
+            self.connection.rollback()
+            self.connection.close()
+            self.connection = None
+        self.enabled = False
+
+    def match_ids(self, bot_name=None, seed=None):
+        """
+        Returns ids of finished matches
+        :param bot_name: only matches this bot played
+        :param seed: only matches with this seed
+        :return: list of match ids in the order they were played
+        """
+        query = "SELECT id FROM matches WHERE turns IS NOT NULL"
+        parameters = []
+        if seed is not None:
+            query += " AND seed = ?"
+            parameters.append(seed)
+        if bot_name is not None:
+            query += " AND id IN (SELECT match_id FROM rankings WHERE bot_name = ?)"
+            parameters.append(bot_name)
+        return [row[0] for row in self.connection.execute(query + " ORDER BY id", parameters)]
+
+    def rankings(self, match_id):
+        """
+        Returns final ranking of a match
+        :param match_id: id of the match
+        :return: list of (bot name, rank) tuples from the best one
+        """
+        return self.connection.execute("SELECT bot_name, rank FROM rankings WHERE match_id = ? "
+                                       "ORDER BY rank, player_number", (match_id,)).fetchall()
+
+    def hit_rates(self):
+        """
+        Returns per-bot shooting statistics over all matches
+        :return: dictionary bot name -> (shots, hits, hit rate)
+        """
+        rows = self.connection.execute("SELECT bot_name, COUNT(*), SUM(hit) FROM shots WHERE match_id IN "
+                                       "(SELECT id FROM matches WHERE turns IS NOT NULL) GROUP BY bot_name")
+        return {name: (shots, hits, hits / shots) for name, shots, hits in rows}
+
+    def damage_dealt(self):
+        """
+        Returns per-bot damage dealt to tanks of other players over all matches
+        :return: dictionary bot name -> damage
+        """
+        rows = self.connection.execute("SELECT shooter, SUM(damage) FROM damages WHERE shooter != target AND "
+                                       "match_id IN (SELECT id FROM matches WHERE turns IS NOT NULL) "
+                                       "GROUP BY shooter")
+        return dict(rows.fetchall())
+
+    def elo_ratings(self, k_factor=elo_k_factor, initial_rating=elo_initial_rating):
+        """
+        Computes Elo ratings of bots from the rankings of all finished matches, in the order they were played.
+        A match of more players counts as a game of each pair of them, a better rank wins and equal ranks draw;
+        the changes of a match are computed from the ratings before it and scaled by 1 / (players - 1).
+        :param k_factor: maximum rating change of a two player match
+        :param initial_rating: rating of a bot before its first match
+        :return: dictionary bot name -> rating
+        """
+        ratings = {}
+        rows = self.connection.execute("SELECT r.match_id, r.bot_name, r.rank FROM rankings r "
+                                       "JOIN matches m ON m.id = r.match_id WHERE m.turns IS NOT NULL "
+                                       "ORDER BY r.match_id, r.player_number")
+        match = []
+        for match_id, bot_name, rank in rows:
+            if match and match[0][0] != match_id:
+                self._update_ratings(ratings, match, k_factor, initial_rating)
+                match = []
+            match.append((match_id, bot_name, rank))
+        if match:
+            self._update_ratings(ratings, match, k_factor, initial_rating)
+        return ratings
+
+    @staticmethod
+    def _update_ratings(ratings, match, k_factor, initial_rating):
+        """
+        Updates ratings with the result of one match
+        :param ratings: dictionary bot name -> rating, updated in place
+        :param match: list of (match id, bot name, rank) tuples of the match
+        :param k_factor: maximum rating change of a two player match
+        :param initial_rating: rating of a bot before its first match
+        :return: none
+        """
+        for match_id, bot_name, rank in match:
+            ratings.setdefault(bot_name, initial_rating)
+        if len(match) < 2:
+            return
+        before = dict(ratings)
+        scale = k_factor / (len(match) - 1)
+        for (_, first, first_rank), (_, second, second_rank) in combinations(match, 2):
+            if first == second:
+                continue
+            expected = 1 / (1 + 10 ** ((before[second] - before[first]) / 400))
+            score = 1.0 if first_rank < second_rank else 0.0 if first_rank > second_rank else 0.5
+            ratings[first] += scale * (score - expected)
+            ratings[second] -= scale * (score - expected)
@@ -0,0 +1,96 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+from game_core.constants import *
+
+
+def read_only(array):
+    """
+    Returns view of the array which can not be modified
+    :param array: NumPy array
+    :return: non-writeable view sharing memory with the array, built on a read-only buffer, so its writeable
+             flag can not be set again
+    """
+    array = np.ascontiguousarray(array)
+    return np.frombuffer(memoryview(array).toreadonly(), array.dtype).reshape(array.shape)
+
+
+class GameStateSnapshot(Sequence):
+    """
+    Immutable state of the game passed to bots at the start of a turn.
+
+    It is a sequence of tanks, so bots may use it as the former list of tank dictionaries
+    ({"name", "position", "health"}, position as (x, height above the bottom of the display)).
+    Besides that it exposes:
+        tanks   - read-only NumPy structured array with fields name, x, y, health (bot coordinates)
+        heights - read-only heightmap, ground y for each x in display coordinates (y grows downwards),
+                  shared with the terrain without copying (see Ground.frozen_heights)
+        wind    - wind speed
+        turn    - number of the turn in the match, starting with 0
+    Snapshot holds only NumPy arrays and numbers, so it pickles cheaply for bots in other processes.
+    """
+    __slots__ = ("tanks", "heights", "wind", "turn")
+
+    def __init__(self, tanks, heights, wind=0.0, turn=0):
+        """
+        Init function
+        :param tanks: structured array of tanks (see tanks_array)
+        :param heights: heightmap array, it is not copied
+        :param wind: wind speed
+        :param turn: number of the turn
+        """
+        object.__setattr__(self, "tanks", read_only(tanks))
+        object.__setattr__(self, "heights", read_only(heights))
+        object.__setattr__(self, "wind", wind)
+        object.__setattr__(self, "turn", turn)
+
+    @staticmethod
+    def tanks_dtype(name_length):
+        """
+        Returns type of the tanks array
+        :param name_length: maximum length of tank names
+        :return: NumPy structured dtype with fields name, x, y, health
+        """
+        return np.dtype([("name", f"U{name_length}"), ("x", np.int64), ("y", np.int64), ("health", np.int64)])
+
+    @staticmethod
+    def tanks_array(tanks):
+        """
+        Builds array of tanks
+        :param tanks: list of (name, (x, y), health) in bot coordinates
+        :return: NumPy structured array with fields name, x, y, health
+        """
+        dtype = GameStateSnapshot.tanks_dtype(max([len(name) for name, position, health in tanks] + [1]))
+        return np.array([(name, position[0], position[1], health) for name, position, health in tanks], dtype=dtype)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GameStateSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("GameStateSnapshot is immutable")
+
+    def __reduce__(self):
+        return GameStateSnapshot, (self.tanks, self.heights, self.wind, self.turn)
+
+    def __len__(self):
+        return len(self.tanks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        name, x, y, health = self.tanks[index].item()
+        return {"name": name, "position": (x, y), "health": health}
+
+    def __repr__(self):
+        return f"GameStateSnapshot(turn={self.turn}, wind={self.wind}, tanks={list(self)})"
+
+    def ground_level(self, x_coord):
+        """
+        Returns height of the ground above the bottom of the display, in the same coordinates as tanks positions
+        :param x_coord: x coordinate
+        :return: ground level, 0 outside of the display
+        """
+        if x_coord < 0 or x_coord >= len(self.heights):
+            return 0
+        return display_height - int(self.heights[x_coord])
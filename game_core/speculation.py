@@ -0,0 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from game_core.constants import *
+
+
+class DecisionSpeculator:
+    """
+    Asks the bots of the next players for their attacks in worker threads while the current shell flies.
+
+    Each of the next `workers` players gets the snapshot the game would give it if the shots before its turn
+    changed nothing. Its decision is stored with a key describing that state (terrain version, tanks, turn,
+    wind). When the player's turn comes, the decision is used only if the key of the real state is the same,
+    otherwise it is thrown away and the bot is asked again, so the game plays exactly as without speculation.
+    Any shot which changes the terrain changes the key, so players further ahead are asked early only with
+    more workers. Only bots with allow_speculation are asked early: their attack must depend only on the
+    snapshot, because update_last_hit of the shots before their turn comes after the early call and a thrown
+    away call is not undone.
+    """
+    def __init__(self, workers=speculative_bot_workers):
+        """
+        Init function
+        :param workers: number of worker threads, also the number of next players asked early
+        """
+        self.workers = workers
+        self.pool = None
+        # player -> (key, future) of the early decision
+        self.decisions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def speculate(self, player, snapshot, key):
+        """
+        Starts asking the player's bot for its attack in a worker thread, a decision already made or being
+        made for the same state is kept
+        :param player: player expected to play in a next turn
+        :param snapshot: GameStateSnapshot the player is expected to get
+        :param key: key of the expected state
+        :return: none
+        """
+        if not getattr(player.bot_object, "allow_speculation", False):
+            return
+        if player in self.decisions and self.decisions[player][0] == key:
+            return
+        self.discard(player)
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="speculation")
+        self.decisions[player] = key, self.pool.submit(player.get_angle_and_power_from_bot, snapshot)
+
+    def take(self, player, key):
+        """
+        Returns the early decision of the player if it was made for the same state
+        :param player: player on turn
+        :param key: key of the real state
+        :return: (angle, power) tuple, None if there is no valid early decision
+        """
+        if player not in self.decisions:
+            return None
+        if self.decisions[player][0] == key:
+            decision = self.decisions.pop(player)[1].result()
+            self.hits += 1
+            return decision
+        self.misses += 1
+        self.discard(player)
+        return None
+
+    def discard(self, player=None):
+        """
+        Throws pending decisions away. A call already running is waited for, so a bot is never asked
+        twice at the same time.
+        :param player: player whose decision is thrown away, all players by default
+        :return: none
+        """
+        players = list(self.decisions) if player is None else [player]
+        for player in players:
+            key, future = self.decisions.pop(player, (None, None))
+            if future is not None and not future.cancel():
+                future.result()
+
+    def close(self):
+        """
+        Discards the pending decisions and stops the worker threads
+        :return: none
+        """
+        self.discard()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
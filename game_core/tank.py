@@ -1,8 +1,9 @@
 import pygame
 from math import sqrt, sin, cos, degrees
-from shapely.geometry import LineString
+from game_core import events
+from game_core.camera import Camera
 from game_core.constants import *
-from game_core.utils import sys_text_object, animate_explosion, halt_whole_game
+from game_core.utils import sys_text_object, animate_explosion, halt_whole_game, draw_health_bar
 from random import randint
 
 
@@ -11,13 +12,16 @@ class Tank:
     Class which represents tank object in game
     """
 
-    def __init__(self, game_display, pos, health_bar_pos, color, name):
+    def __init__(self, game_display, pos, health_bar_pos, color, name, headless=False, camera=None):
         """
         Initialize tank
         :param game_display: handle to display
         :param pos: initial position of the tank as list
-        :param health_bar_pos: position of health bar os tuple
+        :param health_bar_pos: position of health bar os tuple, None if the tank has no own health bar
         :param color: color of this player tanks
+        :param name: name of the player owning the tank
+        :param headless: if True, tank is not animated and has no sounds
+        :param camera: Camera of the game display, the tank is drawn relative to it
         """
         self.position = list(pos)
         self.health_bar_position = health_bar_pos
@@ -28,10 +32,16 @@ class Tank:
         self.turret_end_y = 0
         self.tank_power = 50
         self.game_display = game_display
-        self.explosion_sound = pygame.mixer.Sound(sound_explosion3)
-        self.fire_sound = pygame.mixer.Sound(sound_cannon1)
+        self.headless = headless
+        if headless:
+            self.explosion_sound = None
+            self.fire_sound = None
+        else:
+            self.explosion_sound = pygame.mixer.Sound(sound_explosion3)
+            self.fire_sound = pygame.mixer.Sound(sound_cannon1)
         self.special_counter = 0
         self.name = name
+        self.camera = camera or Camera()
 
     def calculate_distance_from_tank_center(self, explosion_point):
         """
@@ -41,36 +51,15 @@ class Tank:
         """
         return int(sqrt((explosion_point[0]-self.position[0])**2+(explosion_point[1]-self.position[1])**2))
 
-    def check_collision_with_tank(self, shell_line):
+    def check_collision_with_tank(self, start, end, backend):
         """
         Checks whether there was a collision with tank and returns collision coordinates
-        :param shell_line: trajectory line of the shell
+        :param start: coordinates of previous shell position
+        :param end: coordinates of current shell position
+        :param backend: physics backend
         :return: intersection point coordinates or None
         """
-        tank_line1 = LineString([[self.position[0] - int(tank_width / 2), self.position[1]],
-                                 [self.position[0] + int(tank_width / 2), self.position[1]]])
-        tank_line2 = LineString([[self.position[0] - int(tank_width / 2), self.position[1]],
-                                 [self.position[0] - int(tank_width / 2), self.position[1] + tank_height]])
-        tank_line3 = LineString([[self.position[0] + int(tank_width / 2), self.position[1]],
-                                 [self.position[0] + int(tank_width / 2), self.position[1] + tank_height]])
-        tank_line4 = LineString([[self.position[0] - int(tank_width / 2), self.position[1] + tank_height],
-                                 [self.position[0] + int(tank_width / 2), self.position[1] + tank_height]])
-        intersection = tank_line1.intersection(shell_line)
-        if intersection:
-            return int(intersection.x), int(intersection.y)
-
-        intersection = tank_line2.intersection(shell_line)
-        if intersection:
-            return int(intersection.x), int(intersection.y)
-
-        intersection = tank_line3.intersection(shell_line)
-        if intersection:
-            return int(intersection.x), int(intersection.y)
-
-        intersection = tank_line4.intersection(shell_line)
-        if intersection:
-            return int(intersection.x), int(intersection.y)
-        return None
+        return backend.segment_tank_collision(self.position, start, end)
 
     def apply_damage(self, explosion_point, explosion_power, explosion_radius):
         """
@@ -87,7 +76,8 @@ class Tank:
 
         self.tank_health = max(self.tank_health - damage, 0)
         if damage:
-            print(f"Tank {self.name} was hit! {damage} health points taken")
+            events.emit("tank.hit", "Tank {tank} was hit! {damage} health points taken", tank=self.name,
+                        damage=damage, health=self.tank_health)
         if self.tank_health == 0:
             return True
         else:
@@ -99,17 +89,17 @@ class Tank:
         :param game_display: PyGame display where the tank should appear
         :return: none
         """
-        x = self.position[0]
-        y = self.position[1]
+        self.update_turret_end_coordinates()
+        if not self.camera.is_visible(self.position[0], tank_width):
+            return
+        x, y = self.camera.to_screen(self.position)
         pygame.draw.circle(self.game_display, self.player_color,  (x, y), int(tank_height/4*3))
         pygame.draw.rect(self.game_display, self.player_color, (x-int(tank_width/2), y, tank_width, tank_height))
 
-        self.turret_end_x = x + int(sin(self.turret_angle) * turret_length)
-        self.turret_end_y = (y-2) - int(cos(self.turret_angle) * turret_length)
         pygame.draw.line(self.game_display,
                          self.player_color,
                          (x, y-2),
-                         (self.turret_end_x, self.turret_end_y),
+                         self.camera.to_screen(self.get_turret_end_coordinates()),
                          turret_width)
 
         # draw wheels? is it needed??
@@ -121,6 +111,14 @@ class Tank:
         pygame.draw.circle(self.game_display, self.player_color, (x + 10, y + tank_height), wheel_width)
         pygame.draw.circle(self.game_display, self.player_color, (x + 15, y + tank_height), wheel_width)
 
+    def update_turret_end_coordinates(self):
+        """
+        Calculates coordinates of the turret end from tank position and turret angle
+        :return: none
+        """
+        self.turret_end_x = self.position[0] + int(sin(self.turret_angle) * turret_length)
+        self.turret_end_y = (self.position[1]-2) - int(cos(self.turret_angle) * turret_length)
+
     def get_turret_end_coordinates(self):
         """
         Returns coordinates of the turret end
@@ -136,7 +134,7 @@ class Tank:
         """
         coord_x = self.position[0]
         if move_tank > 0:
-            self.position[0] = min(coord_x + move_tank, display_width - int(tank_width / 2))
+            self.position[0] = min(coord_x + move_tank, self.camera.map_width - int(tank_width / 2))
         elif move_tank < 0:
             self.position[0] = max(coord_x + move_tank, int(tank_width / 2))
 
@@ -153,6 +151,14 @@ class Tank:
         elif angle_change < 0:
             self.turret_angle = max(current_angle + angle_change, -pi / 2)
         #print(f"updated turret to {self.turret_angle}")
+    def set_turret_angle(self, angle):
+        """
+        Sets turret angle, limited to (-pi/2, pi/2)
+        :param angle: angle in radians
+        :return: none
+        """
+        self.turret_angle = min(max(angle, -pi / 2), pi / 2)
+
     def get_current_angle(self):
         return self.turret_angle
 
@@ -177,6 +183,7 @@ class Tank:
         :return: (tank_power, turret_angle, fire_sound, color, (turret_end_x, turret_end_y))
         """
         ret_color = self.player_color
+        self.update_turret_end_coordinates()
         return self.tank_power, self.turret_angle, self.fire_sound, ret_color, (self.turret_end_x, self.turret_end_y)
 
     def show_tanks_power(self):
@@ -198,33 +205,45 @@ class Tank:
 
     def draw_health_bar(self, active=False):
         """
-        Draws health bar of a tank on the screen
+        Draws health bar of a tank on the screen, tanks without health bar position (compact HUD) have none
+        :param active: if True, the bar is white
         :return: none
         """
-        color = low_health_color
-        if self.tank_health > 65:
-            color = good_health_color
-        elif self.tank_health > 40:
-            color = normal_health_color
-
-        if active:
-            color = white
-        pygame.draw.rect(self.game_display,
-                         color,
-                         (self.health_bar_position[0], self.health_bar_position[1], self.tank_health * 2, 25))
-        pygame.draw.rect(self.game_display,
-                         white,
-                         (self.health_bar_position[0], self.health_bar_position[1], 200, 25),
-                         2)
-        (text_surface, rect_size) = sys_text_object(f"{self.name[:15]} ({self.tank_health}%)", self.player_color, FontSize.XSMALL)
-        self.game_display.blit(text_surface, [self.health_bar_position[0], self.health_bar_position[1]+30])
-
-    def self_destruct(self):
+        if self.health_bar_position is None:
+            return
+        draw_health_bar(self.game_display, self.health_bar_position, self.tank_health,
+                        f"{self.name[:15]} ({self.tank_health}%)", self.player_color, active)
+
+    def self_destruct(self, heights=None):
         """
         Animation of self destruction
+        :param heights: heightmap the debris falls on
+        :return: none
+        """
+        if self.headless:
+            return
+        animate_explosion(self.game_display, self.position, self.explosion_sound, tank_explosion_radius, heights,
+                          self.camera)
+
+    def get_state(self):
+        """
+        Returns state of the tank saved in match checkpoints
+        :return: dictionary of picklable values
+        """
+        return {"position": list(self.position), "health": self.tank_health, "turret_angle": self.turret_angle,
+                "power": self.tank_power, "health_bar_position": self.health_bar_position}
+
+    def set_state(self, state):
+        """
+        Restores state returned by get_state
+        :param state: dictionary returned by get_state
         :return: none
         """
-        animate_explosion(self.game_display, self.position, self.explosion_sound, tank_explosion_radius)
+        self.position = list(state["position"])
+        self.tank_health = state["health"]
+        self.turret_angle = state["turret_angle"]
+        self.tank_power = state["power"]
+        self.health_bar_position = state["health_bar_position"]
 
     def get_tank_health(self):
         """
@@ -268,6 +287,9 @@ class Tank:
         :param desirable_height: new height
         :return: none
         """
+        if self.headless:
+            self.position[1] = desirable_height
+            return
         clock = pygame.time.Clock()
         while self.position[1] != desirable_height:
             for event in pygame.event.get():
@@ -0,0 +1,123 @@
+import tempfile
+
+import numpy as np
+
+from game_core.constants import *
+
+
+def store_heights(values):
+    """
+    Copies heights to a new heightmap array. Heightmaps of maps wider than terrain_spill_width are kept
+    in an unnamed memory-mapped temporary file in terrain_spill_dir (see constants), so the system keeps
+    only recently used parts of them in memory and far, unchanged chunks are paged out to disk.
+    :param values: sequence of heights
+    :return: NumPy int64 array (numpy.memmap for spilled heightmaps)
+    """
+    if terrain_spill_dir is None or len(values) <= terrain_spill_width:
+        return np.array(values, dtype=np.int64)
+    # the file is deleted at once, its disk space is freed with the last array using it
+    spill_file = tempfile.TemporaryFile(dir=terrain_spill_dir)
+    heights = np.memmap(spill_file, dtype=np.int64, mode="w+", shape=(len(values),))
+    heights[:] = values
+    return heights
+
+
+class TerrainChunks:
+    """
+    Summary of a heightmap split into chunks of chunk_width columns.
+
+    For each chunk it keeps the highest ground (smallest y, tops) and the lowest ground (largest y, bottoms)
+    of its columns. Shell segments above the top of all chunks they pass over can not hit the terrain, so
+    most steps of a shot are decided by looking at one or two numbers instead of the columns.
+    After the terrain changes only the summaries of the chunks touched by the change are computed again.
+    """
+    def __init__(self, heights, chunk_width=terrain_chunk_width):
+        """
+        Init function
+        :param heights: heightmap
+        :param chunk_width: number of columns in one chunk
+        """
+        self.chunk_width = chunk_width
+        self.width = len(heights)
+        count = -(-self.width // chunk_width)
+        self.tops = np.zeros(count, dtype=np.int64)
+        self.bottoms = np.zeros(count, dtype=np.int64)
+        self.refresh(heights, 0, self.width)
+
+    def chunk_range(self, start, stop):
+        """
+        Returns chunks containing the columns start..stop-1, columns outside the map are ignored
+        :param start: first column
+        :param stop: column after the last one
+        :return: (first chunk, chunk after the last one) tuple, empty range if no column is on the map
+        """
+        start, stop = max(start, 0), min(stop, self.width)
+        if start >= stop:
+            return 0, 0
+        return start // self.chunk_width, (stop - 1) // self.chunk_width + 1
+
+    def refresh(self, heights, start, stop):
+        """
+        Computes summaries of the chunks containing the changed columns start..stop-1 again
+        :param heights: heightmap
+        :param start: first changed column
+        :param stop: column after the last changed one
+        :return: none
+        """
+        first, last = self.chunk_range(start, stop)
+        if first == last:
+            return
+        columns = np.asarray(heights[first * self.chunk_width:min(last * self.chunk_width, self.width)])
+        starts = np.arange(0, len(columns), self.chunk_width)
+        self.tops[first:last] = np.minimum.reduceat(columns, starts)
+        self.bottoms[first:last] = np.maximum.reduceat(columns, starts)
+
+    def highest_ground(self, start, stop):
+        """
+        Returns y of the top of the chunks containing the columns start..stop-1, no column is higher
+        :param start: first column
+        :param stop: column after the last one
+        :return: smallest ground y of the chunks, display_height if no column is on the map
+        """
+        first, last = self.chunk_range(start, stop)
+        if first == last:
+            return display_height
+        return int(self.tops[first:last].min())
+
+    def highest_grounds(self, starts, stops):
+        """
+        Vectorized highest_ground for many column ranges
+        :param starts: array of first columns
+        :param stops: array of columns after the last ones
+        :return: int64 array of smallest ground y of the chunks of each range
+        """
+        starts, stops = np.maximum(starts, 0), np.minimum(stops, self.width)
+        on_map = starts < stops
+        firsts = np.where(on_map, starts, 0) // self.chunk_width
+        lasts = np.where(on_map, stops - 1, 0) // self.chunk_width
+        grounds = self.tops[firsts]
+        # ranges are short, each pass takes the next chunk of all ranges longer than it
+        for offset in range(1, int((lasts - firsts).max(initial=0)) + 1):
+            grounds = np.minimum(grounds, self.tops[np.minimum(firsts + offset, lasts)])
+        return np.where(on_map, grounds, display_height)
+
+    def are_above_ground(self, starts, ends):
+        """
+        Vectorized is_above_ground for many shell segments
+        :param starts: (n, 2) integer array of previous shell positions
+        :param ends: (n, 2) integer array of current shell positions
+        :return: boolean array, True for segments which can not collide with the terrain
+        """
+        lefts, rights = np.minimum(starts[:, 0], ends[:, 0]), np.maximum(starts[:, 0], ends[:, 0])
+        return np.maximum(starts[:, 1], ends[:, 1]) < self.highest_grounds(lefts, rights + 1)
+
+    def is_above_ground(self, start, end):
+        """
+        Checks whether a shell segment passes above all chunks under it, such segment hits neither
+        the terrain nor the bottom of the world
+        :param start: (x, y) coordinates of previous shell position
+        :param end: (x, y) coordinates of current shell position
+        :return: True if the segment can not collide with the terrain
+        """
+        left, right = sorted((int(start[0]), int(end[0])))
+        return max(int(start[1]), int(end[1])) < self.highest_ground(left, right + 1)
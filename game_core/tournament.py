@@ -0,0 +1,29 @@
+from game_core.checkpoint import read_checkpoint
+
+
+def run_tournament(manager, seeds, max_turns=1000):
+    """
+    Plays one headless match for each seed with the players of the game manager.
+    With manager.checkpoint_path set, the outcomes of finished matches are saved in the checkpoint and a tournament
+    stopped in the middle resumes where it stopped: finished matches are not played again and the unfinished
+    match continues from its last checkpoint. The checkpoint file must belong to the same tournament.
+    :param manager: GameManager, headless
+    :param seeds: list of seeds, one match for each
+    :param max_turns: maximum number of turns of a match
+    :return: list of (seed, names of players left in game) tuples in the order of seeds
+    """
+    state = read_checkpoint(manager.checkpoint_path) if manager.checkpoint_path else None
+    # the list is shared with the checkpoint data, outcomes appended to it are saved with the next checkpoint
+    outcomes = state["data"]["outcomes"] if state else []
+    unfinished = state if state and not state["finished"] else None
+    if state:
+        manager.match_number = state["match_number"]
+    for seed in seeds[len(outcomes):]:
+        manager.checkpoint_data = {"outcomes": outcomes}
+        manager.seed = seed
+        left = manager.run_headless(max_turns, unfinished)
+        unfinished = None
+        outcomes.append((seed, left))
+        if manager.checkpoint_path:
+            manager.save_checkpoint(finished=True)
+    return outcomes
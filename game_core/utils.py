@@ -1,6 +1,7 @@
 import pygame
-import random
+from math import sin, cos
 from game_core.constants import *
+from game_core.debris import DebrisEffect
 
 
 def sys_text_object(text, color, size=FontSize.SMALL):
@@ -59,6 +60,57 @@ def message_to_screen(game_display, text, color, y_displace=0, size=FontSize.SMA
     game_display.blit(text_surf, text_rect)
 
 
+def draw_health_bar(game_display, position, health, text, text_color, active=False):
+    """
+    Draws health bar with a caption under it
+    :param game_display: display to draw on
+    :param position: (x, y) coordinates of the top left corner of the bar
+    :param health: health in percent
+    :param text: caption of the bar
+    :param text_color: color of the caption
+    :param active: if True, the bar is white
+    :return: none
+    """
+    color = low_health_color
+    if health > 65:
+        color = good_health_color
+    elif health > 40:
+        color = normal_health_color
+
+    if active:
+        color = white
+    pygame.draw.rect(game_display,
+                     color,
+                     (position[0], position[1], health * 2, 25))
+    pygame.draw.rect(game_display,
+                     white,
+                     (position[0], position[1], 200, 25),
+                     2)
+    (text_surface, rect_size) = sys_text_object(text, text_color, FontSize.XSMALL)
+    game_display.blit(text_surface, [position[0], position[1]+30])
+
+
+def shell_trajectory(start_position, gun_angle, power, elapsed_time=0.1):
+    """
+    Generates consecutive shell positions of a simple shell shot, the generator never stops by itself
+    :param start_position: (x, y) coordinates of the turret end
+    :param gun_angle: turret angle in radians
+    :param power: shell power (0-100)
+    :param elapsed_time: flight time of the first step, a later time continues a shot from start_position
+    :return: generator of (previous position, current position) tuples
+    """
+    speed = min_shell_speed + shell_speed_step * power
+    horizontal_speed = (speed * sin(gun_angle))
+    shell_position = list(start_position)
+    while True:
+        prev_shell_position = tuple(shell_position)
+        vertical_speed = -((speed * cos(gun_angle)) - 10 * elapsed_time / 2)
+        shell_position[0] += int(horizontal_speed * elapsed_time)
+        shell_position[1] += int(vertical_speed * elapsed_time)
+        elapsed_time += 0.1
+        yield prev_shell_position, tuple(shell_position)
+
+
 def halt_whole_game():
     """
     Halt the whole program
@@ -68,53 +120,59 @@ def halt_whole_game():
     quit()
 
 
-def animate_explosion(game_display, start_point, sound, size=50):
+def animate_explosion(game_display, start_point, sound, size=50, heights=None, camera=None):
     """
-    Animates custom explosion on screen on specified coordinates
+    Animates explosion debris on screen on specified coordinates, the debris settles on the terrain
     :param game_display: display to operate with
     :param size: power (radius) of explosion
     :param start_point: (x,y) coordinates of explosion
     :param sound: sound of explosion
-    :return: none
+    :param heights: heightmap the debris falls on, bottom of the display if None
+    :param camera: Camera of the display, start_point and heights are in world coordinates when given
+    :return: number of animated frames
     """
+    if camera:
+        # debris is animated in display coordinates, only on the visible part of the terrain
+        start_point = camera.to_screen(start_point)
+        if heights is not None:
+            heights = heights[camera.visible_columns()]
     clock = pygame.time.Clock()
     if sound:
         pygame.mixer.Sound.play(sound)
-    explode = True
-    color_choices = [white, red, green, blue, nice_color]
-    while explode:
+    background = game_display.copy()
+    debris = DebrisEffect(game_display, heights)
+    debris.explode(start_point, size)
+    frames = 0
+    while not debris.is_finished():
+        frames += 1
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 halt_whole_game()
 
-        magnitude = 1
-        while magnitude < size:
-            exploding_bit_x = start_point[0] + random.randrange(-1*magnitude, magnitude)
-            exploding_bit_y = start_point[1] + random.randrange(-1*magnitude, magnitude)
-
-            pygame.draw.circle(game_display,
-                               random.choice(color_choices),
-                               (exploding_bit_x, exploding_bit_y),
-                               random.randrange(1, 5))
-            magnitude += 1
-            pygame.display.update()
-            clock.tick(100)
-
-        explode = False
+        debris.Update()
+        game_display.blit(background, (0, 0))
+        debris.Redraw()
+        pygame.display.update()
+        clock.tick(60)
+    return frames
 
 
-def animate_ground_sloughing(game_display, left_ground, ground):
+def animate_ground_sloughing(game_display, left_ground, ground, camera=None):
     """
     Animates ground sloughing
     :param game_display: display to operate with
     :param left_ground: list of all ground pieces to slough
     :param ground: Ground object
-    :return: none
+    :param camera: Camera of the display, pieces of ground are in world coordinates
+    :return: number of animated frames
     """
+    offset = camera.x if camera else 0
     clock = pygame.time.Clock()
     normalized = 0
+    frames = 0
     while normalized < len(left_ground):
         normalized = 0
+        frames += 1
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 halt_whole_game()
@@ -122,8 +180,8 @@ def animate_ground_sloughing(game_display, left_ground, ground):
         for line in left_ground:
             pygame.draw.line(game_display,
                              black,
-                             line[0],
-                             line[1])
+                             (line[0][0] - offset, line[0][1]),
+                             (line[1][0] - offset, line[1][1]))
             if line[0][1] == ground.get_ground_height_at_point(line[0][0]):
                 normalized += 1
             else:
@@ -131,8 +189,9 @@ def animate_ground_sloughing(game_display, left_ground, ground):
                 line[1][1] += 1
             pygame.draw.line(game_display,
                              dark_green,
-                             line[0],
-                             line[1])
+                             (line[0][0] - offset, line[0][1]),
+                             (line[1][0] - offset, line[1][1]))
 
         pygame.display.update()
         clock.tick(100)
+    return frames
@@ -6,9 +6,14 @@
 from math import sqrt
 from libs.pyIgnition import keyframes, interpolate
 import random
+import numpy
 
 UNIVERSAL_CONSTANT_OF_MAKE_GRAVITY_LESS_STUPIDLY_SMALL = 1000.0  # Well, Newton got one to make it less stupidly large.
 
+# Keyframed variables, in the order of values returned by their compiled tracks
+DIRECTEDGRAVITY_VARIABLES = ('strength', 'strengthrandrange', 'direction_x', 'direction_y')
+POINTGRAVITY_VARIABLES = ('strength', 'strengthrandrange', 'pos_x', 'pos_y')
+
 
 def RandomiseStrength(base, range):
 	return base + (float(random.randrange(int(-range * 100), int(range * 100))) / 100.0)
@@ -22,15 +27,13 @@ class DirectedGravity:
 		directionmag = sqrt(direction[0]**2 + direction[1]**2)
 		self.direction = [direction[0] / directionmag, direction[1] / directionmag]
 		
-		self.keyframes = []
+		self.keyframes = keyframes.KeyframeList()
 		self.CreateKeyframe(0, self.strength, self.strengthrandrange, self.direction)
 		self.curframe = 0
 	
 	def Update(self):
-		newvars = interpolate.InterpolateKeyframes(self.curframe, {'strength':self.initstrength, 'strengthrandrange':self.strengthrandrange, 'direction_x':self.direction[0], 'direction_y':self.direction[1]}, self.keyframes)
-		self.initstrength = newvars['strength']
-		self.strengthrandrange = newvars['strengthrandrange']
-		self.direction = [newvars['direction_x'], newvars['direction_y']]
+		self.initstrength, self.strengthrandrange, direction_x, direction_y = interpolate.CompiledTrack(self.keyframes, DIRECTEDGRAVITY_VARIABLES).Evaluate(self.curframe)
+		self.direction = [direction_x, direction_y]
 		
 		if self.strengthrandrange != 0.0:
 			self.strength = RandomiseStrength(self.initstrength, self.strengthrandrange)
@@ -42,6 +45,9 @@ class DirectedGravity:
 		
 		return force
 	
+	def GetForces(self, positions):  # Vectorised GetForce for an (n, 2) array of positions - the force is the same everywhere, so one vector is returned and broadcast
+		return numpy.array([self.strength * self.direction[0], self.strength * self.direction[1]])
+	
 	def CreateKeyframe(self, frame, strength = None, strengthrandrange = None, direction = [None, None], interpolationtype = "linear"):
 		keyframes.CreateKeyframe(self.keyframes, frame, {'strength':strength, 'strengthrandrange':strengthrandrange, 'direction_x':direction[0], 'direction_y':direction[1], 'interpolationtype':interpolationtype})
 	
@@ -65,15 +71,13 @@ class PointGravity:
 		self.strengthrandrange = strengthrandrange
 		self.pos = pos
 		
-		self.keyframes = []
+		self.keyframes = keyframes.KeyframeList()
 		self.CreateKeyframe(0, self.strength, self.strengthrandrange, self.pos)
 		self.curframe = 0
 	
 	def Update(self):			
-		newvars = interpolate.InterpolateKeyframes(self.curframe, {'strength':self.initstrength, 'strengthrandrange':self.strengthrandrange, 'pos_x':self.pos[0], 'pos_y':self.pos[1]}, self.keyframes)
-		self.initstrength = newvars['strength']
-		self.strengthrandrange = newvars['strengthrandrange']
-		self.pos = (newvars['pos_x'], newvars['pos_y'])
+		self.initstrength, self.strengthrandrange, pos_x, pos_y = interpolate.CompiledTrack(self.keyframes, POINTGRAVITY_VARIABLES).Evaluate(self.curframe)
+		self.pos = (pos_x, pos_y)
 		
 		if self.strengthrandrange != 0.0:
 			self.strength = RandomiseStrength(self.initstrength, self.strengthrandrange)
@@ -98,6 +102,18 @@ class PointGravity:
 		
 		return force
 	
+	def GetForces(self, positions):  # Vectorised GetForce for an (n, 2) array of positions
+		vecs = numpy.asarray(self.pos, dtype = float) - positions
+		distsquared = numpy.einsum('ij,ij->i', vecs, vecs)
+		forces = numpy.zeros_like(vecs)
+		nonzero = distsquared != 0.0
+		
+		distsquared = distsquared[nonzero]
+		forcemag = (self.strength * UNIVERSAL_CONSTANT_OF_MAKE_GRAVITY_LESS_STUPIDLY_SMALL) / distsquared
+		forces[nonzero] = vecs[nonzero] * (forcemag / numpy.sqrt(distsquared))[:, numpy.newaxis]
+		
+		return forces
+	
 	def GetMaxForce(self):
 		return self.strength * UNIVERSAL_CONSTANT_OF_MAKE_GRAVITY_LESS_STUPIDLY_SMALL
 	
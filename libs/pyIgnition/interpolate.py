@@ -4,6 +4,7 @@
 # Utility module for interpolating between keyframed values
 
 import math
+import numpy
 
 
 def LinearInterpolate(val1, val2, t):
@@ -72,4 +73,78 @@ def InterpolateKeyframes(curframe, variables, keyframes):
 			elif keyframes[nextkeyframe].variables['interpolationtype'] == "cosine":
 				finalvariables[key] = CosineInterpolateKeyframes(curframe, keyframes[curkeyframe].frame, keyframes[nextkeyframe].frame, keyframes[curkeyframe].variables[key], keyframes[nextkeyframe].variables[key])
 	
-	return finalvariables
\ No newline at end of file
+	return finalvariables
+
+
+# Compiled keyframe tracks
+#
+# InterpolateKeyframes scans all keyframes for every variable on every call. A track compiles the keyframes once
+# into sorted per-variable arrays of frames and values, and evaluates all its variables for many frames with
+# NumPy at once. Objects updated every frame read their values from dense per-frame tables built in chunks of
+# CHUNKFRAMES frames, so one frame costs a single row lookup.
+
+CHUNKFRAMES = 64
+
+
+class KeyframeTrack:
+	def __init__(self, keyframes, names):
+		self.names = tuple(names)
+		self.frames = []  # Per variable: frames of the keyframes defining it
+		self.values = []  # Per variable: keyed values
+		self.cosine = []  # Per variable: True where the keyframe is reached by cosine interpolation
+		for name in self.names:
+			defining = [keyframe for keyframe in keyframes if keyframe.variables.get(name) is not None]
+			self.frames.append(numpy.array([keyframe.frame for keyframe in defining], dtype = float))
+			self.values.append(numpy.array([keyframe.variables[name] for keyframe in defining], dtype = float))
+			self.cosine.append(numpy.array([keyframe.variables.get('interpolationtype') == "cosine" for keyframe in defining], dtype = bool))
+		
+		# After this frame no value changes any more
+		self.lastframe = int(max([frames[-1] for frames in self.frames if len(frames)] + [0]))
+		self.chunkstart = None
+		self.chunk = None
+	
+	def EvaluateFrames(self, curframes):  # Values of all variables for an array of frames, array of shape (frames, variables)
+		curframes = numpy.asarray(curframes, dtype = float)
+		result = numpy.zeros((len(curframes), len(self.names)))
+		for i in range(len(self.names)):
+			frames = self.frames[i]
+			values = self.values[i]
+			if not len(frames):
+				continue
+			
+			# Current keyframe is the last one at or before the frame, the next one is the first after it
+			cur = numpy.clip(numpy.searchsorted(frames, curframes, side = 'right') - 1, 0, len(frames) - 1)
+			nxt = numpy.minimum(cur + 1, len(frames) - 1)
+			interpolated = (nxt != cur) & (frames[cur] <= curframes)
+			
+			key1 = frames[cur]
+			key2 = numpy.where(interpolated, frames[nxt], key1 + 1.0)
+			t = (curframes - key1) / (key2 - key1)
+			val1 = values[cur]
+			val2 = values[nxt]
+			linear = val1 + (val2 - val1) * t
+			cosine = ((val2 - val1) / 2.0) * numpy.cos(numpy.pi * (1.0 - t)) + (val1 + val2) / 2.0
+			result[:, i] = numpy.where(interpolated, numpy.where(self.cosine[i][nxt], cosine, linear), val1)
+		return result
+	
+	def Evaluate(self, curframe):  # Values of all variables for one frame, as a list in the order of names
+		if curframe > self.lastframe:
+			curframe = self.lastframe
+		offset = curframe - self.chunkstart if self.chunk is not None else -1
+		if not (0 <= offset < len(self.chunk or ())):
+			self.chunkstart = curframe
+			self.chunk = self.EvaluateFrames(numpy.arange(curframe, min(curframe + CHUNKFRAMES, self.lastframe + 1))).tolist()
+			offset = 0
+		return self.chunk[int(offset)]
+
+
+def CompiledTrack(keyframes, names):  # Track of the keyframes, kept by a KeyframeList until the list changes
+	try:
+		tracks = keyframes.tracks
+	except AttributeError:
+		return KeyframeTrack(keyframes, names)
+	
+	track = tracks.get(names)
+	if track is None:
+		track = tracks[names] = KeyframeTrack(keyframes, names)
+	return track
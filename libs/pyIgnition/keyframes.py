@@ -4,6 +4,24 @@
 # Keyframe object and generic keyframe creation function
 
 
+class KeyframeList(list):  # List of keyframes which drops its compiled tracks (see interpolate.CompiledTrack) whenever it is changed
+	def __init__(self, *args):
+		list.__init__(self, *args)
+		self.tracks = {}
+	
+	def Changed(self):
+		self.tracks.clear()
+
+def _changing(method):
+	def changingmethod(self, *args, **kwargs):
+		self.Changed()
+		return method(self, *args, **kwargs)
+	return changingmethod
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', 'append', 'extend', 'insert', 'remove', 'pop', 'clear', 'sort', 'reverse'):
+	setattr(KeyframeList, _name, _changing(getattr(list, _name)))
+
+
 def CreateKeyframe(parentframes, frame, variables):
 	newframe = Keyframe(frame, variables)
 	
@@ -4,12 +4,18 @@
 # Obstacle objects
 
 import pygame
+import numpy
 from math import sqrt, pow
 from libs.pyIgnition.gravity import UNIVERSAL_CONSTANT_OF_MAKE_GRAVITY_LESS_STUPIDLY_SMALL, keyframes, interpolate
 
 
 MAXDIST = 20.0
 
+# Keyframed variables, in the order of values returned by their compiled tracks
+CIRCLE_VARIABLES = ('pos_x', 'pos_y', 'colour_r', 'colour_g', 'colour_b', 'bounce', 'radius')
+RECTANGLE_VARIABLES = ('pos_x', 'pos_y', 'colour_r', 'colour_g', 'colour_b', 'bounce', 'width', 'height')
+BOUNDARYLINE_VARIABLES = ('pos_x', 'pos_y', 'colour_r', 'colour_g', 'colour_b', 'bounce', 'normal_x', 'normal_y')
+
 
 def dotproduct2d(v1, v2):
 	return ((v1[0] * v2[0]) + (v1[1] * v2[1]))
@@ -30,15 +36,26 @@ def normalise(vec):
 	mag = magnitude(vec)
 	return [vec[0] / mag, vec[1] / mag]
 
+def magnitudes(vecs):  # Magnitudes of an (n, 2) array of vectors
+	return numpy.sqrt(numpy.einsum('ij,ij->i', vecs, vecs))
+
+def inversecubes(r):  # Inverse cube distance law of the force factors, 1.0 within a pixel
+	factors = numpy.ones_like(r)
+	far = r > 1.0
+	factors[far] = 1.0 / (r[far] ** 3.0)
+	return factors
+
 
 class Obstacle:
+	bounded = True  # Whether the obstacle only acts within maxdist of its position, so it can be entered into an ObstacleGrid
+	
 	def __init__(self, pos, colour, bounce):
 		self.pos = pos
 		self.colour = colour
 		self.bounce = bounce
 		self.maxdist = MAXDIST  # The maximum (square-based, not circle-based) distance away for which forces will still be calculated
 		self.curframe = 0
-		self.keyframes = []
+		self.keyframes = keyframes.KeyframeList()
 	
 	def Draw(self, display):
 		pass
@@ -83,6 +100,56 @@ class Obstacle:
 		# Force = bounce factor * velocity * distance force factor (0.0 - 1.0) * angle force factor (0.0 - 1.0), along the direction of the normal pointing away from the obstacle
 		return [normal[0] * forcefactor * velmag * scalingfactor * self.bounce, normal[1] * forcefactor * velmag * scalingfactor * self.bounce]
 	
+	# Vectorised versions of the methods above, taking (n, 2) arrays of positions and velocities
+	
+	def OutOfRanges(self, positions):
+		return (numpy.abs(positions - numpy.asarray(self.pos, dtype = float)) > self.maxdist).any(axis = 1)
+	
+	def InsideObjects(self, positions):
+		return numpy.zeros(len(positions), dtype = bool)
+	
+	def GetResolvedPositions(self, positions):  # Positions must all be inside the object
+		return positions
+	
+	def ShiftFromOrigin(self, positions):  # Particles at the origin are shifted up a pixel to avoid divide-by-zero errors
+		positions = numpy.array(positions, dtype = float)
+		atorigin = (positions == numpy.asarray(self.pos, dtype = float)).all(axis = 1)
+		positions[atorigin, 1] -= 1
+		return positions
+	
+	def GetNormals(self, positions):
+		pass
+	
+	def GetForceFactors(self, positions):
+		pass
+	
+	def ResolveInside(self, positions):  # Moves particles inside the object to its surface, modifies the array in place
+		inside = self.InsideObjects(positions)
+		inside[inside] = ~self.OutOfRanges(positions[inside])
+		if inside.any():
+			positions[inside] = self.GetResolvedPositions(positions[inside])
+	
+	def GetForces(self, positions, velocities):
+		forces = numpy.zeros_like(positions)
+		if self.bounce == 0.0:
+			return forces
+		
+		near = ~self.OutOfRanges(positions) & (positions != numpy.asarray(self.pos, dtype = float)).any(axis = 1)
+		indices = numpy.flatnonzero(near)
+		normals = self.GetNormals(positions[indices])
+		scalingfactors = -numpy.einsum('ij,ij->i', normals, velocities[indices])
+		
+		# Only repulsive forces are applied
+		pushed = scalingfactors > 0.0
+		indices = indices[pushed]
+		normals = normals[pushed]
+		
+		forcefactors = self.GetForceFactors(positions[indices])
+		velmags = magnitudes(velocities[indices])
+		forces[indices] = normals * (forcefactors * velmags * scalingfactors[pushed] * self.bounce)[:, numpy.newaxis]
+		
+		return forces
+	
 	def CreateKeyframe(self):
 		pass
 	
@@ -108,11 +175,9 @@ class Circle(Obstacle):
 		pygame.draw.circle(display, self.colour, self.pos, self.radius)
 	
 	def Update(self):
-		newvars = interpolate.InterpolateKeyframes(self.curframe, {'pos_x':self.pos[0], 'pos_y':self.pos[1], 'colour_r':self.colour[0], 'colour_g':self.colour[1], 'colour_b':self.colour[2], 'bounce':self.bounce, 'radius':self.radius}, self.keyframes)
-		self.pos = (newvars['pos_x'], newvars['pos_y'])
-		self.colour = (newvars['colour_r'], newvars['colour_g'], newvars['colour_b'])
-		self.bounce = newvars['bounce']
-		self.radius = newvars['radius']
+		pos_x, pos_y, colour_r, colour_g, colour_b, self.bounce, self.radius = interpolate.CompiledTrack(self.keyframes, CIRCLE_VARIABLES).Evaluate(self.curframe)
+		self.pos = (pos_x, pos_y)
+		self.colour = (colour_r, colour_g, colour_b)
 		
 		Obstacle.Update(self)
 	
@@ -150,6 +215,26 @@ class Circle(Obstacle):
 		
 		return force
 	
+	def InsideObjects(self, positions):
+		vecs = positions - numpy.asarray(self.pos, dtype = float)
+		return numpy.einsum('ij,ij->i', vecs, vecs) < self.radiussquared
+	
+	def GetResolvedPositions(self, positions):
+		positions = self.ShiftFromOrigin(positions)
+		return numpy.asarray(self.pos, dtype = float) + self.GetNormals(positions) * self.radius
+	
+	def GetNormals(self, positions):
+		vecs = positions - numpy.asarray(self.pos, dtype = float)
+		return vecs / magnitudes(vecs)[:, numpy.newaxis]
+	
+	def GetForceFactors(self, positions):
+		newpos = positions - self.radius * self.GetNormals(positions)
+		distcubed = (numpy.abs(newpos - numpy.asarray(self.pos, dtype = float)) ** 3.0).sum(axis = 1)
+		factors = numpy.ones(len(positions))
+		far = distcubed > 1.0
+		factors[far] = 1.0 / distcubed[far]
+		return factors
+	
 	def CreateKeyframe(self, frame, pos = (None, None), colour = (None, None, None), bounce = None, radius = None, interpolationtype = "linear"):
 		keyframes.CreateKeyframe(self.keyframes, frame, {'pos_x':pos[0], 'pos_y':pos[1], 'colour_r':colour[0], 'colour_g':colour[1], 'colour_b':colour[2], 'bounce':bounce, 'radius':radius, 'interpolationtype':interpolationtype})
 	
@@ -174,13 +259,10 @@ class Rectangle(Obstacle):
 		pygame.draw.rect(display, self.colour, pygame.Rect(self.pos[0] - self.halfwidth, self.pos[1] - self.halfheight, self.width, self.height))
 	
 	def Update(self):
-		newvars = interpolate.InterpolateKeyframes(self.curframe, {'pos_x':self.pos[0], 'pos_y':self.pos[1], 'colour_r':self.colour[0], 'colour_g':self.colour[1], 'colour_b':self.colour[2], 'bounce':self.bounce, 'width':self.width, 'height':self.height}, self.keyframes)
-		self.pos = (newvars['pos_x'], newvars['pos_y'])
-		self.colour = (newvars['colour_r'], newvars['colour_g'], newvars['colour_b'])
-		self.bounce = newvars['bounce']
-		self.width = newvars['width']
+		pos_x, pos_y, colour_r, colour_g, colour_b, self.bounce, self.width, self.height = interpolate.CompiledTrack(self.keyframes, RECTANGLE_VARIABLES).Evaluate(self.curframe)
+		self.pos = (pos_x, pos_y)
+		self.colour = (colour_r, colour_g, colour_b)
 		self.halfwidth = self.width / 2.0
-		self.height = newvars['height']
 		self.halfheight = self.height / 2.0
 		self.maxdist = max(self.halfwidth, self.halfheight) + MAXDIST
 		
@@ -244,6 +326,55 @@ class Rectangle(Obstacle):
 		
 		return (1.0 / pow(float(r), 3.0))
 	
+	def InsideObjects(self, positions):
+		x = positions[:, 0]
+		y = positions[:, 1]
+		return (x > (self.pos[0] - self.halfwidth)) & (x < (self.pos[0] + self.halfwidth)) & (y > (self.pos[1] - self.halfheight)) & (y < (self.pos[1] + self.halfheight))
+	
+	def GetResolvedPositions(self, positions):
+		positions = self.ShiftFromOrigin(positions)
+		dx = positions[:, 0] - self.pos[0]
+		dy = positions[:, 1] - self.pos[1]
+		
+		# Particles in the upper or lower triangle (see GetResolved) go to the top or bottom side, the others to the left or right side
+		vertical = (dx == 0) | ((dy != 0) & (numpy.abs(dy) * float(self.width) > float(self.height) * numpy.abs(dx)))
+		resolved = positions.copy()
+		resolved[vertical, 1] = self.pos[1] + numpy.where(dy[vertical] > 0, self.halfheight, -self.halfheight)
+		resolved[~vertical, 0] = self.pos[0] + numpy.where(dx[~vertical] > 0, self.halfwidth, -self.halfwidth)
+		return resolved
+	
+	def GetNormals(self, positions):
+		x = positions[:, 0]
+		y = positions[:, 1]
+		vecs = positions - numpy.asarray(self.pos, dtype = float)
+		normals = vecs / magnitudes(vecs)[:, numpy.newaxis]
+		
+		# Sides are checked in reverse order of GetNormal, so the first matching side wins
+		normals[x > (self.pos[0] + self.halfwidth)] = [1, 0]
+		normals[x < (self.pos[0] - self.halfwidth)] = [-1, 0]
+		normals[y > (self.pos[1] + self.halfheight)] = [0, 1]
+		normals[y < (self.pos[1] - self.halfheight)] = [0, -1]
+		return normals
+	
+	def GetForceFactors(self, positions):
+		nor = self.GetNormals(positions)
+		dx = positions[:, 0] - self.pos[0]
+		dy = positions[:, 1] - self.pos[1]
+		withinwidth = numpy.abs(dx) < self.halfwidth
+		withinheight = numpy.abs(dy) < self.halfheight
+		
+		factors = numpy.ones(len(positions))
+		vertical = nor[:, 0] == 0
+		horizontal = ~vertical & (nor[:, 1] == 0)
+		factors[vertical & ~withinwidth] = 0.0
+		factors[horizontal & ~withinheight] = 0.0
+		
+		# GetForceFactor measures horizontal distances with halfheight as well
+		r = numpy.where(vertical, numpy.abs(dy), numpy.abs(dx)) - self.halfheight
+		scaled = (vertical & withinwidth) | (horizontal & withinheight)
+		factors[scaled] = inversecubes(r[scaled])
+		return factors
+	
 	def CreateKeyframe(self, frame, pos = (None, None), colour = (None, None, None), bounce = None, width = None, height = None, interpolationtype = "linear"):
 		keyframes.CreateKeyframe(self.keyframes, frame, {'pos_x':pos[0], 'pos_y':pos[1], 'colour_r':colour[0], 'colour_g':colour[1], 'colour_b':colour[2], 'bounce':bounce, 'width':width, 'height':height, 'interpolationtype':interpolationtype})
 	
@@ -258,6 +389,8 @@ class Rectangle(Obstacle):
 
 
 class BoundaryLine(Obstacle):
+	bounded = False
+	
 	def __init__(self, pos, colour, bounce, normal):
 		Obstacle.__init__(self, pos, colour, bounce)
 		self.normal = normalise(normal)
@@ -313,12 +446,11 @@ class BoundaryLine(Obstacle):
 		pygame.draw.aalines(display, self.colour, True, self.edgecontacts)
 	
 	def Update(self):
-		newvars = interpolate.InterpolateKeyframes(self.curframe, {'pos_x':self.pos[0], 'pos_y':self.pos[1], 'colour_r':self.colour[0], 'colour_g':self.colour[1], 'colour_b':self.colour[2], 'bounce':self.bounce, 'normal_x':self.normal[0], 'normal_y':self.normal[1]}, self.keyframes)
-		self.pos = (newvars['pos_x'], newvars['pos_y'])
-		self.colour = (newvars['colour_r'], newvars['colour_g'], newvars['colour_b'])
-		self.bounce = newvars['bounce']
+		pos_x, pos_y, colour_r, colour_g, colour_b, self.bounce, normal_x, normal_y = interpolate.CompiledTrack(self.keyframes, BOUNDARYLINE_VARIABLES).Evaluate(self.curframe)
+		self.pos = (pos_x, pos_y)
+		self.colour = (colour_r, colour_g, colour_b)
 		oldnormal = self.normal[:]
-		self.normal = [newvars['normal_x'], newvars['normal_y']]
+		self.normal = [normal_x, normal_y]
 		if self.normal != oldnormal:
 			self.hascontacts = False
 		
@@ -354,6 +486,25 @@ class BoundaryLine(Obstacle):
 		
 		return (1.0 / pow(r, 3.0))
 	
+	def GetDists(self, positions):
+		return (positions - numpy.asarray(self.pos, dtype = float)) @ numpy.asarray(self.normal, dtype = float)
+	
+	def OutOfRanges(self, positions):
+		return self.GetDists(positions) > MAXDIST
+	
+	def InsideObjects(self, positions):
+		return self.GetDists(positions) <= 0.0
+	
+	def GetResolvedPositions(self, positions):
+		positions = self.ShiftFromOrigin(positions)
+		return positions + numpy.abs(self.GetDists(positions))[:, numpy.newaxis] * numpy.asarray(self.normal, dtype = float)
+	
+	def GetNormals(self, positions):
+		return numpy.tile(numpy.asarray(self.normal, dtype = float), (len(positions), 1))
+	
+	def GetForceFactors(self, positions):
+		return inversecubes(self.GetDists(positions))
+	
 	def CreateKeyframe(self, frame, pos = (None, None), colour = (None, None, None), bounce = None, normal = [None, None], interpolationtype = "linear"):
 		if (normal != [None, None]) and (abs(magnitudesquared(normal) - 1.0) >= 0.3):
 			normal = normalise(normal)
@@ -1,4 +1,14 @@
-from libs.pyIgnition import particles, gravity, obstacles
+import numpy
+
+from libs.pyIgnition import particles, gravity, obstacles, renderer, spatialhash
+
+# Particles are stored as a structure of arrays, one row per particle:
+#   positions, velocities  - (n, 2) float arrays
+#   lives, frames          - life length and current frame of each particle
+#   sourceindices          - index of the particle's source in particlesources, the source gives
+#                            drawtype, image and the per-frame colour/radius/length cache
+#   colours, radii, lengths - current values read from the source's cache
+# All particles are updated with a few NumPy operations per gravity and obstacle per frame.
 
 class ParticleEffect:
     def __init__(self, display, pos, size):
@@ -11,10 +21,23 @@ class ParticleEffect:
         self.right = pos[0] + size[0]
         self.bottom = pos[1] + size[1]
 
-        self.particles = []
         self.sources = []
         self.gravities = []
         self.obstacles = []
+        self.renderer = renderer.ParticleRenderer()
+        self.obstaclegrid = spatialhash.ObstacleGrid()
+
+        self.particlesources = []  # Sources of stored particles, including ones added by AddParticle
+        self.sourceindex = {}  # id(source) -> index in particlesources
+        self.newparticles = []  # Batches added since the last merge
+        self.positions = numpy.zeros((0, 2))
+        self.velocities = numpy.zeros((0, 2))
+        self.lives = numpy.zeros(0, dtype = int)
+        self.frames = numpy.zeros(0, dtype = int)
+        self.sourceindices = numpy.zeros(0, dtype = int)
+        self.colours = numpy.zeros((0, 3))
+        self.radii = numpy.zeros(0)
+        self.lengths = numpy.zeros(0)
 
     def Update(self):
         for source in self.sources:
@@ -26,34 +49,70 @@ class ParticleEffect:
         for obstacle in self.obstacles:
             obstacle.Update()
 
-        for particle in self.particles:
-            totalforce = [0.0, 0.0]
-
-            for gravity in self.gravities:
-                force = gravity.GetForce(particle.pos)
-                totalforce[0] += force[0]
-                totalforce[1] += force[1]
-
-            for obstacle in self.obstacles:
-                if (not obstacle.OutOfRange(particle.pos)) and (obstacle.InsideObject(particle.pos)):
-                    particle.pos = obstacle.GetResolved(particle.pos)
+        self.MergeNewParticles()
+        if not len(self.positions):
+            return
 
-                force = obstacle.GetForce(particle.pos, particle.velocity)
-                totalforce[0] += force[0]
-                totalforce[1] += force[1]
+        totalforces = numpy.zeros_like(self.positions)
 
-            particle.velocity = [particle.velocity[0] + totalforce[0], particle.velocity[1] + totalforce[1]]
-
-            particle.Update()
+        for gravity in self.gravities:
+            totalforces += gravity.GetForces(self.positions)
+
+        if self.obstacles:
+            self.ApplyObstacles(totalforces)
+
+        self.velocities += totalforces
+        self.positions += self.velocities
+
+        # Particles past their life die, the others take the cached values of their current frame
+        alive = self.frames <= self.lives
+        caches = [source.particlecachearray for source in self.particlesources]
+        offsets = numpy.cumsum([0] + [len(cache) for cache in caches])
+        lastframes = offsets[1:] - offsets[:-1] - 1
+        rows = offsets[self.sourceindices[alive]] + numpy.minimum(self.frames[alive], lastframes[self.sourceindices[alive]])
+        values = numpy.concatenate(caches)[rows]
+        self.colours[alive] = values[:, particles.CACHE_COLOUR]
+        self.radii[alive] = values[:, particles.CACHE_RADIUS]
+        self.lengths[alive] = values[:, particles.CACHE_LENGTH]
+        self.frames[alive] += 1
 
         # Delete dead particles
-        for particle in self.particles:
-            if not particle.alive:
-                self.particles.remove(particle)
+        if not alive.all():
+            self.positions = self.positions[alive]
+            self.velocities = self.velocities[alive]
+            self.lives = self.lives[alive]
+            self.frames = self.frames[alive]
+            self.sourceindices = self.sourceindices[alive]
+            self.colours = self.colours[alive]
+            self.radii = self.radii[alive]
+            self.lengths = self.lengths[alive]
+
+    def ApplyObstacles(self, totalforces):
+        # Obstacles are applied one after another, so each one sees positions resolved by the previous ones.
+        # Each obstacle only gets the particles in the grid cells around it, and particles moved by an obstacle
+        # are looked up again for the following ones.
+        candidates = self.obstaclegrid.Candidates(self.obstacles, self.positions)
+        for i, obstacle in enumerate(self.obstacles):
+            indices = candidates.Get(i)
+            if indices is None:
+                positions = self.positions.copy()
+                obstacle.ResolveInside(self.positions)
+                totalforces += obstacle.GetForces(self.positions, self.velocities)
+                moved = numpy.flatnonzero((positions != self.positions).any(axis = 1))
+            else:
+                if not len(indices):
+                    continue
+                positions = self.positions[indices]
+                obstacle.ResolveInside(positions)
+                totalforces[indices] += obstacle.GetForces(positions, self.velocities[indices])
+                moved = indices[(positions != self.positions[indices]).any(axis = 1)]
+                self.positions[indices] = positions
+            if len(moved):
+                candidates.AddMoved(moved, self.positions, i)
 
     def Redraw(self):
-        for particle in self.particles:
-            particle.Draw(self.display)
+        self.MergeNewParticles()
+        self.renderer.Draw(self.display, self)
 
         for obstacle in self.obstacles:
             obstacle.Draw(self.display)
@@ -88,5 +147,47 @@ class ParticleEffect:
         self.obstacles.append(newline)
         return newline
 
+    def GetSourceIndex(self, source):
+        if id(source) not in self.sourceindex:
+            self.sourceindex[id(source)] = len(self.particlesources)
+            self.particlesources.append(source)
+        return self.sourceindex[id(source)]
+
+    def AddParticles(self, source, positions, velocities, life, frame = 0, colour = None, radius = None, length = None):
+        # Adds a batch of particles of one source, colour, radius and length default to the source's values
+        count = len(positions)
+        colour = source.colour if colour is None else colour
+        radius = source.radius if radius is None else radius
+        length = source.length if length is None else length
+        self.newparticles.append((numpy.asarray(positions, dtype = float).reshape(count, 2), numpy.asarray(velocities, dtype = float).reshape(count, 2),
+                                  numpy.full(count, life, dtype = int), numpy.full(count, frame, dtype = int), numpy.full(count, self.GetSourceIndex(source), dtype = int),
+                                  numpy.tile(numpy.asarray(colour, dtype = float), (count, 1)), numpy.full(count, radius, dtype = float), numpy.full(count, length, dtype = float)))
+
     def AddParticle(self, particle):
-        self.particles.append(particle)
+        # Drawtype and image of the particle are taken from its parent source
+        self.AddParticles(particle.parent, [particle.pos], [particle.velocity], particle.life, particle.curframe, particle.colour, particle.radius, particle.length)
+
+    def MergeNewParticles(self):
+        # New batches are joined to the particle arrays with one concatenation per array
+        if not self.newparticles:
+            return
+        columns = list(zip(*self.newparticles))
+        self.newparticles = []
+        self.positions, self.velocities, self.lives, self.frames, self.sourceindices, self.colours, self.radii, self.lengths = [
+            numpy.concatenate((current,) + batches) for current, batches in
+            zip((self.positions, self.velocities, self.lives, self.frames, self.sourceindices, self.colours, self.radii, self.lengths), columns)]
+
+    def GetParticleCount(self):
+        return len(self.positions) + sum(len(batch[0]) for batch in self.newparticles)
+
+    @property
+    def particles(self):
+        # Copies of the stored particles as Particle objects, for inspection
+        self.MergeNewParticles()
+        result = []
+        for i in range(len(self.positions)):
+            source = self.particlesources[self.sourceindices[i]]
+            particle = particles.Particle(source, list(self.positions[i]), list(self.velocities[i]), int(self.lives[i]), source.drawtype, tuple(self.colours[i]), float(self.radii[i]), float(self.lengths[i]), source.image)
+            particle.curframe = int(self.frames[i])
+            result.append(particle)
+        return result
@@ -5,7 +5,8 @@
 
 
 from libs.pyIgnition import keyframes, interpolate
-import random, math, pygame
+import math, pygame
+import numpy
 
 
 DRAWTYPE_POINT = 0
@@ -15,6 +16,51 @@ DRAWTYPE_SCALELINE = 3
 DRAWTYPE_BUBBLE = 4
 DRAWTYPE_IMAGE = 5
 
+# Keyframed variables, in the order of values returned by their compiled tracks
+SOURCE_VARIABLES = ('pos_x', 'pos_y', 'initspeed', 'initdirection', 'initspeedrandrange', 'initdirectionrandrange', 'particlesperframe', 'genspacing')
+PARTICLE_VARIABLES = ('colour_r', 'colour_g', 'colour_b', 'radius', 'length')
+
+# Columns of ParticleSource.particlecachearray, the same as PARTICLE_VARIABLES
+CACHE_COLOUR = slice(0, 3)
+CACHE_RADIUS = 3
+CACHE_LENGTH = 4
+
+
+def DrawParticle(display, drawtype, pos, velocity, colour, radius, length, image):
+	if (pos[0] > 10000) or (pos[1] > 10000) or (pos[0] < -10000) or (pos[1] < -10000):
+		return
+	
+	if drawtype == DRAWTYPE_POINT:  # Point
+		display.set_at((int(pos[0]), int(pos[1])), colour)  # Pygame 2 draws nothing for circles of radius 0
+		
+	elif drawtype == DRAWTYPE_CIRCLE:  # Circle
+		pygame.draw.circle(display, colour, pos, radius)
+	
+	elif drawtype == DRAWTYPE_LINE:
+		if length == 0.0:
+			display.set_at((int(pos[0]), int(pos[1])), colour)
+		
+		else:
+			velocitymagoverlength = math.sqrt(velocity[0]**2 + velocity[1]**2) / length
+			linevec = [(velocity[0] / velocitymagoverlength), (velocity[1] / velocitymagoverlength)]
+			endpoint = [pos[0] + linevec[0], pos[1] + linevec[1]]
+			pygame.draw.aaline(display, colour, pos, endpoint)
+		
+	elif drawtype == DRAWTYPE_SCALELINE:  # Scaling line (scales with velocity)
+		endpoint = [pos[0] + velocity[0], pos[1] + velocity[1]]
+		pygame.draw.aaline(display, colour, pos, endpoint)
+		
+	elif drawtype == DRAWTYPE_BUBBLE:  # Bubble
+		if radius >= 1.0:
+
+			pygame.draw.circle(display, colour, pos, radius, 1)
+		else:  # Pygame won't draw circles with thickness < radius, so if radius is smaller than one don't bother trying to set thickness
+			pygame.draw.circle(display, colour, pos, radius)
+	
+	elif drawtype == DRAWTYPE_IMAGE:  # Image
+		size = image.get_size()
+		display.blit(image, (pos[0] - size[1], pos[1] - size[1]))
+
 
 class Particle:
 	def __init__(self, parent, initpos, velocity, life, drawtype = 0, colour = (0, 0, 0), radius = 0.0, length = 0.0, image = None, keyframes = []):
@@ -48,39 +94,7 @@ class Particle:
 			self.curframe = self.curframe + 1
 	
 	def Draw(self, display):
-		if (self.pos[0] > 10000) or (self.pos[1] > 10000) or (self.pos[0] < -10000) or (self.pos[1] < -10000):
-			return
-		
-		if self.drawtype == DRAWTYPE_POINT:  # Point
-			pygame.draw.circle(display, self.colour, self.pos, 0)
-			
-		elif self.drawtype == DRAWTYPE_CIRCLE:  # Circle
-			pygame.draw.circle(display, self.colour, self.pos, self.radius)
-		
-		elif self.drawtype == DRAWTYPE_LINE:
-			if self.length == 0.0:
-				pygame.draw.circle(display, self.colour, self.pos, 0)
-			
-			else:
-				velocitymagoverlength = math.sqrt(self.velocity[0]**2 + self.velocity[1]**2) / self.length
-				linevec = [(self.velocity[0] / velocitymagoverlength), (self.velocity[1] / velocitymagoverlength)]
-				endpoint = [self.pos[0] + linevec[0], self.pos[1] + linevec[1]]
-				pygame.draw.aaline(display, self.colour, self.pos, endpoint)
-			
-		elif self.drawtype == DRAWTYPE_SCALELINE:  # Scaling line (scales with velocity)
-			endpoint = [self.pos[0] + self.velocity[0], self.pos[1] + self.velocity[1]]
-			pygame.draw.aaline(display, self.colour, self.pos, endpoint)
-			
-		elif self.drawtype == DRAWTYPE_BUBBLE:  # Bubble
-			if self.radius >= 1.0:
-
-				pygame.draw.circle(display, self.colour, self.pos, self.radius, 1)
-			else:  # Pygame won't draw circles with thickness < radius, so if radius is smaller than one don't bother trying to set thickness
-				pygame.draw.circle(display, self.colour, self.pos, self.radius)
-		
-		elif self.drawtype == DRAWTYPE_IMAGE:  # Image
-			size = self.image.get_size()
-			display.blit(self.image, (self.pos[0] - size[1], self.pos[1] - size[1]))
+		DrawParticle(display, self.drawtype, self.pos, self.velocity, self.colour, self.radius, self.length, self.image)
 
 	def CreateKeyframe(self, frame, colour = (None, None, None), radius = None, length = None):
 		keyframes.CreateKeyframe(self.keyframes, frame, {'colour_r':colour[0], 'colour_g':colour[1], 'colour_b':colour[2], 'radius':radius, 'length':length})
@@ -103,43 +117,38 @@ class ParticleSource:
 		self.length = length
 		self.image = image
 		
-		self.keyframes = []
+		self.keyframes = keyframes.KeyframeList()
 		self.CreateKeyframe(0, self.pos, self.initspeed, self.initdirection, self.initspeedrandrange, self.initdirectionrandrange, self.particlesperframe, self.genspacing)
-		self.particlekeyframes = []
+		self.particlekeyframes = keyframes.KeyframeList()
 		self.particlecache = []
 		self.CreateParticleKeyframe(0, colour = self.colour, radius = self.radius, length = self.length)
 		self.curframe = 0
 	
 	def Update(self):		
-		newvars = interpolate.InterpolateKeyframes(self.curframe, {'pos_x':self.pos[0], 'pos_y':self.pos[1], 'initspeed':self.initspeed, 'initdirection':self.initdirection, 'initspeedrandrange':self.initspeedrandrange, 'initdirectionrandrange':self.initdirectionrandrange, 'particlesperframe':self.particlesperframe, 'genspacing':self.genspacing}, self.keyframes)
-		self.pos = (newvars['pos_x'], newvars['pos_y'])
-		self.initspeed = newvars['initspeed']
-		self.initdirection = newvars['initdirection']
-		self.initspeedrandrange = newvars['initspeedrandrange']
-		self.initdirectionrandrange = newvars['initdirectionrandrange']
-		self.particlesperframe = newvars['particlesperframe']
-		self.genspacing = newvars['genspacing']
+		pos_x, pos_y, self.initspeed, self.initdirection, self.initspeedrandrange, self.initdirectionrandrange, self.particlesperframe, self.genspacing = interpolate.CompiledTrack(self.keyframes, SOURCE_VARIABLES).Evaluate(self.curframe)
+		self.pos = (pos_x, pos_y)
 		
 		particlesperframe = self.particlesperframe
 		
 		if (self.genspacing == 0) or ((self.curframe % self.genspacing) == 0):
-			for i in range(0, int(particlesperframe)):
-				self.CreateParticle()
+			self.CreateParticles(int(particlesperframe))
 		
 		self.curframe = self.curframe + 1
 	
 	def CreateParticle(self):
+		self.CreateParticles(1)
+	
+	def CreateParticles(self, count):  # Creates a batch of particles, speeds and directions are randomised in hundredths like in the original per-particle version
+		if count <= 0:
+			return
+		speeds = numpy.full(count, float(self.initspeed))
 		if self.initspeedrandrange != 0.0:
-			speed = self.initspeed + (float(random.randrange(int(-self.initspeedrandrange * 100.0), int(self.initspeedrandrange * 100.0))) / 100.0)
-		else:
-			speed = self.initspeed
+			speeds += numpy.random.randint(int(-self.initspeedrandrange * 100.0), int(self.initspeedrandrange * 100.0), count) / 100.0
+		directions = numpy.full(count, float(self.initdirection))
 		if self.initdirectionrandrange != 0.0:
-			direction = self.initdirection + (float(random.randrange(int(-self.initdirectionrandrange * 100.0), int(self.initdirectionrandrange * 100.0))) / 100.0)
-		else:
-			direction = self.initdirection
-		velocity = [speed * math.sin(direction), -speed * math.cos(direction)]
-		newparticle = Particle(self, initpos = self.pos, velocity = velocity, life = self.particlelife, drawtype = self.drawtype, colour = self.colour, radius = self.radius, length = self.length, image = self.image, keyframes = self.particlekeyframes)
-		self.parenteffect.AddParticle(newparticle)
+			directions += numpy.random.randint(int(-self.initdirectionrandrange * 100.0), int(self.initdirectionrandrange * 100.0), count) / 100.0
+		velocities = numpy.column_stack((speeds * numpy.sin(directions), -speeds * numpy.cos(directions)))
+		self.parenteffect.AddParticles(self, numpy.tile(numpy.asarray(self.pos, dtype = float), (count, 1)), velocities, self.particlelife)
 
 	def CreateKeyframe(self, frame, pos = (None, None), initspeed = None, initdirection = None, initspeedrandrange = None, initdirectionrandrange = None, particlesperframe = None, genspacing = None, interpolationtype = "linear"):
 		keyframes.CreateKeyframe(self.keyframes, frame, {'pos_x':pos[0], 'pos_y':pos[1], 'initspeed':initspeed, 'initdirection':initdirection, 'initspeedrandrange':initspeedrandrange, 'initdirectionrandrange':initdirectionrandrange, 'particlesperframe':particlesperframe, 'genspacing':genspacing, 'interpolationtype':interpolationtype})
@@ -149,12 +158,11 @@ class ParticleSource:
 		self.PreCalculateParticles()
 	
 	def PreCalculateParticles(self):
-		self.particlecache = []  # Clear the cache
+		# Interpolate the particle variables for each frame of its life, one row per frame read by ParticleEffect for all particles at once
+		self.particlecachearray = interpolate.KeyframeTrack(self.particlekeyframes, PARTICLE_VARIABLES).EvaluateFrames(numpy.arange(0, self.particlelife + 1))
 		
-		# Interpolate the particle variables for each frame of its life
-		for i in range(0, self.particlelife + 1):
-			vars = interpolate.InterpolateKeyframes(i, {'colour_r':0, 'colour_g':0, 'colour_b':0, 'radius':0, 'length':0}, self.particlekeyframes)
-			self.particlecache.append(vars)
+		# The same values as dictionaries, read by Particle objects
+		self.particlecache = [dict(zip(PARTICLE_VARIABLES, row)) for row in self.particlecachearray.tolist()]
 	
 	def ConsolidateKeyframes(self):
 		keyframes.ConsolidateKeyframes(self.keyframes, self.curframe, {'pos_x':self.pos[0], 'pos_y':self.pos[1], 'initspeed':self.initspeed, 'initdirection':self.initdirection, 'initspeedrandrange':self.initspeedrandrange, 'initdirectionrandrange':self.initdirectionrandrange, 'particlesperframe':self.particlesperframe, 'genspacing':self.genspacing})
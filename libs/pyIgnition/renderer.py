@@ -0,0 +1,116 @@
+### EXESOFT PYIGNITION ###
+# Batched drawing of particles stored by ParticleEffect
+#
+# Particles are drawn by drawtype in a few calls per frame instead of one pygame call per particle:
+# points are written into the pixels of the display at once, circles and bubbles are blitted with
+# Surface.blits from sprites rendered once per radius and colour, images are blitted with Surface.blits.
+# Only lines are still drawn one by one (pygame has no batched call for separate antialiased lines),
+# but their end points are computed for all of them together.
+
+import numpy, pygame
+from libs.pyIgnition import particles
+
+
+MAXSPRITES = 4096  # The sprite cache is emptied when it grows over this number of sprites
+MAXCOORD = 10000  # Particles further away are not drawn
+
+
+def PackColours(colours):  # Packs an (n, 3) array of colours to one integer per colour
+	colours = numpy.clip(numpy.asarray(colours).astype(numpy.int64), 0, 255)
+	return (colours[:, 0] << 16) | (colours[:, 1] << 8) | colours[:, 2]
+
+def UnpackColour(packed):
+	return ((packed >> 16) & 255, (packed >> 8) & 255, packed & 255)
+
+def MapColours(display, colours):  # Maps an (n, 3) array of colours to pixel values of the display, map_rgb is called once per distinct colour
+	distinct, inverse = numpy.unique(PackColours(colours), return_inverse = True)
+	mapped = numpy.array([display.map_rgb(UnpackColour(packed)) for packed in distinct.tolist()], dtype = numpy.int64)
+	return mapped[inverse]
+
+
+class ParticleRenderer:
+	def __init__(self):
+		self.sprites = {}  # (radius, width, colour) -> sprite
+
+	def GetSprite(self, radius, width, colour):  # Circle sprite drawn exactly like pygame.draw.circle at an integer centre
+		key = (radius, width, colour)
+		sprite = self.sprites.get(key)
+		if sprite is None:
+			if len(self.sprites) >= MAXSPRITES:
+				self.sprites.clear()
+			# Colour key blits are much faster than alpha blending, the key differs from the colour in the lowest bit of red
+			colorkey = (colour[0] ^ 1, colour[1], colour[2])
+			sprite = pygame.Surface((2 * radius, 2 * radius))
+			sprite.fill(colorkey)
+			pygame.draw.circle(sprite, colour, (radius, radius), radius, width)
+			sprite.set_colorkey(colorkey, pygame.RLEACCEL)
+			self.sprites[key] = sprite
+		return sprite
+
+	def Draw(self, display, effect):
+		count = len(effect.positions)
+		if not count:
+			return
+
+		visible = (numpy.abs(effect.positions) <= MAXCOORD).all(axis = 1)
+		drawtypes = numpy.array([source.drawtype for source in effect.particlesources], dtype = int)[effect.sourceindices]
+
+		# Points, and lines of zero length, which are drawn as points
+		points = visible & ((drawtypes == particles.DRAWTYPE_POINT) | ((drawtypes == particles.DRAWTYPE_LINE) & (effect.lengths == 0.0)))
+		if points.any():
+			self.DrawPoints(display, effect.positions[points], effect.colours[points])
+
+		for drawtype, width in ((particles.DRAWTYPE_CIRCLE, 0), (particles.DRAWTYPE_BUBBLE, 1)):
+			selected = visible & (drawtypes == drawtype)
+			if selected.any():
+				self.DrawCircles(display, effect.positions[selected], effect.colours[selected], effect.radii[selected], width)
+
+		lines = visible & (drawtypes == particles.DRAWTYPE_LINE) & (effect.lengths != 0.0)
+		if lines.any():
+			# Velocity scaled to the length of the line, the same as linevec in DrawParticle
+			velocities = effect.velocities[lines]
+			speeds = numpy.hypot(velocities[:, 0], velocities[:, 1])
+			scales = numpy.divide(effect.lengths[lines], speeds, out = numpy.zeros_like(speeds), where = speeds != 0.0)
+			self.DrawLines(display, effect.positions[lines], velocities * scales[:, numpy.newaxis], effect.colours[lines])
+
+		scalelines = visible & (drawtypes == particles.DRAWTYPE_SCALELINE)
+		if scalelines.any():
+			self.DrawLines(display, effect.positions[scalelines], effect.velocities[scalelines], effect.colours[scalelines])
+
+		images = numpy.flatnonzero(visible & (drawtypes == particles.DRAWTYPE_IMAGE))
+		if len(images):
+			sourceimages = [source.image for source in effect.particlesources]
+			offsets = numpy.array([image.get_size()[1] if image is not None else 0 for image in sourceimages])[effect.sourceindices[images]]
+			corners = (effect.positions[images] - offsets[:, numpy.newaxis]).tolist()
+			display.blits([(sourceimages[index], corner) for index, corner in zip(effect.sourceindices[images].tolist(), corners)], doreturn = False)
+
+	def DrawPoints(self, display, positions, colours):
+		coords = positions.astype(int)
+		inside = (coords[:, 0] >= 0) & (coords[:, 0] < display.get_width()) & (coords[:, 1] >= 0) & (coords[:, 1] < display.get_height())
+		coords = coords[inside]
+		mapped = MapColours(display, colours[inside])
+		try:
+			pixels = pygame.surfarray.pixels2d(display)
+		except ValueError:  # 24 bit surfaces can not be referenced as 2d arrays
+			for (x, y), colour in zip(coords.tolist(), colours[inside].astype(int).tolist()):
+				display.set_at((x, y), colour)
+			return
+		pixels[coords[:, 0], coords[:, 1]] = mapped.astype(pixels.dtype)
+		del pixels  # Unlocks the display
+
+	def DrawCircles(self, display, positions, colours, radii, width):
+		# Pygame draws circles with the centre and radius rounded down, radius below one draws nothing
+		radii = radii.astype(numpy.int64)
+		drawn = radii >= 1
+		radii = radii[drawn]
+		corners = (positions[drawn].astype(int) - radii[:, numpy.newaxis]).tolist()
+		
+		# One sprite per distinct radius and colour
+		keys, inverse = numpy.unique((radii << 24) | PackColours(colours[drawn]), return_inverse = True)
+		sprites = [self.GetSprite(key >> 24, width, UnpackColour(key & 0xffffff)) for key in keys.tolist()]
+		display.blits([(sprites[index], corner) for index, corner in zip(inverse.tolist(), corners)], doreturn = False)
+
+	def DrawLines(self, display, positions, vectors, colours):
+		ends = (positions + vectors).tolist()
+		for start, end, colour in zip(positions.tolist(), ends, colours.tolist()):
+			pygame.draw.aaline(display, colour, start, end)
@@ -0,0 +1,97 @@
+### EXESOFT PYIGNITION ###
+# Spatial hash of obstacles
+#
+# Bounded obstacles (circles, rectangles) are entered in every grid cell touched by their range box
+# (pos +- maxdist). Each particle is looked up in the cell it is in, so it is only paired with obstacles
+# near it, and each obstacle then resolves and pushes the batch of particles paired with it.
+# Unbounded obstacles (boundary lines) are paired with all particles.
+
+import numpy
+
+
+CELLSIZE = 64.0
+MAXCELL = 2 ** 30  # Cells further away are merged with the outermost ones
+
+
+def CellKeys(cellx, celly):  # One integer key per cell, keys of a column of cells are consecutive
+	return (numpy.clip(cellx, -MAXCELL, MAXCELL).astype(numpy.int64) << 32) + (numpy.clip(celly, -MAXCELL, MAXCELL).astype(numpy.int64) + MAXCELL)
+
+
+class ObstacleGrid:
+	def __init__(self, cellsize = CELLSIZE):
+		self.cellsize = cellsize
+		self.boxes = None  # Ranges of the obstacles the grid was built for
+		self.keys = numpy.zeros(0, dtype = numpy.int64)  # Sorted keys of cells containing an obstacle
+		self.keyobstacles = numpy.zeros(0, dtype = int)  # Index of the obstacle for each key
+		self.unbounded = []  # Indices of obstacles paired with every particle
+
+	def Build(self, obstacles):  # Enters the obstacles into the cells, nothing is done if no obstacle moved or changed its range
+		bounded = [i for i, obstacle in enumerate(obstacles) if obstacle.bounded]
+		self.unbounded = [i for i, obstacle in enumerate(obstacles) if not obstacle.bounded]
+		boxes = numpy.array([(i, obstacles[i].pos[0], obstacles[i].pos[1], obstacles[i].maxdist) for i in bounded], dtype = float).reshape(-1, 4)
+		if (self.boxes is not None) and numpy.array_equal(boxes, self.boxes):
+			return
+		self.boxes = boxes
+
+		ids = boxes[:, 0].astype(int)
+		cellx0 = numpy.floor((boxes[:, 1] - boxes[:, 3]) / self.cellsize).astype(numpy.int64)
+		cellx1 = numpy.floor((boxes[:, 1] + boxes[:, 3]) / self.cellsize).astype(numpy.int64)
+		celly0 = numpy.floor((boxes[:, 2] - boxes[:, 3]) / self.cellsize).astype(numpy.int64)
+		celly1 = numpy.floor((boxes[:, 2] + boxes[:, 3]) / self.cellsize).astype(numpy.int64)
+		heights = celly1 - celly0 + 1
+		counts = (cellx1 - cellx0 + 1) * heights
+
+		# Every obstacle is expanded to one entry per covered cell
+		firsts = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+		local = numpy.arange(counts.sum()) - firsts
+		keys = CellKeys(numpy.repeat(cellx0, counts) + local // numpy.repeat(heights, counts), numpy.repeat(celly0, counts) + local % numpy.repeat(heights, counts))
+		order = numpy.argsort(keys, kind = 'stable')
+		self.keys = keys[order]
+		self.keyobstacles = numpy.repeat(ids, counts)[order]
+
+	def Query(self, positions):  # Pairs of (particle index, obstacle index) for particles in cells of bounded obstacles
+		cells = numpy.floor(positions / self.cellsize)
+		particlekeys = CellKeys(cells[:, 0], cells[:, 1])
+		firsts = numpy.searchsorted(self.keys, particlekeys, side = 'left')
+		counts = numpy.searchsorted(self.keys, particlekeys, side = 'right') - firsts
+		total = counts.sum()
+		particles = numpy.repeat(numpy.arange(len(positions)), counts)
+		entries = numpy.repeat(firsts, counts) + numpy.arange(total) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+		return particles, self.keyobstacles[entries]
+
+	def Candidates(self, obstacles, positions):
+		self.Build(obstacles)
+		return ObstacleCandidates(self, positions)
+
+
+class ObstacleCandidates:  # Particles to be tested against each obstacle in one frame
+	def __init__(self, grid, positions):
+		self.grid = grid
+		self.unbounded = set(grid.unbounded)
+		self.batches = {}  # Obstacle index -> list of arrays of particle indices
+		self.Add(*grid.Query(positions))
+
+	def Add(self, particles, obstacles, after = -1):  # Adds pairs with obstacles later than after
+		later = obstacles > after
+		particles = particles[later]
+		obstacles = obstacles[later]
+		order = numpy.argsort(obstacles, kind = 'stable')
+		particles = particles[order]
+		obstacles = obstacles[order]
+		starts = numpy.flatnonzero(numpy.r_[True, obstacles[1:] != obstacles[:-1]]) if len(obstacles) else []
+		for start, end in zip(starts, list(starts[1:]) + [len(obstacles)]):
+			self.batches.setdefault(int(obstacles[start]), []).append(particles[start:end])
+
+	def AddMoved(self, indices, positions, after):  # Particles moved by an obstacle may have entered other cells
+		particles, obstacles = self.grid.Query(positions[indices])
+		self.Add(indices[particles], obstacles, after)
+
+	def Get(self, obstacle):  # Sorted particle indices for the obstacle, None for all particles
+		if obstacle in self.unbounded:
+			return None
+		batches = self.batches.get(obstacle)
+		if not batches:
+			return numpy.zeros(0, dtype = int)
+		if len(batches) == 1:
+			return batches[0]
+		return numpy.unique(numpy.concatenate(batches))
@@ -1,6 +1,7 @@
 import pygame
 
 import bots.bots
+from bots.sandbox import SandboxedBot
 from game_core import constants
 from menu.option import GroupedOptions
 from game_core.game_manager import GameManager
@@ -19,18 +20,54 @@ effectTimeMin = effectTimeTable[0][0]
 effectTimeMax = effectTimeTable[len(effectTimeTable)-1][1]
 
 
-pygame.init()
 displayMenu = GroupedOptions()
 mainMenu = GroupedOptions()
 settingsMenu = GroupedOptions()
 size = constants.display_width, constants.display_height
-screen = pygame.display.set_mode(size)
+screen = None
 
-# initialize pictures
-light = pygame.image.load('assets/images/circle.png')
-light = pygame.transform.scale(light, (300, 300))
-bg = pygame.image.load("assets/images/background.jpg")
-bg = pygame.transform.scale(bg, size)
+# pictures are loaded on first use, see get_light() and get_background()
+_images = {}
+
+
+def initialize():
+    """
+    Initializes PyGame and opens the main window, does nothing if already initialized
+    :return: main window surface
+    """
+    global screen
+    if screen is None:
+        pygame.init()
+        screen = pygame.display.set_mode(size)
+    return screen
+
+
+def _load_image(path, image_size):
+    """
+    Loads and scales an image once, subsequent calls return the cached surface
+    :param path: path to the image file
+    :param image_size: size of the scaled image as tuple
+    :return: scaled image surface
+    """
+    if path not in _images:
+        _images[path] = pygame.transform.scale(pygame.image.load(path), image_size)
+    return _images[path]
+
+
+def get_light():
+    """
+    Returns the light circle picture
+    :return: image surface
+    """
+    return _load_image('assets/images/circle.png', (300, 300))
+
+
+def get_background():
+    """
+    Returns the menu background picture scaled to the window size
+    :return: image surface
+    """
+    return _load_image('assets/images/background.jpg', size)
 
 
 def start_game():
@@ -38,7 +75,16 @@ def start_game():
     Function under New Game button
     :return: none
     """
+    initialize()
     bot1 = bots.bots.PhoenixDestructor()
     bot2 = bots.bots.XBot()
     bot3 = bots.bots.PreciseAttacker()
-    GameManager(constants.tanks_number, [bot1, bot2, bot3]).run()
+    players = [bot1, bot2, bot3]
+    if constants.bot_sandbox_enabled:
+        players = [SandboxedBot(bot) for bot in players]
+    try:
+        GameManager(constants.tanks_number, players).run()
+    finally:
+        for player in players:
+            if isinstance(player, SandboxedBot):
+                player.close()
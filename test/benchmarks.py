@@ -0,0 +1,244 @@
+"""
+Microbenchmarks of physics and terrain hot paths.
+
+Runs headless (dummy SDL drivers) on fixed seeds, so numbers are comparable between runs.
+Like timeit, each benchmark is called often enough to run for at least --min-time seconds,
+this is repeated and the best time of one call is reported, then compared with the baseline
+stored in benchmark_baseline.json. A benchmark is a regression when it is slower than the baseline
+both by the tolerance ratio and by the absolute floor, so timer noise of sub-millisecond calls
+does not decide the result. Run from the project root or the test folder:
+
+    python test/benchmarks.py                   # compare with baseline, exit code 1 on regression
+    python test/benchmarks.py --save-baseline   # store current results as the new baseline
+    python test/benchmarks.py -k ground         # run only benchmarks containing "ground"
+    python test/benchmarks.py --backend shapely # benchmark another physics backend
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from math import radians
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+os.chdir(PROJECT_DIR)
+
+import pygame
+
+from bots.bots import RandomAttacker
+from game_core.constants import *
+from game_core.game_manager import GameManager
+from game_core.ground import Ground
+from game_core.physics import backends, get_backend
+from game_core.tank import Tank
+from libs.pyIgnition import particleEffect, particles
+
+BASELINE_PATH = os.path.join(PROJECT_DIR, "test", "benchmark_baseline.json")
+SEED = 2024
+# physics backend used by benchmarks, set from command line
+backend = get_backend(physics_backend)
+
+
+def random_shell_lines(rng, count):
+    """
+    Generates short shell trajectory segments like the ones checked in fire_simple_shell
+    :param rng: random generator
+    :param count: number of segments
+    :return: list of (start, end) tuples
+    """
+    lines = []
+    for i in range(count):
+        x = rng.randrange(0, display_width)
+        y = rng.randrange(ground_height_min - 100, display_height)
+        lines.append(((x, y), (x + rng.randrange(-20, 20), y + rng.randrange(1, 30))))
+    return lines
+
+
+def bench_ground_reinitialize(surface):
+    random.seed(SEED)
+    Ground(surface, backend=backend)
+
+
+def setup_ground_check_collision(surface):
+    random.seed(SEED)
+    return Ground(surface, backend=backend), random_shell_lines(random.Random(SEED), 500)
+
+
+def bench_ground_check_collision(ground, lines):
+    for start, end in lines:
+        ground.check_collision(start, end)
+
+
+def setup_update_after_explosion(surface):
+    random.seed(SEED)
+    rng = random.Random(SEED)
+    points = [(rng.randrange(simple_shell_radius, display_width - simple_shell_radius),
+               rng.randrange(ground_height_min, ground_height_max)) for i in range(50)]
+    return Ground(surface, backend=backend), points
+
+
+def bench_update_after_explosion(ground, points):
+    for point in points:
+        ground.update_after_explosion(point, simple_shell_radius)
+
+
+def setup_tank_check_collision(surface):
+    random.seed(SEED)
+    rng = random.Random(SEED)
+    tanks = [Tank(surface, (rng.randrange(0, display_width), rng.randrange(ground_height_min, ground_height_max)),
+                  (0, 0), black, "bench", headless=True) for i in range(6)]
+    return tanks, random_shell_lines(rng, 200)
+
+
+def bench_tank_check_collision(tanks, lines):
+    for start, end in lines:
+        for tank in tanks:
+            tank.check_collision_with_tank(start, end, backend)
+
+
+def setup_fire_simple_shell(surface):
+    manager = GameManager(1, [RandomAttacker("first", "red"), RandomAttacker("second", "blue")],
+                          headless=True, seed=SEED, backend=backend)
+    manager.reinitialize_players()
+    tank = manager.players[0].active_tanks[0]
+    # shoot high so the shell flies a long trajectory
+    tank.set_turret_angle(radians(17) if tank.position[0] < display_width / 2 else radians(-17))
+    tank.tank_power = 100
+    return manager, tank
+
+
+def bench_fire_simple_shell(manager, tank):
+    manager.fire_simple_shell(tank)
+
+
+def setup_headless_match(surface):
+    bots = [RandomAttacker("first", "red"), RandomAttacker("second", "blue"), RandomAttacker("third", "green")]
+    return GameManager(1, bots, headless=True, seed=SEED, backend=backend),
+
+
+def bench_headless_match(manager):
+    manager.run_headless(max_turns=200)
+
+
+def setup_particle_explosion(surface):
+    effect = particleEffect.ParticleEffect(surface, (0, 0), (display_width, display_height))
+    effect.CreateSource((100, 100), 3.0, 0.0, 2.0, 3.14, 400, 30, 0, particles.DRAWTYPE_POINT, (255, 200, 0))
+    effect.CreateDirectedGravity(0.1, 0.0, [0, 1])
+    effect.CreateCircle((60, 100), (0, 0, 0), 1.0, 20)
+    # more than 10000 particles, an update of them should fit in a frame
+    for i in range(30):
+        effect.Update()
+    return effect,
+
+
+def bench_particle_explosion(effect):
+    for i in range(10):
+        effect.Update()
+
+
+# name: (setup function or None, benchmark function, repeats)
+BENCHMARKS = {
+    "ground_reinitialize": (None, bench_ground_reinitialize, 10),
+    "ground_check_collision": (setup_ground_check_collision, bench_ground_check_collision, 10),
+    "update_after_explosion": (setup_update_after_explosion, bench_update_after_explosion, 10),
+    "tank_check_collision": (setup_tank_check_collision, bench_tank_check_collision, 10),
+    "fire_simple_shell": (setup_fire_simple_shell, bench_fire_simple_shell, 10),
+    "headless_match": (setup_headless_match, bench_headless_match, 3),
+    "particle_explosion": (setup_particle_explosion, bench_particle_explosion, 5),
+}
+
+
+def time_calls(surface, setup, benchmark, number):
+    """
+    Calls benchmark number times, each call with a new setup, setup is excluded from measured time
+    :return: measured time of all calls in seconds
+    """
+    elapsed = 0.0
+    for i in range(number):
+        args = setup(surface) if setup else (surface,)
+        start = time.perf_counter()
+        benchmark(*args)
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def run_benchmark(surface, setup, benchmark, repeats, min_time):
+    """
+    Runs benchmark several times. As in timeit.Timer.autorange the number of calls is raised
+    (1, 2, 5, 10, 20, 50, ...) until the calls take at least min_time, then the calls are repeated
+    :return: best measured time of one call in seconds
+    """
+    for number in (base * 10 ** i for i in itertools.count() for base in (1, 2, 5)):
+        elapsed = time_calls(surface, setup, benchmark, number)
+        if elapsed >= min_time:
+            break
+    best = elapsed / number
+    for i in range(repeats - 1):
+        best = min(best, time_calls(surface, setup, benchmark, number) / number)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save-baseline", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="maximum allowed ratio of current time to baseline time (default 1.5)")
+    parser.add_argument("--floor", type=float, default=0.5,
+                        help="minimum slowdown in milliseconds counted as a regression (default 0.5)")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="minimum seconds of the calls of one repeat (default 0.2)")
+    parser.add_argument("-k", dest="keyword", default="", help="run only benchmarks containing this keyword")
+    parser.add_argument("--backend", choices=sorted(backends), default=physics_backend, help="physics backend")
+    args = parser.parse_args()
+    global backend
+    backend = get_backend(args.backend)
+
+    pygame.init()
+    surface = pygame.Surface((display_width, display_height))
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    # bots and the game manager print every shot, keep the report readable
+    stdout = sys.stdout
+    results = {}
+    regressions = []
+    for name, (setup, benchmark, repeats) in BENCHMARKS.items():
+        if args.keyword not in name:
+            continue
+        key = f"{backend.name}:{name}"
+        sys.stdout = open(os.devnull, "w")
+        try:
+            results[key] = run_benchmark(surface, setup, benchmark, repeats, args.min_time)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        line = f"{key:<34}{results[key] * 1000:>12.2f} ms"
+        if key in baseline:
+            ratio = results[key] / baseline[key]
+            line += f"   baseline {baseline[key] * 1000:>10.2f} ms   x{ratio:.2f}"
+            if ratio > args.tolerance and (results[key] - baseline[key]) * 1000 > args.floor:
+                line += "   REGRESSION"
+                regressions.append(key)
+        print(line)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print(f"Baseline saved to {BASELINE_PATH}")
+    elif regressions:
+        print(f"Performance regression in: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+Differential test harness for physics implementations.
+
+Generates seeded terrains, shots, explosions and collision probes, runs the reference
+(Shapely backend, the original Ground and Tank code) and a candidate physics backend side by side and
+reports every difference of impact points, heightmaps, sloughing ground and damages.
+After a difference the candidate is resynchronized with the reference state, so each
+case keeps testing the candidate on the same inputs as the reference.
+
+    python test/parity.py --candidate numpy --cases 1000
+
+Backends are wrapped in GroundPhysics. Any physics implementation can be compared,
+if it is an object with methods:
+    generate_terrain()                                 -> terrain (uses the random module)
+    load_terrain(heights)                              -> terrain with the given heights
+    heights(terrain)                                   -> list of ground heights, one per x
+    ground_collision(terrain, start, end)              -> (x, y) or None
+    tank_collision(tank_position, start, end)          -> (x, y) or None
+    carve_crater(terrain, point, radius)               -> list of sloughing ground lines
+    apply_sloughing(terrain, left_ground)              -> none
+    explosion_damages(tank_positions, point, power, radius) -> list of damages
+"""
+import argparse
+import os
+import random
+import sys
+from math import sin, cos
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+
+from game_core import events
+from game_core.constants import *
+from game_core.ground import Ground
+from game_core.physics import backends, get_backend
+from game_core.tank import Tank
+from game_core.utils import shell_trajectory
+
+
+class GroundPhysics:
+    """
+    Physics of the game as used by Ground and GameManager with the given backend
+    """
+    def __init__(self, backend):
+        self.backend = get_backend(backend)
+        self.name = self.backend.name
+
+    def generate_terrain(self):
+        return Ground(None, backend=self.backend)
+
+    def load_terrain(self, heights):
+        return Ground(None, heights, backend=self.backend)
+
+    def heights(self, terrain):
+        return terrain.heights.tolist()
+
+    def ground_collision(self, terrain, start, end):
+        return terrain.check_collision(start, end)
+
+    def tank_collision(self, tank_position, start, end):
+        return self.backend.segment_tank_collision(tank_position, start, end)
+
+    def carve_crater(self, terrain, point, radius):
+        return terrain.update_after_explosion(point, radius)
+
+    def apply_sloughing(self, terrain, left_ground):
+        terrain.update_after_sloughing(left_ground)
+
+    def explosion_damages(self, tank_positions, point, power, radius):
+        damages = self.backend.explosion_damages(tank_positions, point, power, radius)
+        # damages of the backend must agree with the ones Tank applies
+        for position in tank_positions:
+            tank = Tank(None, position, (0, 0), black, "parity", headless=True)
+            tank.apply_damage(point, power, radius)
+            damages.append(initial_tank_health - tank.tank_health)
+        return damages
+
+
+class ParityRun:
+    """
+    Runs reference and candidate on the same seeded cases and collects differences
+    """
+    def __init__(self, reference, candidate, shots=8, explosions=4, probes=40):
+        """
+        Init function
+        :param reference: reference physics implementation
+        :param candidate: tested physics implementation
+        :param shots: number of shots simulated in each case
+        :param explosions: number of random explosions in each case
+        :param probes: number of random segments checked against terrain and tanks in each case
+        """
+        self.reference = reference
+        self.candidate = candidate
+        self.shots = shots
+        self.explosions = explosions
+        self.probes = probes
+        self.mismatches = []
+        self.checks = 0
+        self.skipped = 0
+
+    def compare(self, case, kind, reference_value, candidate_value, **details):
+        """
+        Compares two results and records mismatch if they differ
+        :return: True if results are equal
+        """
+        self.checks += 1
+        if reference_value == candidate_value:
+            return True
+        self.mismatches.append(dict(case=case, kind=kind, reference=reference_value, candidate=candidate_value,
+                                    **details))
+        return False
+
+    def probe(self, case, kind, reference_call, candidate_call, **details):
+        """
+        Compares results of a collision probe. Segments overlapping an edge make the Shapely
+        reference fail (intersection is a line, not a point), such probes and shots are skipped.
+        :param reference_call: tuple of reference function and its arguments
+        :param candidate_call: tuple of candidate function and its arguments
+        :return: none
+        """
+        try:
+            reference_value = reference_call[0](*reference_call[1:])
+        except AttributeError:
+            self.skipped += 1
+            return
+        self.compare(case, kind, reference_value, candidate_call[0](*candidate_call[1:]), **details)
+
+    def impact(self, physics, terrain, tank_positions, start, end):
+        """
+        Returns impact point of shell segment, tanks are checked before the ground as in GameManager
+        """
+        for position in tank_positions:
+            intersection = physics.tank_collision(position, start, end)
+            if intersection:
+                return intersection
+        return physics.ground_collision(terrain, start, end)
+
+    def sync_terrain(self, case, kind, reference_terrain, candidate_terrain, **details):
+        """
+        Compares heightmaps and returns candidate terrain equal to the reference one
+        """
+        reference_heights = self.reference.heights(reference_terrain)
+        candidate_heights = self.candidate.heights(candidate_terrain)
+        self.checks += 1
+        if reference_heights == candidate_heights:
+            return candidate_terrain
+
+        differences = [x for x in range(max(len(reference_heights), len(candidate_heights)))
+                       if x >= len(reference_heights) or x >= len(candidate_heights)
+                       or reference_heights[x] != candidate_heights[x]]
+        first_x = differences[0]
+        self.mismatches.append(dict(case=case, kind=kind,
+                                    reference=reference_heights[first_x] if first_x < len(reference_heights) else None,
+                                    candidate=candidate_heights[first_x] if first_x < len(candidate_heights) else None,
+                                    first_x=first_x, columns=len(differences), **details))
+        return self.candidate.load_terrain(reference_heights)
+
+    def place_tanks(self, rng, heights):
+        """
+        Places tanks on the terrain like Player.initialize_tanks
+        """
+        tab = 5 + int(tank_width / 2)
+        positions = []
+        for x in rng.sample(range(tab, display_width - tab, tank_width + 10), rng.randint(2, 6)):
+            column = heights[x - int(tank_width / 2):x + int(tank_width / 2)]
+            positions.append((x, int(sum(column) / len(column)) - full_tank_height))
+        return positions
+
+    def explode(self, case, reference_terrain, candidate_terrain, point, radius, tank_positions, power):
+        """
+        Carves crater in both terrains, compares results and damages
+        :return: candidate terrain synchronized with the reference one
+        """
+        reference_left = self.reference.carve_crater(reference_terrain, point, radius)
+        candidate_left = self.candidate.carve_crater(candidate_terrain, point, radius)
+        candidate_terrain = self.sync_terrain(case, "crater", reference_terrain, candidate_terrain,
+                                              point=point, radius=radius)
+        self.compare(case, "sloughing", reference_left, candidate_left, point=point, radius=radius)
+        self.reference.apply_sloughing(reference_terrain, reference_left)
+        self.candidate.apply_sloughing(candidate_terrain, reference_left)
+        candidate_terrain = self.sync_terrain(case, "sloughing heights", reference_terrain, candidate_terrain,
+                                              point=point, radius=radius)
+        self.compare(case, "damage", self.reference.explosion_damages(tank_positions, point, power, radius),
+                     self.candidate.explosion_damages(tank_positions, point, power, radius), point=point)
+        return candidate_terrain
+
+    def run_case(self, case):
+        """
+        Runs one seeded case
+        :param case: seed of the case
+        :return: none
+        """
+        random.seed(case)
+        reference_terrain = self.reference.generate_terrain()
+        random.seed(case)
+        candidate_terrain = self.candidate.generate_terrain()
+        candidate_terrain = self.sync_terrain(case, "terrain", reference_terrain, candidate_terrain)
+
+        rng = random.Random(case)
+        tank_positions = self.place_tanks(rng, self.reference.heights(reference_terrain))
+
+        for i in range(self.probes):
+            heights = self.reference.heights(reference_terrain)
+            if i % 2 and tank_positions:
+                target = rng.choice(tank_positions)
+                target = target[0] + rng.randint(-tank_width, tank_width), target[1] + rng.randint(-5, tank_height + 5)
+            else:
+                x = rng.randrange(display_width)
+                target = x, heights[x] + rng.randint(-10, 10)
+            start = target[0] + rng.randint(-25, 25), target[1] - rng.randint(-5, 40)
+            end = target[0] + rng.randint(-25, 25), target[1] + rng.randint(0, 40)
+            for position in tank_positions:
+                self.probe(case, "tank collision", (self.reference.tank_collision, position, start, end),
+                           (self.candidate.tank_collision, position, start, end), tank=position, segment=(start, end))
+            self.probe(case, "ground collision", (self.reference.ground_collision, reference_terrain, start, end),
+                       (self.candidate.ground_collision, candidate_terrain, start, end), segment=(start, end))
+
+        for i in range(self.shots):
+            x, y = rng.choice(tank_positions)
+            angle = initial_turret_angle + rng.randint(0, 64) * angle_step
+            power = rng.randint(0, 100)
+            start = x + int(sin(angle) * turret_length), (y - 2) - int(cos(angle) * turret_length)
+            for step, (prev_position, position) in enumerate(shell_trajectory(start, angle, power)):
+                if position[1] > 2 * display_height:
+                    break
+                try:
+                    reference_impact = self.impact(self.reference, reference_terrain, tank_positions,
+                                                   prev_position, position)
+                except AttributeError:
+                    self.skipped += 1
+                    break
+                candidate_impact = self.impact(self.candidate, candidate_terrain, tank_positions,
+                                               prev_position, position)
+                if not self.compare(case, "impact", reference_impact, candidate_impact,
+                                    shot=(start, angle, power), step=step):
+                    break
+                if reference_impact:
+                    if 0 <= reference_impact[0] < display_width:
+                        candidate_terrain = self.explode(case, reference_terrain, candidate_terrain,
+                                                         reference_impact, simple_shell_radius, tank_positions,
+                                                         simple_shell_power)
+                    break
+
+        for i in range(self.explosions):
+            heights = self.reference.heights(reference_terrain)
+            x = rng.randrange(display_width)
+            radius = rng.choice([simple_shell_radius, tank_explosion_radius])
+            point = x, min(display_height, heights[x] + rng.randint(-radius, radius))
+            candidate_terrain = self.explode(case, reference_terrain, candidate_terrain, point, radius,
+                                             tank_positions, rng.choice([simple_shell_power, tank_explosion_power]))
+
+
+def run_parity(candidate, cases=100, first_case=0, reference=None, **options):
+    """
+    Runs parity check of candidate against the reference implementation
+    :param candidate: tested physics implementation
+    :param cases: number of seeded cases
+    :param first_case: seed of the first case
+    :param reference: reference physics implementation, Shapely backend by default
+    :return: ParityRun with collected mismatches
+    """
+    parity = ParityRun(reference or GroundPhysics("shapely"), candidate, **options)
+    # hits of the thousands of test tanks are not written to the console
+    previous_log = events.set_event_log(events.EventLog(console_level=None))
+    try:
+        for case in range(first_case, first_case + cases):
+            parity.run_case(case)
+    finally:
+        events.set_event_log(previous_log).close()
+    return parity
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidate", choices=sorted(backends), default="numpy")
+    parser.add_argument("--cases", type=int, default=1000, help="number of seeded cases (default 1000)")
+    parser.add_argument("--first-case", type=int, default=0, help="seed of the first case")
+    parser.add_argument("--show", type=int, default=20, help="number of mismatches printed")
+    args = parser.parse_args()
+
+    parity = run_parity(GroundPhysics(args.candidate), args.cases, args.first_case)
+    kinds = {}
+    for mismatch in parity.mismatches:
+        kinds[mismatch["kind"]] = kinds.get(mismatch["kind"], 0) + 1
+    print(f"{args.candidate}: {parity.checks} checks in {args.cases} cases, {len(parity.mismatches)} mismatches"
+          f" ({parity.skipped} skipped)")
+    for kind, count in sorted(kinds.items()):
+        print(f"  {kind}: {count}")
+    for mismatch in parity.mismatches[:args.show]:
+        print(f"  {mismatch}")
+    return 1 if parity.mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
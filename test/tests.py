@@ -1,9 +1,43 @@
+import asyncio
+import contextlib
+import io
+import itertools
+import json
 import os
+import pickle
+import random
+import signal
+import tempfile
+import time
 import unittest
+import unittest.mock
+from math import radians
+import numpy as np
 import pygame
 from menu.option import Option
 from game_core.tank import Tank
+from game_core.game_manager import GameManager
+from bots.bots import RandomAttacker, PhoenixDestructor, Sniper, TankBotInterface
+from bots.evaluation import Evaluation, Pairing, look_schedule, wilson_interval
+from bots.gateway import BotGateway, BotServer, NetworkBot, open_connection
+from bots.sandbox import SandboxedBot
+from game_core import ballistics, events
+from game_core.ballistics import BallisticSolver, lookup_shell_trajectory, muzzle_offset
+from game_core.camera import Camera
+from game_core.checkpoint import read_checkpoint
+from game_core.colors import assign_colors
 from game_core.constants import *
+from game_core.debris import DebrisEffect
+from game_core.ground import Ground
+from game_core.utils import shell_trajectory
+from game_core.placement import FreeGround
+from game_core.profiling import Profiler
+from game_core.results import ResultStore
+from game_core.snapshot import GameStateSnapshot
+from game_core.speculation import DecisionSpeculator
+from game_core.terrain import TerrainChunks
+from game_core.tournament import run_tournament
+from libs.pyIgnition import interpolate, keyframes, particleEffect, particles, spatialhash
 
 os.chdir('..')
 
@@ -62,23 +96,35 @@ class OptionTestCase(unittest.TestCase):
         self.assertEqual(isCalled, True)
 
 
+class MainMenuTestCase(unittest.TestCase):
+
+    def test_images_loaded_on_first_use(self):
+        import menu.mainMenu
+        self.assertIsNone(menu.mainMenu.screen)
+        menu.mainMenu._images.clear()
+        pygame.init()
+        light = menu.mainMenu.get_light()
+        self.assertEqual(light.get_size(), (300, 300))
+        self.assertIs(menu.mainMenu.get_light(), light)
+
+
 class TankTestCase(unittest.TestCase):
 
     def test_tank_calculate_distance_from_tank_center(self):
         pygame.init()
-        tank = Tank((display_height, display_width), (100, 100), (200, 200), black)
+        tank = Tank((display_height, display_width), (100, 100), (200, 200), black, "test")
         point = tank.calculate_distance_from_tank_center((200, 200))
         self.assertEquals(point, 141)
 
     def test_tank_turret_and_coordinates(self):
         pygame.init()
-        tank = Tank((display_height, display_width), (100, 100), (200, 200), black)
+        tank = Tank((display_height, display_width), (100, 100), (200, 200), black, "test")
         tac = tank.get_turret_end_coordinates()
         self.assertEquals(tac, (0, 0))
 
     def test_tank_update_turret_angle(self):
         pygame.init()
-        tank = Tank((display_height, display_width), (100, 100), (200, 200), black)
+        tank = Tank((display_height, display_width), (100, 100), (200, 200), black, "test")
         tank.turret_angle = 0
         self.assertEquals(tank.turret_angle, 0)
         tank.update_turret_angle(50)
@@ -90,30 +136,1163 @@ class TankTestCase(unittest.TestCase):
 
     def test_tank_update_power(self):
         pygame.init()
-        tank = Tank((display_height, display_width), (100, 100), (200, 200), black)
+        tank = Tank((display_height, display_width), (100, 100), (200, 200), black, "test")
         self.assertEquals(tank.tank_power, 50)
         tank.update_tank_power(200)
         self.assertEquals(tank.tank_power, 100)
 
     def test_tank_get_health(self):
         pygame.init()
-        tank = Tank((display_height, display_width), (100, 100), (200, 200), black)
+        tank = Tank((display_height, display_width), (100, 100), (200, 200), black, "test")
         self.assertEquals(tank.tank_health, 100)
         self.assertEquals(tank.get_tank_health(), 100)
 
     def test_tank_get_health(self):
         pygame.init()
-        tank = Tank((display_height, display_width), (100, 100), (200, 200), black)
+        tank = Tank((display_height, display_width), (100, 100), (200, 200), black, "test")
         self.assertEquals(tank.position, [100, 100])
         self.assertEquals(tank.get_tank_position(), (100, 100))
 
     def test_tank_update_position(self):
         pygame.init()
-        tank = Tank((display_height, display_width), (100, 100), (200, 200), black)
+        tank = Tank((display_height, display_width), (100, 100), (200, 200), black, "test")
         self.assertEquals(tank.position, [100, 100])
         tank.update_tank_position((200, 200))
         self.assertEquals(tank.position, [200, 200])
 
 
+class HeadlessGameTestCase(unittest.TestCase):
+
+    def play_seeded_turns(self, seed, backend=None, map_width=None):
+        pygame.init()
+        bots = [RandomAttacker("first", "red"), RandomAttacker("second", "blue")]
+        manager = GameManager(1, bots, headless=True, seed=seed, backend=backend, map_width=map_width)
+        manager.run_headless(max_turns=6)
+        return [(tank.name, tank.position, tank.tank_health)
+                for player in manager.players for tank in player.active_tanks], manager.ground.heights.tolist()
+
+    def test_seeded_matches_are_reproducible(self):
+        self.assertEqual(self.play_seeded_turns(7), self.play_seeded_turns(7))
+
+    def test_backends_play_the_same_match(self):
+        self.assertEqual(self.play_seeded_turns(11, "shapely"), self.play_seeded_turns(11, "numpy"))
+
+    def test_backends_play_the_same_match_on_wide_world(self):
+        tanks, heights = self.play_seeded_turns(5, "numpy", map_width=display_width * 10)
+        self.assertEqual(len(heights), display_width * 10)
+        self.assertEqual((tanks, heights), self.play_seeded_turns(5, "shapely", map_width=display_width * 10))
+
+
+class GameWindowTestCase(unittest.TestCase):
+
+    def test_match_is_finished_once_when_window_is_closed_after_game_over(self):
+        pygame.init()
+        manager = GameManager(1, [RandomAttacker("only", "red")])
+        # the first frame ends the match of a single player, the game over screen gets the window close
+        frames = [[], [pygame.event.Event(pygame.QUIT)]]
+        with unittest.mock.patch("pygame.event.get", side_effect=lambda: frames.pop(0) if frames else []), \
+                unittest.mock.patch.object(manager, "finish_match", wraps=manager.finish_match) as finish_match:
+            manager.run()
+        self.assertEqual(finish_match.call_count, 1)
+
+
+class CameraTestCase(unittest.TestCase):
+
+    def test_view_stays_in_world(self):
+        camera = Camera(display_width * 10)
+        camera.center_on(0)
+        self.assertEqual(camera.x, 0)
+        camera.center_on(display_width * 20)
+        self.assertEqual(camera.x, display_width * 9)
+        self.assertEqual(camera.visible_columns(), slice(display_width * 9, display_width * 10))
+        self.assertEqual(camera.to_screen((display_width * 9 + 5, 7)), (5, 7))
+        self.assertEqual(camera.to_world((5, 7)), (display_width * 9 + 5, 7))
+
+    def test_follow_moves_only_near_edges(self):
+        camera = Camera(display_width * 10)
+        self.assertFalse(camera.follow(display_width // 2))
+        self.assertTrue(camera.follow(display_width * 3))
+        self.assertEqual(camera.x, display_width * 3 - display_width // 2)
+        self.assertTrue(camera.is_visible(display_width * 3))
+        self.assertFalse(camera.is_visible(0))
+
+    def test_ground_draws_visible_columns(self):
+        pygame.init()
+        surface = pygame.Surface((display_width, display_height))
+        heights = np.full(display_width * 10, display_height - 1)
+        heights[display_width * 5:display_width * 5 + 10] = 100
+        camera = Camera(len(heights))
+        camera.move_to(display_width * 5)
+        Ground(surface, heights).draw(camera)
+        self.assertEqual(surface.get_at((5, 100))[:3], dark_green)
+        self.assertEqual(surface.get_at((20, 100))[:3], black)
+
+    def test_tank_is_drawn_relative_to_camera(self):
+        pygame.init()
+        surface = pygame.Surface((display_width, display_height))
+        camera = Camera(display_width * 10)
+        tank = Tank(surface, (display_width * 5 + 100, 500), (10, 10), red, "test", headless=True, camera=camera)
+        tank.draw_tank()
+        self.assertEqual(pygame.mask.from_threshold(surface, red, (1, 1, 1, 255)).count(), 0)
+        camera.move_to(display_width * 5)
+        tank.draw_tank()
+        self.assertEqual(surface.get_at((100, 505))[:3], red)
+
+
+class TerrainChunksTestCase(unittest.TestCase):
+
+    def test_collisions_match_backend_after_craters(self):
+        random.seed(13)
+        rng = random.Random(13)
+        ground = Ground(None, width=display_width * 3)
+        for i in range(20):
+            x = rng.randrange(display_width * 3)
+            ground.update_after_sloughing(ground.update_after_explosion((x, int(ground.heights[x])), simple_shell_radius))
+            self.assertEqual(ground.chunks.tops.tolist(), TerrainChunks(ground.heights).tops.tolist())
+            self.assertEqual(ground.chunks.bottoms.tolist(), TerrainChunks(ground.heights).bottoms.tolist())
+            for j in range(50):
+                start = rng.randrange(-50, display_width * 3 + 50), rng.randrange(0, display_height + 20)
+                end = start[0] + rng.randrange(-40, 40), start[1] + rng.randrange(-40, 40)
+                self.assertEqual(ground.check_collision(start, end),
+                                 ground.backend.segment_terrain_collision(ground.heights, start, end))
+
+    def test_flat_chunks_are_drawn_like_columns(self):
+        pygame.init()
+        heights = np.full(display_width * 2, 700)
+        heights[300:500] = np.arange(200) + 500
+        heights[1000:1100] = display_height
+        camera = Camera(len(heights))
+        camera.move_to(250)
+        chunked = pygame.Surface((display_width, display_height))
+        Ground(chunked, heights).draw(camera)
+        columns = pygame.Surface((display_width, display_height))
+        for i, height in enumerate(heights[250:250 + display_width].tolist()):
+            pygame.draw.line(columns, dark_green, (i, display_height), (i, height))
+        self.assertEqual(pygame.image.tobytes(chunked, "RGB"), pygame.image.tobytes(columns, "RGB"))
+
+    def test_wide_heightmap_is_spilled_to_file(self):
+        with tempfile.TemporaryDirectory() as spill_dir, \
+                unittest.mock.patch("game_core.terrain.terrain_spill_dir", spill_dir), \
+                unittest.mock.patch("game_core.terrain.terrain_spill_width", display_width):
+            ground = Ground(None, np.full(display_width * 2, 700))
+            self.assertIsInstance(ground.heights, np.memmap)
+            snapshot_heights = ground.frozen_heights()
+            ground.correct_heights((10, 20), 600)
+            self.assertIsInstance(ground.heights, np.memmap)
+            self.assertEqual(int(snapshot_heights[15]), 700)
+            self.assertEqual(ground.get_ground_height_at_point(15), 600)
+            self.assertEqual(int(ground.chunks.tops[0]), 600)
+            del ground, snapshot_heights
+
+
+class MultiTankTestCase(unittest.TestCase):
+
+    def test_free_ground_places_tanks_apart_until_full(self):
+        random.seed(1)
+        free_ground = FreeGround(display_width)
+        positions = []
+        while free_ground.free_length():
+            positions.append(free_ground.place())
+        positions.sort()
+        self.assertGreater(len(positions), display_width // (2 * tank_spacing))
+        self.assertTrue(all(b - a >= tank_spacing for a, b in zip(positions, positions[1:])))
+        self.assertGreaterEqual(positions[0], 5 + tank_width // 2)
+        self.assertLess(positions[-1], display_width - 5 - tank_width // 2)
+        with self.assertRaises(ValueError):
+            free_ground.place()
+
+    def make_manager(self, tanks, seed=8):
+        pygame.init()
+        bots = [RandomAttacker(f"bot{i}", color) for i, color in enumerate(["red", "green", "blue", "purple"])]
+        manager = GameManager(tanks, bots, headless=True, seed=seed, map_width=display_width * 4)
+        return manager
+
+    def test_match_with_dozens_of_tanks(self):
+        results = []
+        for i in range(2):
+            manager = self.make_manager(15)
+            with contextlib.redirect_stdout(io.StringIO()):
+                manager.run_headless(max_turns=40)
+            results.append(([(tank.position, tank.tank_health) for player in manager.players
+                             for tank in player.active_tanks], manager.ground.heights.tolist()))
+        self.assertEqual(results[0], results[1])
+
+    def test_tank_list_starts_with_firing_tank(self):
+        manager = self.make_manager(15)
+        manager.reinitialize_players()
+        manager.active_tank = manager.players[0].next_active_tank()
+        manager.active_tank = manager.players[0].next_active_tank()
+        tank_list = manager.generate_tank_list()
+        self.assertEqual(len(tank_list), 60)
+        self.assertEqual(tank_list[0]["position"][0], manager.active_tank.position[0])
+        self.assertEqual(tank_list[15]["position"][0], manager.players[1].next_tank.position[0])
+
+    def test_compact_hud_draws_one_bar_per_player(self):
+        manager = self.make_manager(15)
+        manager.reinitialize_players()
+        manager.active_tank = manager.players[0].next_active_tank()
+        manager.players[0].active_tanks[0].tank_health = 40
+        self.assertTrue(all(tank.health_bar_position is None for tank in manager.players[0].active_tanks))
+        manager.draw_all()
+        bar = manager.game_display.get_at((health_bar_init_positions[0][0] + 5, health_bar_init_positions[0][1] + 5))
+        self.assertEqual(bar[:3], good_health_color)
+
+
+class ManyPlayersTestCase(unittest.TestCase):
+
+    def make_manager(self, players):
+        pygame.init()
+        bots = [RandomAttacker(f"bot{i}", "red") for i in range(players)]
+        return GameManager(1, bots, headless=True, seed=6, map_width=display_width * 4)
+
+    def test_colors_are_distinct_and_kept_after_restart(self):
+        manager = self.make_manager(40)
+        manager.reinitialize_players()
+        colors = [tuple(player.color) for player in manager.players]
+        self.assertEqual(len(set(colors)), 40)
+        self.assertEqual(manager.taken_colors[:3], ["red", "magenta", "cyan"])
+        manager.reinitialize_players()
+        self.assertEqual([tuple(player.color) for player in manager.players], colors)
+
+    def test_preferred_colors_are_kept_when_free(self):
+        self.assertEqual(assign_colors(["blue", "not a color", "blue", "red"]), ["blue", "magenta", "cyan", "red"])
+
+    def test_match_of_many_players(self):
+        manager = self.make_manager(16)
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.run_headless(max_turns=40)
+        self.assertEqual(manager.turn, 40)
+
+    def test_hud_shows_page_of_active_player(self):
+        manager = self.make_manager(16)
+        manager.reinitialize_players()
+        manager.active_player = manager.players[13]
+        manager.active_tank = manager.active_player.next_active_tank()
+        drawn = []
+        with unittest.mock.patch("game_core.tank.draw_health_bar",
+                                 lambda display, position, health, text, color, active=False: drawn.append(text)):
+            manager.draw_all()
+        self.assertEqual(drawn, [f"bot{i} (100%)" for i in range(12, 16)])
+
+
+class SimultaneousTurnTestCase(unittest.TestCase):
+
+    def make_manager(self, seed=9):
+        pygame.init()
+        bots = [RandomAttacker(f"bot{i}", "red") for i in range(8)]
+        return GameManager(3, bots, headless=True, seed=seed, map_width=display_width * 3, simultaneous=True)
+
+    def test_batched_impacts_match_single_shots(self):
+        manager = self.make_manager()
+        manager.reinitialize_players()
+        rng = random.Random(4)
+        tanks = [tank for player in manager.players for tank in player.active_tanks]
+        for tank in tanks:
+            tank.set_turret_angle(radians(rng.randint(-90, 90)))
+            tank.update_tank_power(rng.randint(1, 100) - tank.get_current_power())
+        paths = [manager.shell_path(tank) for tank in tanks]
+        impacts = manager.find_shell_impacts(paths)
+        self.assertTrue(any(step is not None for step, point in impacts))
+        for path, impact in zip(paths, impacts):
+            expected = (None, None)
+            for step in range(1, len(path)):
+                if path[step][1] > 2 * display_height:
+                    break
+                point = manager.check_collision(path[step - 1], path[step])
+                if point:
+                    expected = (step, point)
+                    break
+            self.assertEqual(impact, expected)
+
+    def test_simultaneous_matches_are_reproducible(self):
+        results = []
+        for i in range(2):
+            manager = self.make_manager()
+            with contextlib.redirect_stdout(io.StringIO()):
+                winners = manager.run_headless(max_turns=10)
+            results.append((winners, manager.ground.heights.tolist(),
+                            [(tank.position, tank.tank_health) for player in manager.players
+                             for tank in player.active_tanks]))
+        self.assertEqual(results[0], results[1])
+        self.assertLess(sum(len(player.active_tanks) for player in manager.players), 24)
+
+    def test_next_player_skips_players_eliminated_together(self):
+        manager = self.make_manager()
+        manager.reinitialize_players()
+        manager.active_player = manager.players[2]
+        for player in manager.players[2:5]:
+            player.in_game = False
+        manager.update_players()
+        self.assertEqual(manager.active_player.name, "bot5")
+        self.assertEqual(len(manager.players), 5)
+
+    def test_many_bot_matches_finish(self):
+        pygame.init()
+
+        def timeout(signum, frame):
+            raise TimeoutError("match did not finish")
+
+        previous = signal.signal(signal.SIGALRM, timeout)
+        try:
+            for seed in (0, 4):
+                signal.alarm(20)
+                manager = GameManager(1, [RandomAttacker(f"bot{i}", "red") for i in range(16)], headless=True,
+                                      seed=seed, simultaneous=True)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    manager.run_headless(max_turns=300)
+                signal.alarm(0)
+        finally:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+class PatientBot(TankBotInterface):
+    allow_speculation = True
+
+    def attack(self, other_bots):
+        time.sleep(0.002)
+        if other_bots.turn % 3 == 0:
+            return 0, 0
+        me = next(bot for bot in other_bots if bot["name"] == self.get_name())
+        return (30 if me["position"][0] < display_width // 2 else -30), 40 + other_bots.turn % 50
+
+
+class SpeculationTestCase(unittest.TestCase):
+
+    def play(self, speculative, workers=1, players=3):
+        pygame.init()
+        bots = [PatientBot(f"bot{i}", "red") for i in range(players)]
+        manager = GameManager(1, bots, headless=True, seed=12, speculative=speculative)
+        if speculative:
+            manager.speculator = DecisionSpeculator(workers)
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.run_headless(max_turns=30)
+        return manager, ([(tank.position, tank.tank_health) for player in manager.players
+                          for tank in player.active_tanks], manager.ground.heights.tolist(), manager.turn)
+
+    def test_speculative_match_plays_the_same(self):
+        manager, result = self.play(True)
+        self.assertEqual(result, self.play(False)[1])
+        self.assertGreater(manager.speculator.hits, 0)
+        self.assertGreater(manager.speculator.misses, 0)
+        manager.speculator.close()
+
+    def test_workers_speculate_for_several_next_players(self):
+        pygame.init()
+        bots = [PatientBot(f"bot{i}", "red") for i in range(4)]
+        manager = GameManager(1, bots, headless=True, seed=12, speculative=True)
+        manager.speculator = DecisionSpeculator(workers=2)
+        manager.reinitialize_players()
+        manager.active_tank = manager.players[0].next_active_tank()
+        manager.speculate_next_turns()
+        self.assertEqual(set(manager.speculator.decisions), set(manager.players[1:3]))
+        futures = {player: future for player, (key, future) in manager.speculator.decisions.items()}
+        manager.speculate_next_turns()
+        self.assertEqual({player: future for player, (key, future) in manager.speculator.decisions.items()},
+                         futures)
+        snapshot = manager.generate_snapshot(manager.players[2], manager.players[2].next_tank, manager.turn + 2)
+        self.assertIsNotNone(manager.speculator.take(manager.players[2], manager.snapshot_key(snapshot)))
+        manager.speculator.close()
+
+        manager, result = self.play(True, workers=3, players=4)
+        self.assertEqual(result, self.play(False, players=4)[1])
+        self.assertGreater(manager.speculator.hits, 0)
+        manager.speculator.close()
+
+    def test_bots_without_permission_are_not_asked_early(self):
+        pygame.init()
+        manager = GameManager(1, [RandomAttacker("first", "red"), RandomAttacker("second", "blue")],
+                              headless=True, seed=3, speculative=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.run_headless(max_turns=5)
+        self.assertEqual(manager.speculator.decisions, {})
+        self.assertEqual(manager.speculator.hits + manager.speculator.misses, 0)
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    def make_manager(self):
+        pygame.init()
+        manager = GameManager(1, [RandomAttacker("first", "red"), RandomAttacker("second", "blue")],
+                              headless=True, seed=3)
+        manager.reinitialize_players()
+        return manager
+
+    def test_snapshot_is_read_only_sequence_of_tanks(self):
+        manager = self.make_manager()
+        snapshot = manager.generate_snapshot()
+        self.assertEqual(list(snapshot), manager.generate_tank_list())
+        self.assertEqual(snapshot[1]["name"], "second")
+        self.assertEqual(snapshot.turn, 0)
+        with self.assertRaises(AttributeError):
+            snapshot.turn = 5
+        with self.assertRaises(ValueError):
+            snapshot.heights[0] = 0
+        with self.assertRaises(ValueError):
+            snapshot.tanks["health"][0] = 1000
+
+    def test_snapshot_does_not_build_tank_dictionaries(self):
+        manager = self.make_manager()
+        expected = manager.generate_tank_list()
+        with unittest.mock.patch.object(manager, "generate_tank_list", side_effect=AssertionError):
+            snapshot = manager.generate_snapshot()
+        self.assertEqual(list(snapshot), expected)
+        self.assertEqual(snapshot.tanks.dtype, GameStateSnapshot.tanks_dtype(6))
+
+    def test_snapshot_arrays_can_not_be_made_writeable(self):
+        manager = self.make_manager()
+        snapshot = manager.generate_snapshot()
+        for array in (snapshot.heights, snapshot.tanks, manager.ground.frozen_heights()):
+            with self.assertRaises(ValueError):
+                array.flags.writeable = True
+        self.assertTrue(np.shares_memory(snapshot.heights, manager.ground.heights))
+
+    def test_heightmap_is_shared_until_ground_changes(self):
+        manager = self.make_manager()
+        snapshot = manager.generate_snapshot()
+        self.assertTrue(np.shares_memory(snapshot.heights, manager.ground.heights))
+        heights = snapshot.heights.tolist()
+        manager.ground.update_after_explosion((display_width // 2, int(manager.ground.heights[display_width // 2])),
+                                              simple_shell_radius)
+        self.assertEqual(snapshot.heights.tolist(), heights)
+        self.assertNotEqual(manager.ground.heights.tolist(), heights)
+
+    def test_snapshot_pickles(self):
+        snapshot = self.make_manager().generate_snapshot()
+        copy = pickle.loads(pickle.dumps(snapshot))
+        self.assertEqual(list(copy), list(snapshot))
+        self.assertEqual(copy.heights.tolist(), snapshot.heights.tolist())
+        self.assertFalse(copy.heights.flags.writeable)
+
+
+class ChattyBot(TankBotInterface):
+
+    def attack(self, other_bots):
+        print("x" * 10000)
+        return 45, other_bots.ground_level(0)
+
+
+class CrashingBot(TankBotInterface):
+
+    def attack(self, other_bots):
+        os._exit(3)
+
+
+class SleepyBot(TankBotInterface):
+
+    def attack(self, other_bots):
+        time.sleep(10)
+
+
+class GreedyBot(TankBotInterface):
+
+    def attack(self, other_bots):
+        memory = bytearray(64 * 1024 * 1024)
+        return 10, 10
+
+
+class SandboxTestCase(unittest.TestCase):
+
+    def make_snapshot(self):
+        tanks = GameStateSnapshot.tanks_array([("sandboxed", (100, 200), 100)])
+        return GameStateSnapshot(tanks, np.full(display_width, 850, dtype=np.int64), 0.0, 3)
+
+    def test_sandboxed_bot_reads_shared_heightmap_and_output_is_limited(self):
+        bot = SandboxedBot(ChattyBot("chatty"), output_limit=100)
+        output = io.StringIO()
+        previous = events.set_event_log(events.EventLog(console_level="INFO"))
+        try:
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(bot.attack(self.make_snapshot()), (45, 50))
+                events.flush()
+        finally:
+            bot.close()
+            events.set_event_log(previous).close()
+        self.assertIn("[chatty] " + "x" * 100, output.getvalue())
+        self.assertIn("characters dropped", output.getvalue())
+
+    def test_bot_output_is_rate_limited(self):
+        bot = SandboxedBot(ChattyBot("chatty"), output_rate=5)
+        output = io.StringIO()
+        previous = events.set_event_log(events.EventLog(console_level="INFO"))
+        try:
+            with contextlib.redirect_stdout(output):
+                with unittest.mock.patch("time.monotonic", return_value=bot.output_time):
+                    bot.log_output([f"line {i}" for i in range(8)])
+                    bot.log_output(["late"])
+                with unittest.mock.patch("time.monotonic", return_value=bot.output_time + 1):
+                    bot.log_output(["next second"])
+                events.flush()
+        finally:
+            events.set_event_log(previous).close()
+        self.assertEqual(output.getvalue().splitlines(),
+                         [f"[chatty] line {i}" for i in range(5)] +
+                         ["[chatty] ... 3 lines dropped", "[chatty] ... 1 lines dropped", "[chatty] next second"])
+
+    def test_crashed_bot_loses_turn_and_is_restarted(self):
+        bot = SandboxedBot(CrashingBot("crashing"))
+        try:
+            with self.assertRaises(RuntimeError):
+                bot.attack(self.make_snapshot())
+            with self.assertRaises(RuntimeError):
+                bot.attack(self.make_snapshot())
+        finally:
+            bot.close()
+
+    def test_slow_bot_times_out(self):
+        bot = SandboxedBot(SleepyBot("sleepy"), turn_timeout=0.2)
+        try:
+            with self.assertRaises(TimeoutError):
+                bot.attack(self.make_snapshot())
+        finally:
+            bot.close()
+
+    def test_memory_limit(self):
+        bot = SandboxedBot(GreedyBot("greedy"), memory_limit=16 * 1024 * 1024)
+        try:
+            with self.assertRaisesRegex(RuntimeError, "MemoryError"):
+                bot.attack(self.make_snapshot())
+        finally:
+            bot.close()
+
+
+class EchoBot(TankBotInterface):
+
+    def attack(self, other_bots):
+        return other_bots.turn, len(other_bots)
+
+
+class SlowBot(TankBotInterface):
+
+    def attack(self, other_bots):
+        time.sleep(1)
+        return 0, 0
+
+
+class GatewayTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = BotServer([EchoBot("echo"), SlowBot("slow")])
+        self.address = self.server.start("tcp://127.0.0.1:0")
+        self.gateway = BotGateway(self.address, pool_size=2, deadline=0.5)
+
+    def tearDown(self):
+        self.gateway.close()
+        self.server.stop()
+
+    def make_snapshot(self, turn):
+        tanks = GameStateSnapshot.tanks_array([("echo", (100, 200), 100), ("slow", (300, 250), 80)])
+        return GameStateSnapshot(tanks, np.full(display_width, 850, dtype=np.int64), 0.0, turn)
+
+    def test_network_bot_attacks(self):
+        bot = NetworkBot("echo", self.gateway)
+        self.assertEqual(bot.attack(self.make_snapshot(7)), (7, 2))
+        bot.update_last_hit((10, 20))
+
+    def test_concurrent_matches_share_pooled_connections(self):
+        async def play():
+            return await asyncio.gather(*[self.gateway.attack(f"match-{turn}", "echo", self.make_snapshot(turn))
+                                          for turn in range(50)])
+
+        self.assertEqual(self.gateway.run(play()), [(turn, 2) for turn in range(50)])
+        self.assertLessEqual(len(self.gateway.connections), 2)
+
+    def test_deadline(self):
+        with self.assertRaises(TimeoutError):
+            NetworkBot("slow", self.gateway).attack(self.make_snapshot(0))
+
+    def test_unknown_bot_loses_turn(self):
+        with self.assertRaises(RuntimeError):
+            NetworkBot("missing", self.gateway).attack(self.make_snapshot(0))
+
+    def test_snapshot_of_wide_world(self):
+        tanks = GameStateSnapshot.tanks_array([("echo", (100, 200), 100)])
+        snapshot = GameStateSnapshot(tanks, np.full(160000, 850, dtype=np.int64), 0.0, 3)
+        self.assertEqual(NetworkBot("echo", self.gateway).attack(snapshot), (3, 1))
+
+    def test_long_and_invalid_messages_fail_only_their_request(self):
+        server = BotServer([EchoBot("echo")], limit=4096)
+        address = server.start("tcp://127.0.0.1:0")
+        gateway = BotGateway(address, pool_size=1, deadline=0.5)
+        try:
+            bot = NetworkBot("echo", gateway)
+            with self.assertRaisesRegex(RuntimeError, "longer than 4096 bytes"):
+                bot.attack(self.make_snapshot(1))
+            tanks = GameStateSnapshot.tanks_array([("echo", (100, 200), 100)])
+            self.assertEqual(bot.attack(GameStateSnapshot(tanks, np.full(10, 850, dtype=np.int64), 0.0, 2)), (2, 1))
+            self.assertEqual(len(gateway.connections), 1)
+
+            async def send_invalid():
+                reader, writer = await open_connection(address)
+                writer.write(b'{"id": 5, "type": "attack", "state": [\n{"id": 6, "type": "attack", "match": "m", '
+                             b'"bot": "echo", "state": {"turn": 4, "wind": 0, "tanks": [], "heights": [850]}}\n')
+                responses = [json.loads(await reader.readline()) for i in range(2)]
+                writer.close()
+                return sorted(responses, key=lambda response: response["id"])
+
+            invalid, valid = gateway.run(send_invalid())
+            self.assertEqual(invalid["id"], 5)
+            self.assertIn("invalid JSON", invalid["error"])
+            self.assertEqual(valid, {"id": 6, "angle": 4, "power": 0})
+        finally:
+            gateway.close()
+            server.stop()
+
+
+class BallisticsTestCase(unittest.TestCase):
+
+    def test_landing_matches_simulated_shot(self):
+        solver = BallisticSolver()
+        for seed in range(20):
+            random.seed(seed)
+            ground = Ground(None)
+            x = random.randrange(30, display_width - 30)
+            y = int(ground.heights[x]) - full_tank_height
+            angle, power = random.choice([-1, 1]) * random.randint(1, 90), random.randint(1, 100)
+            start = x + muzzle_offset(angle)[0], y + muzzle_offset(angle)[1]
+            impact = None
+            for prev_position, position in shell_trajectory(start, radians(angle), power):
+                if position[1] > 2 * display_height:
+                    break
+                impact = ground.check_collision(prev_position, position)
+                if impact:
+                    break
+            self.assertEqual(solver.landing((x, y), angle, power, ground.heights), impact)
+
+    def test_trajectory_lookup_matches_integration(self):
+        for angle, power in [(-90, 100), (-37, 5), (1, 0), (45, 55), (90, 100)]:
+            lookup = lookup_shell_trajectory((800, 600), radians(angle), power)
+            integration = shell_trajectory((800, 600), radians(angle), power)
+            self.assertEqual([next(lookup) for i in range(200)], [next(integration) for i in range(200)])
+        # shots from high above the display leave the table and continue from its last position
+        steps = ballistics.shell_steps().shape[-1] + 100
+        for angle, power in [(-3, 0), (60, 100)]:
+            lookup = lookup_shell_trajectory((800, -20000), radians(angle), power)
+            integration = shell_trajectory((800, -20000), radians(angle), power)
+            self.assertEqual([next(lookup) for i in range(steps)], [next(integration) for i in range(steps)])
+        table = ballistics.shell_steps()
+        with unittest.mock.patch("game_core.ballistics.shell_trajectory",
+                                 wraps=ballistics.shell_trajectory) as integrate:
+            next(itertools.islice(lookup_shell_trajectory((800, -20000), radians(60), 100), steps, None))
+        self.assertEqual(integrate.call_args.args[0], (800 + table[0, 60, 100, -1], -20000 + table[1, 60, 100, -1]))
+
+    def test_trajectory_cache_is_versioned(self):
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                unittest.mock.patch("game_core.ballistics.trajectory_cache_dir", cache_dir):
+            cached = ballistics.cached_array("test", lambda: np.arange(5))
+            self.assertEqual(cached.tolist(), list(range(5)))
+            self.assertEqual(os.listdir(cache_dir), [f"test-{ballistics.physics_version()}.npy"])
+            self.assertEqual(ballistics.cached_array("test", lambda: np.arange(3)).tolist(), list(range(5)))
+            with unittest.mock.patch("game_core.ballistics.max_shell_speed", max_shell_speed + 1):
+                self.assertEqual(ballistics.cached_array("test", lambda: np.arange(3)).tolist(), list(range(3)))
+
+    def test_solved_shot_hits_target(self):
+        pygame.init()
+        manager = GameManager(1, [RandomAttacker("first", "red"), RandomAttacker("second", "blue")],
+                              headless=True, seed=1)
+        manager.reinitialize_players()
+        shooter, target = manager.players[0].active_tanks[0], manager.players[1].active_tanks[0]
+        manager.active_tank = shooter
+        angle, power = BallisticSolver().solve_for_bot(manager.generate_snapshot(), "first", "second")
+        manager.aim_active_tank(angle, power)
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.fire_simple_shell(shooter)
+        self.assertLess(target.tank_health, initial_tank_health)
+
+    def test_sniper_state_leaves_out_solver(self):
+        pygame.init()
+        manager = GameManager(1, [Sniper("sniper", "red"), RandomAttacker("other", "blue")], headless=True, seed=1)
+        manager.reinitialize_players()
+        sniper = manager.player_objects[0]
+        sniper.attack(manager.generate_snapshot())
+        self.assertIsNotNone(sniper.solver)
+        state = sniper.get_state()
+        self.assertNotIn("solver", state)
+        self.assertLess(len(pickle.dumps(state)), 1000)
+        restored = Sniper()
+        restored.set_state(state)
+        self.assertEqual(restored.get_name(), "sniper")
+        self.assertIsNotNone(restored.attack(manager.generate_snapshot()))
+
+    def test_phoenix_destructor_aims_straight_down(self):
+        bots = [{"name": "PhoenixDestructor", "position": (100, 300), "health": 100},
+                {"name": "other", "position": (100, 200), "health": 100}]
+        with contextlib.redirect_stdout(io.StringIO()):
+            angle, power = PhoenixDestructor().attack(bots)
+        self.assertEqual(angle, -90)
+
+
+class ParityTestCase(unittest.TestCase):
+
+    def test_reference_matches_itself(self):
+        from parity import GroundPhysics, run_parity
+        parity = run_parity(GroundPhysics("shapely"), cases=2)
+        self.assertGreater(parity.checks, 0)
+        self.assertEqual(parity.mismatches, [])
+
+    def test_numpy_backend_matches_reference(self):
+        from parity import GroundPhysics, run_parity
+        parity = run_parity(GroundPhysics("numpy"), cases=5)
+        self.assertEqual(parity.mismatches, [])
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    def test_disabled_profiler_collects_nothing(self):
+        profiler = Profiler()
+        with profiler.timer("draw_all"):
+            pass
+        profiler.count("check_collision.calls")
+        self.assertEqual(profiler.summary(), {"timers": {}, "counters": {}})
+        self.assertIsNone(profiler.finish_match(1))
+
+    def test_enabled_profiler_summary(self):
+        profiler = Profiler(enabled=True)
+        profiler.start_match()
+        for i in range(3):
+            with profiler.timer("draw_all"):
+                pass
+        profiler.count("fire_simple_shell.steps", 40)
+        profiler.count("fire_simple_shell.steps", 2)
+        summary = profiler.summary()
+        self.assertEqual(summary["timers"]["draw_all"]["calls"], 3)
+        self.assertEqual(summary["counters"], {"fire_simple_shell.steps": 42})
+
+
+class ResultStoreTestCase(unittest.TestCase):
+
+    def test_matches_are_recorded(self):
+        pygame.init()
+        store = ResultStore(":memory:")
+        manager = GameManager(1, [PatientBot(f"bot{i}", "red") for i in range(3)], headless=True, seed=12,
+                              results=store)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for match in range(2):
+                left = manager.run_headless(max_turns=30)
+        self.assertEqual(store.match_ids(seed=12), [1, 2])
+        self.assertEqual(store.match_ids(bot_name="bot1"), [1, 2])
+        ranking = store.rankings(2)
+        self.assertEqual(sorted(name for name, rank in ranking), ["bot0", "bot1", "bot2"])
+        self.assertEqual({name for name, rank in ranking if rank == 1}, set(left))
+        turns, = store.connection.execute("SELECT COUNT(*) FROM turns WHERE match_id = 2").fetchone()
+        self.assertEqual(turns, manager.turn)
+        damage, = store.connection.execute("SELECT SUM(damage) FROM damages WHERE match_id = 2").fetchone()
+        health = sum(tank.tank_health for player in manager.players for tank in player.active_tanks)
+        self.assertEqual(damage, 3 * initial_tank_health - health)
+        # bot0 plays the turns in which PatientBot does not shoot
+        self.assertNotIn("bot0", store.hit_rates())
+        shots, hits, rate = store.hit_rates()["bot1"]
+        self.assertGreater(shots, 0)
+        self.assertEqual(rate, hits / shots)
+        store.close()
+
+    def test_unfinished_match_is_not_committed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.sqlite")
+            store = ResultStore(path, batch_size=2)
+            store.start_match(5, "numpy", display_width, 1, False)
+            for turn in range(5):
+                store.record_turn(turn, "bot", 45, 50)
+            store.close()
+            store = ResultStore(path)
+            self.assertEqual(store.match_ids(), [])
+            self.assertEqual(store.connection.execute("SELECT COUNT(*) FROM turns").fetchone(), (0,))
+            store.close()
+
+    def test_elo_ratings(self):
+        store = ResultStore(":memory:")
+        for match in range(20):
+            store.start_match(match, "numpy", display_width, 1, False)
+            store.finish_match(10, [("strong", 0, 1, 1, 50), ("weak", 1, 2, 0, 0), ("other", 2, 2, 0, 0)])
+        ratings = store.elo_ratings()
+        self.assertGreater(ratings["strong"], elo_initial_rating)
+        self.assertAlmostEqual(ratings["weak"], ratings["other"])
+        self.assertAlmostEqual(sum(ratings.values()), 3 * elo_initial_rating)
+        store.close()
+
+    def test_disabled_store_records_nothing(self):
+        store = ResultStore()
+        store.start_match(1, "numpy", display_width, 1, False)
+        store.record_turn(0, "bot", 45, 50)
+        store.finish_match(1, [])
+        self.assertIsNone(store.connection)
+
+
+class EventLogTestCase(unittest.TestCase):
+
+    def read_events(self, path):
+        with open(path) as events_file:
+            return [json.loads(line) for line in events_file]
+
+    def test_levels_and_sampling(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "events.jsonl")
+            log = events.EventLog(path, level="INFO", console_level=None, sampling={"tank.hit": 3}, buffer_size=4)
+            for i in range(7):
+                log.emit("tank.hit", "hit", tank="a", damage=np.int64(i))
+            log.emit("bot.snapshot", "", events.DEBUG)
+            self.assertEqual(self.read_events(path), [])
+            log.emit("bot.error", "", events.WARNING, bot="b")
+            written = self.read_events(path)
+            log.close()
+        self.assertEqual([event["damage"] for event in written if event["event"] == "tank.hit"], [0, 3, 6])
+        self.assertEqual([event["level"] for event in written], ["INFO"] * 3 + ["WARNING"])
+
+    def test_console_without_stdout(self):
+        log = events.EventLog(console_level="INFO", buffer_size=8)
+        with contextlib.redirect_stdout(None):
+            for i in range(20):
+                log.emit("tank.hit", "Tank {tank} was hit!", tank="a")
+            log.close()
+
+    def test_background_writer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "events.jsonl")
+            log = events.EventLog(path, console_level=None, background=True)
+            for turn in range(1000):
+                log.emit("bot.attack", "", bot="a", turn=turn)
+            log.flush()
+            self.assertEqual([event["turn"] for event in self.read_events(path)], list(range(1000)))
+            log.close()
+            self.assertFalse(log.thread)
+
+    def test_match_events_reach_console(self):
+        pygame.init()
+        previous = events.set_event_log(events.EventLog(console_level="INFO"))
+        output = io.StringIO()
+        try:
+            manager = GameManager(1, [PatientBot("first", "red"), PatientBot("second", "blue")], headless=True,
+                                  seed=12)
+            with contextlib.redirect_stdout(output):
+                manager.run_headless(max_turns=5)
+        finally:
+            events.set_event_log(previous).close()
+        self.assertIn("Team second attacked with angle=", output.getvalue())
+        self.assertIn("Match 1 finished after 5 turns", output.getvalue())
+
+
+class InterruptingBot(PatientBot):
+
+    def __init__(self, name, preferred_color="", stop=None):
+        super().__init__(name, preferred_color)
+        self.stop = stop
+        self.attacks = 0
+
+    def attack(self, other_bots):
+        if self.attacks == self.stop:
+            raise KeyboardInterrupt
+        self.attacks += 1
+        return super().attack(other_bots)
+
+    def get_state(self):
+        state = super().get_state()
+        del state["stop"]
+        return state
+
+
+class CheckpointTestCase(unittest.TestCase):
+
+    def make_manager(self, path, stop=None, results=None):
+        pygame.init()
+        bots = [RandomAttacker("random", "red"), InterruptingBot("patient", "blue", stop),
+                PatientBot("other", "green")]
+        return GameManager(2, bots, headless=True, seed=5, checkpoint_path=path, checkpoint_interval=4,
+                           results=results)
+
+    def outcome(self, manager):
+        return ([(tank.position, tank.tank_health) for player in manager.players for tank in player.active_tanks],
+                manager.ground.heights.tolist(), manager.turn, manager.player_objects[1].attacks)
+
+    def test_resumed_match_plays_the_same(self):
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+            path = os.path.join(directory, "match.checkpoint")
+            manager = self.make_manager(None)
+            manager.run_headless(max_turns=40)
+            expected = self.outcome(manager)
+
+            with self.assertRaises(KeyboardInterrupt):
+                self.make_manager(path, stop=5).run_headless(max_turns=40)
+            state = read_checkpoint(path)
+            self.assertFalse(state["finished"])
+            self.assertEqual(state["turn"] % 4, 0)
+            resumed = self.make_manager(path)
+            resumed.run_headless(max_turns=40, state=state)
+        self.assertEqual(self.outcome(resumed), expected)
+
+    def test_tournament_resumes_with_results(self):
+        def count_rows(store):
+            return [store.connection.execute(f"SELECT COUNT(*) FROM {table} WHERE match_id = ?",
+                                             (match_id,)).fetchone()[0]
+                    for match_id in store.match_ids() for table in ("turns", "shots", "damages", "rankings")]
+
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+            path = os.path.join(directory, "tournament.checkpoint")
+            database = os.path.join(directory, "results.sqlite")
+            expected_store = ResultStore(":memory:")
+            expected = run_tournament(self.make_manager(None, results=expected_store), [1, 2, 3], max_turns=30)
+
+            stopped_store = ResultStore(database)
+            with self.assertRaises(KeyboardInterrupt):
+                run_tournament(self.make_manager(path, stop=15, results=stopped_store), [1, 2, 3], max_turns=30)
+            # rows not committed by a checkpoint are lost with the stopped process
+            stopped_store.close()
+            self.assertEqual(len(read_checkpoint(path)["data"]["outcomes"]), 1)
+            store = ResultStore(database)
+            self.assertEqual(run_tournament(self.make_manager(path, results=store), [1, 2, 3], max_turns=30),
+                             expected)
+            self.assertEqual(store.match_ids(), [1, 2, 3])
+            self.assertEqual(count_rows(store), count_rows(expected_store))
+            self.assertEqual(store.elo_ratings(), expected_store.elo_ratings())
+            store.close()
+            expected_store.close()
+
+
+class EvaluationTestCase(unittest.TestCase):
+
+    def test_wilson_interval(self):
+        self.assertEqual(wilson_interval(0, 0, 0.95), (0.0, 1.0))
+        low, high = wilson_interval(50, 100, 0.95)
+        self.assertAlmostEqual(low + high, 1.0)
+        self.assertAlmostEqual(high - low, 0.192, places=3)
+        self.assertGreater(wilson_interval(10, 10, 0.95)[0], 0.5)
+
+    def test_look_schedule(self):
+        self.assertEqual(look_schedule(20, 400), [20, 40, 80, 160, 320, 400])
+        self.assertEqual(look_schedule(4, 8), [4, 8])
+        self.assertEqual(look_schedule(10, 10), [10])
+
+    def test_decisions(self):
+        pairing = Pairing("strong", "weak", [10, 20], 0.9, 0.1)
+        self.assertAlmostEqual(pairing.confidence, 0.95)
+        for i in range(9):
+            pairing.add_result(0)
+        self.assertTrue(pairing.is_open())
+        self.assertIsNone(pairing.result)
+        pairing.add_result(0)
+        self.assertEqual(pairing.result, "strong")
+        self.assertFalse(pairing.is_open())
+        pairing = Pairing("first", "second", [10, 300], 0.9, 0.1)
+        for i in range(10):
+            pairing.add_result(None)
+        self.assertIsNone(pairing.result)
+        pairing.started = 10
+        self.assertTrue(pairing.is_open())
+        for i in range(290):
+            pairing.add_result(None)
+        self.assertEqual(pairing.result, "even")
+
+    def test_equal_bots_are_rarely_decided(self):
+        # equal bots win half of the matches, with a check after every match one pair in three was decided
+        generator = random.Random(0)
+        looks = look_schedule(evaluation_min_matches, evaluation_max_matches)
+        decided = 0
+        for i in range(1000):
+            pairing = Pairing("first", "second", looks, evaluation_confidence, evaluation_even_margin)
+            while pairing.result is None and pairing.matches < evaluation_max_matches:
+                pairing.add_result(generator.randrange(2))
+            decided += pairing.result in ("first", "second")
+        self.assertLess(decided / 1000, 1 - evaluation_confidence)
+        pairing = Pairing("strong", "weak", looks, evaluation_confidence, evaluation_even_margin)
+        while pairing.result is None and pairing.matches < evaluation_max_matches:
+            pairing.add_result(int(generator.random() > 0.8))
+        self.assertEqual(pairing.result, "strong")
+
+    def test_evaluation_stops_decided_pairs(self):
+        def evaluate():
+            return Evaluation(["PreciseAttacker", "XBot", "RandomAttacker"], workers=1, min_matches=4,
+                              max_matches=8, max_turns=30).run()
+
+        evaluation = evaluate()
+        results = [(pairing.wins, pairing.draws) for pairing in evaluation.pairings]
+        self.assertEqual(results, [(pairing.wins, pairing.draws) for pairing in evaluate().pairings])
+        for pairing in evaluation.pairings:
+            self.assertGreaterEqual(pairing.matches, 4)
+            self.assertLessEqual(pairing.matches, 8)
+            self.assertIn(pairing.matches, (4, 8))
+            if pairing.matches < 8:
+                self.assertIsNotNone(pairing.result)
+        self.assertGreater(evaluation.cpu_times["PreciseAttacker"][1], 0)
+        self.assertIn("matches/s", evaluation.report())
+
+
+class ParticleEffectTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.effect = particleEffect.ParticleEffect(pygame.Surface((200, 200)), (0, 0), (200, 200))
+
+    def test_particles_die_after_their_life(self):
+        source = self.effect.CreateSource((100, 100), 1.0, 0.5, 0.0, 0.0, 10, 5, 0, particles.DRAWTYPE_POINT, (255, 0, 0))
+        source.CreateParticleKeyframe(5, colour=(0, 0, 255))
+        for i in range(6):
+            self.effect.Update()
+        self.assertEqual(self.effect.GetParticleCount(), 60)
+        source.SetParticlesPerFrame(0)
+        for i in range(7):
+            self.effect.Update()
+        # no dead particle is skipped by the deletion
+        self.assertEqual(self.effect.GetParticleCount(), 0)
+
+    def test_colour_follows_particle_keyframes(self):
+        source = self.effect.CreateSource((100, 100), 0.0, 0.0, 0.0, 0.0, 1, 10, 0, particles.DRAWTYPE_CIRCLE, (0, 0, 0), 1.0)
+        source.CreateParticleKeyframe(10, colour=(200, 100, 0), radius=6.0)
+        self.effect.Update()
+        source.SetParticlesPerFrame(0)
+        for i in range(5):
+            self.effect.Update()
+        particle, = self.effect.particles
+        np.testing.assert_allclose(particle.colour, (100, 50, 0))
+        self.assertAlmostEqual(particle.radius, 3.5)
+
+    def test_particles_bounce_off_boundary_line(self):
+        self.effect.CreateSource((100, 150), 2.0, np.pi, 0.0, 1.0, 50, 100, 0, particles.DRAWTYPE_POINT, (255, 255, 255))
+        self.effect.CreateDirectedGravity(0.2, 0.0, [0, 1])
+        self.effect.CreateBoundaryLine((0, 180), (0, 0, 0), 1.0, [0, -1])
+        for i in range(60):
+            self.effect.Update()
+        self.assertTrue((self.effect.positions[:, 1] <= 180 + self.effect.velocities[:, 1].max()).all())
+
+    def test_update_of_explosion(self):
+        source = self.effect.CreateSource((100, 100), 3.0, 0.0, 2.0, 3.14, 400, 30, 0, particles.DRAWTYPE_POINT, (255, 200, 0))
+        self.effect.CreateDirectedGravity(0.1, 0.0, [0, 1])
+        self.effect.CreateCircle((60, 100), (0, 0, 0), 1.0, 20)
+        for i in range(30):
+            self.effect.Update()
+        self.assertGreater(self.effect.GetParticleCount(), 10000)
+        # timing of the update is checked by the particle_explosion benchmark of benchmarks.py
+        for i in range(10):
+            self.effect.Update()
+        self.assertGreater(self.effect.GetParticleCount(), 10000)
+        self.assertTrue(np.isfinite(self.effect.positions).all())
+
+    def test_batched_drawing_matches_particle_drawing(self):
+        image = pygame.Surface((5, 3))
+        image.fill(green)
+        for drawtype in range(particles.DRAWTYPE_IMAGE + 1):
+            effect = particleEffect.ParticleEffect(pygame.Surface((200, 200)), (0, 0), (200, 200))
+            source = effect.CreateSource((100.3, 100.7), 3.0, 0.0, 2.0, 3.14, 20, 40, 0, drawtype, (255, 100, 30), 1.0,
+                                         5.0, image)
+            source.CreateParticleKeyframe(40, colour=(0, 50, 250), radius=9.0)
+            for i in range(30):
+                effect.Update()
+            effect.Redraw()
+            batched = pygame.surfarray.array3d(effect.display)
+            effect.display.fill(black)
+            for particle in effect.particles:
+                particle.Draw(effect.display)
+            self.assertTrue(batched.any())
+            np.testing.assert_array_equal(batched, pygame.surfarray.array3d(effect.display))
+
+    def test_circle_sprites_are_shared(self):
+        source = self.effect.CreateSource((100, 100), 2.0, 0.0, 1.0, 3.14, 100, 20, 0, particles.DRAWTYPE_CIRCLE,
+                                          (255, 0, 0), 3.0)
+        for i in range(20):
+            self.effect.Update()
+        self.effect.Redraw()
+        sprites = dict(self.effect.renderer.sprites)
+        self.assertEqual(len(sprites), 1)
+        self.effect.Update()
+        self.effect.Redraw()
+        self.assertEqual(self.effect.renderer.sprites.keys(), sprites.keys())
+        for key, sprite in sprites.items():
+            self.assertIs(self.effect.renderer.sprites[key], sprite)
+
+    def test_obstacle_grid_pairs_particles_with_near_obstacles(self):
+        for x in range(0, 200, 10):
+            self.effect.CreateCircle((x, 150), black, 1.0, 4.0)
+        self.effect.CreateBoundaryLine((0, 190), black, 1.0, [0, -1])
+        positions = np.random.RandomState(0).uniform(-20, 220, (500, 2))
+        candidates = self.effect.obstaclegrid.Candidates(self.effect.obstacles, positions)
+        self.assertIsNone(candidates.Get(len(self.effect.obstacles) - 1))
+        for i, obstacle in enumerate(self.effect.obstacles[:-1]):
+            in_range = np.flatnonzero(~obstacle.OutOfRanges(positions))
+            self.assertTrue(np.isin(in_range, candidates.Get(i)).all())
+
+    def test_obstacle_grid_does_not_change_results(self):
+        effects = [particleEffect.ParticleEffect(None, (0, 0), (400, 400)) for i in range(2)]
+        for effect in effects:
+            effect.CreateSource((200, 50), 4.0, 0.0, 3.0, 3.14, 30, 40, 0, particles.DRAWTYPE_POINT, black)
+            effect.CreateDirectedGravity(0.15, 0.0, [0, 1])
+            for x in range(0, 400, 16):
+                effect.CreateCircle((x, 250 + 20 * np.sin(x / 40)), black, 0.6, 6.0)
+            effect.CreateRectangle((150.5, 150.5), black, 0.8, 60, 30)
+            effect.CreateBoundaryLine((0, 380), black, 0.5, [0, -1])
+        # the second effect tests every particle against every obstacle
+        effects[1].obstaclegrid = spatialhash.ObstacleGrid(cellsize=1e9)
+        for frame in range(50):
+            for effect in effects:
+                np.random.seed(frame)
+                effect.Update()
+        np.testing.assert_array_equal(effects[0].positions, effects[1].positions)
+        np.testing.assert_array_equal(effects[0].velocities, effects[1].velocities)
+
+
+class DebrisTestCase(unittest.TestCase):
+
+    def test_debris_settles_on_ground(self):
+        heights = np.full(display_width, 600)
+        heights[:800] = 500
+        debris = DebrisEffect(pygame.Surface((display_width, display_height)), heights)
+        np.random.seed(0)
+        debris.explode((800, 500), simple_shell_radius)
+        self.assertEqual(debris.GetParticleCount(), simple_shell_radius * debris_particles_per_radius)
+        for i in range(debris_life // 2):
+            debris.Update()
+            columns = debris.positions[:, 0].astype(int)
+            on_map = (columns >= 0) & (columns < display_width)
+            self.assertTrue((debris.positions[on_map, 1] < heights[columns[on_map]]).all())
+        resting = (debris.velocities == 0).all(axis=1)
+        self.assertGreater(resting.sum(), 0)
+        landed_positions = debris.positions[resting].copy()
+        debris.Update()
+        np.testing.assert_array_equal(debris.positions[resting], landed_positions)
+
+    def test_debris_disappears_after_its_life(self):
+        debris = DebrisEffect(pygame.Surface((display_width, display_height)))
+        debris.explode((100, 100), 10)
+        for i in range(debris_life + 2):
+            debris.Update()
+            debris.Redraw()
+        self.assertTrue(debris.is_finished())
+
+
+class KeyframeTrackTestCase(unittest.TestCase):
+
+    def test_track_matches_keyframe_interpolation(self):
+        rng = random.Random(3)
+        names = ("a", "b", "c")
+        for case in range(50):
+            keyframe_list = keyframes.KeyframeList()
+            keyframes.CreateKeyframe(keyframe_list, 0, {"a": 1.0, "b": 2.0, "c": -3.0})
+            for i in range(rng.randint(1, 5)):
+                variables = {name: rng.uniform(-50, 50) if rng.random() < 0.6 else None for name in names}
+                variables["interpolationtype"] = rng.choice(["linear", "cosine"])
+                keyframes.CreateKeyframe(keyframe_list, rng.randint(0, 100), variables)
+            track = interpolate.CompiledTrack(keyframe_list, names)
+            for frame in range(120):
+                expected = interpolate.InterpolateKeyframes(frame, dict.fromkeys(names, 0), keyframe_list)
+                np.testing.assert_allclose(track.Evaluate(frame), [expected[name] for name in names], atol=1e-9)
+
+    def test_track_is_compiled_again_after_change(self):
+        effect = particleEffect.ParticleEffect(None, (0, 0), (100, 100))
+        circle = effect.CreateCircle((10, 10), black, 1.0, 5.0)
+        for i in range(5):
+            circle.Update()
+        circle.SetPos((20, 10))
+        circle.CreateKeyframe(15, pos=(30, 10))
+        for i in range(10):
+            circle.Update()
+        self.assertEqual(circle.pos, (29, 10))
+        circle.Update()
+        self.assertEqual(circle.pos, (30, 10))
+
+    def test_particle_cache_is_precomputed(self):
+        effect = particleEffect.ParticleEffect(None, (0, 0), (100, 100))
+        source = effect.CreateSource(particlelife=10, colour=(0, 0, 0), radius=1.0)
+        source.CreateParticleKeyframe(10, colour=(100, 0, 0), radius=11.0, interpolationtype="cosine")
+        self.assertEqual(source.particlecachearray.shape, (11, 5))
+        self.assertAlmostEqual(source.particlecache[5]["colour_r"], 50.0)
+        self.assertAlmostEqual(source.particlecache[10]["radius"], 11.0)
+
+
 if __name__ == '__main__':
     unittest.main()